@@ -13,6 +13,7 @@ from heatmap_templates import all_templates
 # from google.colab import drive
 
 from osm_service_classes import OSMDataService, HeatmapService, StreetNetworkService
+import geometry_kernel
 
 # Initialize the default area
 default_area = "Yerevan, Armenia"
@@ -25,7 +26,8 @@ class OSMProcessor:
         self.feature_selections = {}  # To store which features and tags were selected
 
         self.data_service = OSMDataService()
-        self.heatmap_service = HeatmapService()
+        # Large heatmap jobs are rendered one raster per CPU core
+        self.heatmap_service = HeatmapService(max_workers=os.cpu_count() or 1)
         self.network_service = StreetNetworkService()
 
         self.create_initial_widgets()
@@ -329,6 +331,9 @@ class OSMProcessor:
                     if self.boundary_gdf is None or len(self.boundary_gdf) == 0:
                         raise ValueError("The file does not contain valid geometry data.")
                     
+                    # Prepare the query polygon once; every workflow reuses it from the service's cache
+                    query_geometry = self.data_service.query_geometry.prepare(self.boundary_gdf.unary_union)
+                    
                     # Enable workflow selection
                     self.workflow_selector.disabled = False
                     
@@ -337,6 +342,8 @@ class OSMProcessor:
                         print(f"✓ Custom area loaded from: {filename}")
                         print(f"  - Contains {len(self.boundary_gdf)} geometry features")
                         print(f"  - CRS: {self.boundary_gdf.crs}")
+                        print(f"  - Query polygon: {query_geometry.boundary_vertices} -> "
+                              f"{query_geometry.query_vertices} vertices")
                         print("Now select a workflow in Step 2.")
                 
                 except Exception as e:
@@ -566,7 +573,11 @@ class OSMProcessor:
                                 feature_type,
                                 selected_tags,
                                 progress_callback=progress_callback,
-                                convert_polygons_to_points=True  # Always convert polygons to points for heatmaps
+                                centroids_only=True,  # Heatmaps only need one point per feature
+                                use_tile_cache=True,  # Reuse tiles downloaded for overlapping areas
+                                bbox_tiles=True,  # Tiles are rectangles; clip to the boundary locally
+                                columns=['name'],  # Heatmaps only use the name and the feature key
+                                categorical=True
                             )
                             
                             # Store in the data dictionary if we got results
@@ -901,50 +912,33 @@ class OSMProcessor:
             # Clear existing data
             self.data = {}
             
-            # Get the polygon for querying
-            polygon = self.boundary_gdf.unary_union
+            # Create a progress callback for the results output
+            progress_callback = self.create_progress_callback(self.results_output)
+            
+            # Query the same target as the other workflows, so identical requests
+            # share one download through the data service
+            if self.area_method.value == 'Enter Location Name':
+                query_target = self.area
+            else:
+                query_target = self.boundary_gdf.unary_union
             
             # Collect data for each feature type
             total_features = 0
             for feature_type, selected_tags in self.feature_selections.items():
-                with self.results_output:
-                    print(f"Fetching {feature_type} data with {len(selected_tags)} tags...")
-                
-                # Create a tags dictionary for OSMnx
-                tags = {feature_type: selected_tags}
-                
                 try:
-                    # Fetch the data using polygon instead of place name
-                    try:
-                        # First attempt with standard method
-                        gdf = ox.features_from_polygon(polygon, tags=tags)
-                    except Exception as e:
-                        # If error contains indication of query being too large
-                        if "too long" in str(e).lower() or "bad request" in str(e).lower():
-                            # Try with the tiled approach
-                            gdf = self.fetch_data_by_tiles(polygon, feature_type, selected_tags)
-                        else:
-                            # If it's some other error, re-raise it
-                            raise e
+                    # The service tiles large requests and converts amenity and shop
+                    # polygons to centroid points
+                    gdf = self.data_service.fetch_osm_data(
+                        query_target,
+                        feature_type,
+                        selected_tags,
+                        progress_callback=progress_callback,
+                        convert_polygons_to_points=feature_type in ['amenity', 'shop'],
+                        categorical=True  # Repeated tag values are stored once per column
+                    )
                                 
                     # Store in the data dictionary
                     if gdf is not None and len(gdf) > 0:
-                        # Special processing for amenity polygons - convert to points
-                        if feature_type in ['amenity', 'shop']:
-                            # Identify polygons and multipolygons
-                            polygon_mask = gdf.geometry.apply(lambda geom: 
-                                geom.geom_type == 'Polygon' or geom.geom_type == 'MultiPolygon')
-                            
-                            if polygon_mask.any():
-                                # Number of polygons to convert
-                                num_polygons = polygon_mask.sum()
-                                
-                                # Convert polygons to centroid points
-                                gdf.loc[polygon_mask, 'geometry'] = gdf.loc[polygon_mask, 'geometry'].centroid
-                                
-                                with self.results_output:
-                                    print(f"  ↳ Converted {num_polygons} polygons to points for {feature_type} features")
-                        
                         self.data[feature_type] = gdf
                         total_features += len(gdf)
                         with self.results_output:
@@ -1054,6 +1048,13 @@ class OSMProcessor:
             for i, (feature_type, gdf) in enumerate(self.data.items()):
                 color = colors[i % len(colors)]
                 
+                # Classify and simplify all geometries up front instead of row by row
+                is_point = geometry_kernel.is_point(gdf)
+                is_linear = geometry_kernel.is_linear(gdf)
+                is_polygonal = geometry_kernel.is_polygonal(gdf)
+                simplified = geometry_kernel.simplify(gdf, 0.0001, mask=is_linear | is_polygonal)
+                is_drawable = geometry_kernel.is_present(simplified)
+                
                 # Create a feature group for this layer so it can be toggled
                 feature_group = folium.FeatureGroup(name=feature_type)
                 
@@ -1061,9 +1062,9 @@ class OSMProcessor:
                 marker_cluster = MarkerCluster().add_to(feature_group)
                 
                 # Process each feature
-                for idx, row in gdf.iterrows():
+                for position, (idx, row) in enumerate(gdf.iterrows()):
                     # Skip if no geometry
-                    if not row.geometry:
+                    if not is_drawable[position]:
                         continue
                         
                     # Create popup content
@@ -1076,41 +1077,37 @@ class OSMProcessor:
                         popup_content += f"<b>{feature_type}:</b> {row[feature_type]}<br>"
                     
                     # Add different geometry types
-                    if row.geometry.geom_type == 'Point':
+                    if is_point[position]:
                         folium.Marker(
                             [row.geometry.y, row.geometry.x],
                             popup=folium.Popup(popup_content, max_width=300),
                             icon=folium.Icon(color=color)
                         ).add_to(marker_cluster)
                     
-                    elif row.geometry.geom_type in ['LineString', 'MultiLineString']:
-                        # Simplify geometry for better performance
-                        simplified = row.geometry.simplify(0.0001)
-                        if not simplified.is_empty:
-                            folium.GeoJson(
-                                simplified.__geo_interface__,
-                                popup=folium.Popup(popup_content, max_width=300),
-                                style_function=lambda x, color=color: {
-                                    'color': color,
-                                    'weight': 3,
-                                    'opacity': 0.7
-                                }
-                            ).add_to(feature_group)
+                    elif is_linear[position]:
+                        # Simplified geometry for better performance
+                        folium.GeoJson(
+                            simplified[position].__geo_interface__,
+                            popup=folium.Popup(popup_content, max_width=300),
+                            style_function=lambda x, color=color: {
+                                'color': color,
+                                'weight': 3,
+                                'opacity': 0.7
+                            }
+                        ).add_to(feature_group)
                     
-                    elif row.geometry.geom_type in ['Polygon', 'MultiPolygon']:
-                        # Simplify geometry for better performance
-                        simplified = row.geometry.simplify(0.0001)
-                        if not simplified.is_empty:
-                            folium.GeoJson(
-                                simplified.__geo_interface__,
-                                popup=folium.Popup(popup_content, max_width=300),
-                                style_function=lambda x, color=color: {
-                                    'fillColor': color,
-                                    'color': color,
-                                    'weight': 2,
-                                    'fillOpacity': 0.4
-                                }
-                            ).add_to(feature_group)
+                    elif is_polygonal[position]:
+                        # Simplified geometry for better performance
+                        folium.GeoJson(
+                            simplified[position].__geo_interface__,
+                            popup=folium.Popup(popup_content, max_width=300),
+                            style_function=lambda x, color=color: {
+                                'fillColor': color,
+                                'color': color,
+                                'weight': 2,
+                                'fillOpacity': 0.4
+                            }
+                        ).add_to(feature_group)
                 
                 # Add the feature group to the map
                 feature_group.add_to(m)
@@ -1168,14 +1165,8 @@ class OSMProcessor:
             all_points = []
 
             for feature_type, gdf in self.data.items():
-                # Make a copy to avoid modifying original data
-                gdf_copy = gdf.copy()
-
-                # Filter to only keep Point geometries
-                point_mask = gdf_copy.geometry.apply(
-                    lambda geom: geom is not None and geom.geom_type == 'Point'
-                )
-                points_gdf = gdf_copy[point_mask].copy()
+                # Filter to only keep Point geometries (the selection is a new frame)
+                points_gdf = gdf[geometry_kernel.is_point(gdf)].copy()
 
                 if len(points_gdf) == 0:
                     print(f"  ↳ Skipping {feature_type}: no point geometries found")
@@ -1432,7 +1423,9 @@ class OSMProcessor:
                     cell_size=cell_size.value,
                     bandwidth=bandwidth.value,
                     selected_categories=selected_categories,
-                    progress_callback=progress_callback
+                    progress_callback=progress_callback,
+                    # The binned engine keeps large point sets interactive
+                    engine="fft"
                 )
                 
                 if results:
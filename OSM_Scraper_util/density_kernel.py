@@ -0,0 +1,698 @@
+# Kernel density estimation on raster grids for the heatmap service. The binned
+# engine spreads the points onto the grid nodes and convolves the counts with the
+# Gaussian kernel by FFT, so its cost depends on the raster size, not on the
+# number of points. The truncated engine evaluates the kernel exactly but only
+# within a cutoff radius of each point, so its cost grows with the number of
+# points, not with the raster. The exact engine evaluates scipy's gaussian_kde
+# at every node and is kept to validate the others.
+
+import numpy as np
+from scipy.signal import fftconvolve
+from scipy.stats import gaussian_kde
+
+
+ENGINES = ("fft", "truncated", "exact")
+
+# The kernel is cut off where the Gaussian falls below exp(-0.5 * 8**2) ~ 1e-14
+# of its peak, far below float32 resolution
+KERNEL_RADIUS = 8.0
+
+# Linear binning blurs points over a cell; kernels narrower than this (standard
+# deviation in cells along either axis) are evaluated without binning instead
+MIN_KERNEL_CELLS = 1.0
+
+# Default cutoff of the truncated engine in kernel standard deviations: the
+# kernel drops to exp(-0.5 * 4**2) ~ 3e-4 of its peak there
+DEFAULT_CUTOFF = 4.0
+
+# Upper bound on the (point, node) pairs the truncated engine evaluates at once
+_PAIRS_PER_CHUNK = 4_000_000
+
+# The truncated engine sums kernel values as integers in units of 2**-32, so
+# the sums do not depend on the order they are added in. Chunks stay below
+# 2**20 points so a chunk's per-node sums are exact in float64.
+_FIXED_POINT = 2.0 ** 32
+_MAX_CHUNK_POINTS = 1 << 20
+
+# Approximate working memory per raster cell of a block (coordinates, kernel
+# values, FFT buffers) and per (point, node) pair of the truncated engine
+BYTES_PER_CELL = 64
+BYTES_PER_PAIR = 96
+
+
+def kde_covariance(x, y, bandwidth):
+    """
+    Get the kernel covariance gaussian_kde uses for a scalar bandwidth.
+
+    Parameters:
+    -----------
+    x, y : array-like
+        Point coordinates
+    bandwidth : float
+        Bandwidth factor, as gaussian_kde's bw_method
+
+    Returns:
+    --------
+    covariance : numpy.ndarray
+        2x2 covariance of the kernel: the data covariance scaled by bandwidth**2
+    """
+    return np.cov(np.vstack([x, y]), rowvar=True, bias=False) * bandwidth ** 2
+
+
+def kernel_cells(covariance, x_grid, y_grid):
+    """
+    Get the kernel width in grid cells.
+
+    Parameters:
+    -----------
+    covariance : numpy.ndarray
+        2x2 kernel covariance (see kde_covariance)
+    x_grid, y_grid : numpy.ndarray
+        Grid node coordinates (see grid_steps)
+
+    Returns:
+    --------
+    cells : float
+        The smaller of the kernel's standard deviations along x and y, in cells
+    """
+    dx, dy = grid_steps(x_grid, y_grid)
+    return float(min(np.sqrt(covariance[0, 0]) / dx, np.sqrt(covariance[1, 1]) / dy))
+
+
+def grid_steps(x_grid, y_grid):
+    """
+    Get the node spacing of a raster grid.
+
+    Parameters:
+    -----------
+    x_grid : numpy.ndarray
+        Node x coordinates, ascending and evenly spaced
+    y_grid : numpy.ndarray
+        Node y coordinates, descending (north to south) and evenly spaced
+
+    Returns:
+    --------
+    (dx, dy) : tuple of float
+        Positive spacing in x and y (1.0 along an axis with a single node)
+    """
+    dx = float(x_grid[1] - x_grid[0]) if len(x_grid) > 1 else 1.0
+    dy = float(y_grid[0] - y_grid[1]) if len(y_grid) > 1 else 1.0
+    return dx, dy
+
+
+def bin_points(x, y, x_grid, y_grid):
+    """
+    Spread points onto the grid nodes by linear binning: each point's unit
+    weight is split between its four surrounding nodes in proportion to
+    its distance from them.
+
+    Parameters:
+    -----------
+    x, y : array-like
+        Point coordinates inside the grid
+    x_grid, y_grid : numpy.ndarray
+        Grid node coordinates (see grid_steps)
+
+    Returns:
+    --------
+    counts : numpy.ndarray
+        float64 array of shape (len(y_grid), len(x_grid)); sums to the number of points
+    """
+    height, width = len(y_grid), len(x_grid)
+    dx, dy = grid_steps(x_grid, y_grid)
+
+    # Fractional node positions, rows counted from the northern edge
+    col = np.clip((np.asarray(x, dtype=float) - x_grid[0]) / dx, 0, width - 1)
+    row = np.clip((y_grid[0] - np.asarray(y, dtype=float)) / dy, 0, height - 1)
+    col0 = np.minimum(np.floor(col).astype(np.intp), max(width - 2, 0))
+    row0 = np.minimum(np.floor(row).astype(np.intp), max(height - 2, 0))
+    fx = col - col0
+    fy = row - row0
+    col1 = np.minimum(col0 + 1, width - 1)
+    row1 = np.minimum(row0 + 1, height - 1)
+
+    size = height * width
+    counts = np.bincount(row0 * width + col0, (1 - fy) * (1 - fx), minlength=size)
+    counts += np.bincount(row0 * width + col1, (1 - fy) * fx, minlength=size)
+    counts += np.bincount(row1 * width + col0, fy * (1 - fx), minlength=size)
+    counts += np.bincount(row1 * width + col1, fy * fx, minlength=size)
+    return counts.reshape(height, width)
+
+
+def gaussian_kernel(covariance, dx, dy, max_rows, max_cols, radius=KERNEL_RADIUS):
+    """
+    Sample a bivariate Gaussian on the node offsets of a grid.
+
+    Parameters:
+    -----------
+    covariance : numpy.ndarray
+        2x2 kernel covariance in coordinate units
+    dx, dy : float
+        Grid spacing
+    max_rows, max_cols : int
+        Largest useful offset in rows and columns (the grid size minus one)
+    radius : float, default=KERNEL_RADIUS
+        The kernel extends radius standard deviations along each axis
+
+    Returns:
+    --------
+    kernel : numpy.ndarray
+        Gaussian density at offsets (-rows..rows, -cols..cols), centered;
+        row offsets run southwards like the raster rows
+    """
+    half_cols = int(min(max_cols, np.ceil(radius * np.sqrt(covariance[0, 0]) / dx)))
+    half_rows = int(min(max_rows, np.ceil(radius * np.sqrt(covariance[1, 1]) / dy)))
+
+    offset_x = np.arange(-half_cols, half_cols + 1) * dx
+    offset_y = -np.arange(-half_rows, half_rows + 1) * dy
+    ox, oy = np.meshgrid(offset_x, offset_y)
+
+    inverse = np.linalg.inv(covariance)
+    distance = inverse[0, 0] * ox ** 2 + 2 * inverse[0, 1] * ox * oy + inverse[1, 1] * oy ** 2
+    return np.exp(-0.5 * distance) / (2 * np.pi * np.sqrt(np.linalg.det(covariance)))
+
+
+def kde_binned(x, y, x_grid, y_grid, bandwidth):
+    """
+    Estimate the density at the grid nodes by linear binning and FFT convolution.
+
+    Linear binning widens every point by a tent of one cell, which adds
+    dx**2 / 6 (dy**2 / 6) to the variance along each axis; the kernel
+    covariance is reduced by that amount to compensate. The remaining
+    difference to gaussian_kde is around 1% of the peak for a kernel one
+    cell wide and falls quickly for wider kernels.
+
+    Parameters:
+    -----------
+    x, y : array-like
+        Point coordinates inside the grid
+    x_grid, y_grid : numpy.ndarray
+        Grid node coordinates (see grid_steps)
+    bandwidth : float
+        Bandwidth factor, as gaussian_kde's bw_method
+
+    Returns:
+    --------
+    density : numpy.ndarray
+        float64 density of shape (len(y_grid), len(x_grid))
+    """
+    return convolve_counts(bin_points(x, y, x_grid, y_grid), kde_covariance(x, y, bandwidth),
+                           len(x), x_grid, y_grid)
+
+
+def convolve_counts(counts, covariance, n, x_grid, y_grid, row_start=0, row_stop=None):
+    """
+    Turn linearly binned counts into a density by FFT convolution with the
+    kernel (see kde_binned). A block of rows only needs the counts within
+    the kernel's reach of it, so blocks are convolved independently.
+
+    Parameters:
+    -----------
+    counts : numpy.ndarray
+        Binned point weights of shape (len(y_grid), len(x_grid)), see bin_points
+    covariance : numpy.ndarray
+        2x2 kernel covariance (see kde_covariance)
+    n : float
+        Number of points the counts add up to
+    x_grid, y_grid : numpy.ndarray
+        Grid node coordinates (see grid_steps)
+    row_start, row_stop : int, optional
+        Rows of the density to compute. Defaults to all rows.
+
+    Returns:
+    --------
+    density : numpy.ndarray
+        float64 density of shape (row_stop - row_start, len(x_grid))
+    """
+    return _binned_rows(counts, covariance, n, x_grid, y_grid)(
+        row_start, len(y_grid) if row_stop is None else row_stop)
+
+
+def _binned_kernel(covariance, x_grid, y_grid):
+    dx, dy = grid_steps(x_grid, y_grid)
+    corrected = covariance - np.diag([dx ** 2 / 6, dy ** 2 / 6])
+    if np.all(np.linalg.eigvalsh(corrected) > 0):
+        covariance = corrected
+    return gaussian_kernel(covariance, dx, dy, len(y_grid) - 1, len(x_grid) - 1)
+
+
+def _binned_rows(counts, covariance, n, x_grid, y_grid, kernel=None):
+    """Row evaluator of the binned engine: (row_start, row_stop) -> float64 rows."""
+    if kernel is None:
+        kernel = _binned_kernel(covariance, x_grid, y_grid)
+    halo = kernel.shape[0] // 2
+    height = counts.shape[0]
+
+    def rows(row_start, row_stop):
+        # Counts within the kernel's reach; "same" keeps the slab's rows aligned
+        slab_start = max(0, row_start - halo)
+        slab = counts[slab_start:min(height, row_stop + halo)]
+        density = fftconvolve(slab, kernel, mode="same")[row_start - slab_start:row_stop - slab_start] / n
+        # FFT round-off leaves tiny negative values where the density is zero
+        return np.maximum(density, 0)
+    return rows
+
+
+class TruncatedKernel:
+    """
+    Kernel density evaluation that adds each point's kernel only to the
+    grid nodes within cutoff standard deviations of it (see kde_truncated).
+    The grid index over the points is built once and shared by every block
+    of rows evaluated.
+    """
+
+    def __init__(self, x, y, x_grid, y_grid, covariance, cutoff=DEFAULT_CUTOFF):
+        """
+        Index the points.
+
+        Parameters:
+        -----------
+        x, y : array-like
+            Point coordinates
+        x_grid, y_grid : numpy.ndarray
+            Grid node coordinates (see grid_steps)
+        covariance : numpy.ndarray
+            2x2 kernel covariance (see kde_covariance)
+        cutoff : float, default=DEFAULT_CUTOFF
+            Truncation radius in kernel standard deviations
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.x_grid = x_grid
+        self.y_grid = y_grid
+        self.cutoff = cutoff
+        self.height, self.width = len(y_grid), len(x_grid)
+        self.dx, self.dy = grid_steps(x_grid, y_grid)
+        self.inverse = np.linalg.inv(covariance)
+        self.norm = 1 / (2 * np.pi * np.sqrt(np.linalg.det(covariance)) * len(x))
+
+        # Window of node offsets around a point's nearest node that can lie
+        # within the cutoff ellipse
+        self.half_cols = int(min(self.width - 1, np.ceil(cutoff * np.sqrt(covariance[0, 0]) / self.dx))) + 1
+        self.half_rows = int(min(self.height - 1, np.ceil(cutoff * np.sqrt(covariance[1, 1]) / self.dy))) + 1
+        offset_rows, offset_cols = np.meshgrid(np.arange(-self.half_rows, self.half_rows + 1),
+                                               np.arange(-self.half_cols, self.half_cols + 1),
+                                               indexing="ij")
+        self.offset_rows = offset_rows.ravel()
+        self.offset_cols = offset_cols.ravel()
+
+        # Grid index: nearest node of every point, points sorted by it
+        col = np.clip(np.rint((x - x_grid[0]) / self.dx).astype(np.intp), 0, self.width - 1)
+        row = np.clip(np.rint((y_grid[0] - y) / self.dy).astype(np.intp), 0, self.height - 1)
+        order = np.argsort(row * self.width + col, kind="stable")
+        self.x, self.y, self.row, self.col = x[order], y[order], row[order], col[order]
+
+    def rows(self, row_start, row_stop, max_pairs=_PAIRS_PER_CHUNK):
+        """
+        Evaluate a block of rows.
+
+        Kernel values are rounded to multiples of 2**-32 and summed as
+        integers, which is exact and so independent of the summation order:
+        the result is bit-for-bit identical across runs, chunk sizes
+        (max_pairs) and blocks of rows for the same input.
+
+        Parameters:
+        -----------
+        row_start, row_stop : int
+            Rows of the density to compute
+        max_pairs : int, default=4000000
+            Upper bound on the (point, node) pairs evaluated at once
+
+        Returns:
+        --------
+        density : numpy.ndarray
+            float64 density of shape (row_stop - row_start, len(x_grid))
+        """
+        width = self.width
+        block_height = row_stop - row_start
+        density = np.zeros(block_height * width, dtype=np.int64)
+
+        # Points whose window reaches the block (the index is sorted by row)
+        first, last = np.searchsorted(self.row, [row_start - self.half_rows, row_stop + self.half_rows])
+        chunk = min(_MAX_CHUNK_POINTS, max(1, max_pairs // len(self.offset_rows)))
+        limit = self.cutoff ** 2
+        inverse = self.inverse
+        for start in range(first, last, chunk):
+            points = slice(start, min(last, start + chunk))
+            rows = self.row[points][:, None] + self.offset_rows
+            cols = self.col[points][:, None] + self.offset_cols
+            inside = (rows >= row_start) & (rows < row_stop) & (cols >= 0) & (cols < width)
+            rows = np.clip(rows, row_start, row_stop - 1)
+            cols = np.clip(cols, 0, width - 1)
+
+            # Offsets from the point to the nodes, in coordinate units
+            ox = self.x_grid[0] + cols * self.dx - self.x[points][:, None]
+            oy = self.y_grid[0] - rows * self.dy - self.y[points][:, None]
+            distance = inverse[0, 0] * ox ** 2 + 2 * inverse[0, 1] * ox * oy + inverse[1, 1] * oy ** 2
+            inside &= distance <= limit
+
+            weights = np.rint(np.exp(-0.5 * distance[inside]) * _FIXED_POINT)
+            density += np.bincount(((rows - row_start) * width + cols)[inside],
+                                   weights, minlength=block_height * width).astype(np.int64)
+        return (density * (self.norm / _FIXED_POINT)).reshape(block_height, width)
+
+
+def kde_truncated(x, y, x_grid, y_grid, bandwidth, cutoff=DEFAULT_CUTOFF, covariance=None):
+    """
+    Estimate the density by adding each point's kernel to the grid nodes
+    within cutoff standard deviations of it (Mahalanobis distance), and
+    nothing beyond. Within the cutoff the values are those of gaussian_kde,
+    up to rounding each kernel value to 2**-32 of its peak.
+
+    Points are ordered by their grid cell (a grid index, so neighbouring
+    points touch neighbouring memory), and kernel values are summed as
+    fixed-point integers (see TruncatedKernel.rows); the result is
+    bit-for-bit identical across runs for the same input.
+
+    Parameters:
+    -----------
+    x, y : array-like
+        Point coordinates
+    x_grid, y_grid : numpy.ndarray
+        Grid node coordinates (see grid_steps)
+    bandwidth : float
+        Bandwidth factor, as gaussian_kde's bw_method
+    cutoff : float, default=DEFAULT_CUTOFF
+        Truncation radius in kernel standard deviations
+    covariance : numpy.ndarray, optional
+        Kernel covariance, if already known (see kde_covariance)
+
+    Returns:
+    --------
+    density : numpy.ndarray
+        float64 density of shape (len(y_grid), len(x_grid))
+    """
+    if covariance is None:
+        covariance = kde_covariance(x, y, bandwidth)
+    return TruncatedKernel(x, y, x_grid, y_grid, covariance, cutoff).rows(0, len(y_grid))
+
+
+def kde_exact(x, y, x_grid, y_grid, bandwidth):
+    """
+    Evaluate scipy's gaussian_kde at every grid node (O(points x cells)).
+
+    Parameters:
+    -----------
+    x, y : array-like
+        Point coordinates
+    x_grid, y_grid : numpy.ndarray
+        Grid node coordinates
+    bandwidth : float
+        Bandwidth factor passed as bw_method
+
+    Returns:
+    --------
+    density : numpy.ndarray
+        float64 density of shape (len(y_grid), len(x_grid))
+    """
+    return _exact_rows(x, y, x_grid, y_grid, bandwidth)(0, len(y_grid))
+
+
+def _exact_rows(x, y, x_grid, y_grid, bandwidth):
+    """Row evaluator of the exact engine: (row_start, row_stop) -> float64 rows."""
+    kernel = gaussian_kde(np.vstack([x, y]), bw_method=bandwidth)
+
+    def rows(row_start, row_stop):
+        # Node coordinates of the block only
+        xx, yy = np.meshgrid(x_grid, y_grid[row_start:row_stop])
+        return kernel(np.vstack([xx.ravel(), yy.ravel()])).reshape(xx.shape)
+    return rows
+
+
+def block_rows(width, memory_limit, halo_rows=0):
+    """
+    Get the number of raster rows to evaluate at once under a memory ceiling.
+
+    Parameters:
+    -----------
+    width : int
+        Raster width in cells
+    memory_limit : int
+        Bytes available for one block's working arrays
+    halo_rows : int, default=0
+        Extra rows each block needs on both sides (the binned engine's kernel
+        reach). Blocks are not made smaller than half the budget for it, so a
+        kernel reaching further than that exceeds the ceiling by its reach.
+
+    Returns:
+    --------
+    rows : int
+        Rows per block (at least 1)
+    """
+    budget = int(memory_limit // (BYTES_PER_CELL * width))
+    return max(1, budget - 2 * halo_rows, budget // 2)
+
+
+def estimate_density(x, y, x_grid, y_grid, bandwidth, engine="fft", cutoff=DEFAULT_CUTOFF):
+    """
+    Estimate the point density at the grid nodes with the chosen engine.
+
+    Parameters:
+    -----------
+    x, y : array-like
+        Point coordinates
+    x_grid, y_grid : numpy.ndarray
+        Grid node coordinates: x ascending, y descending, both evenly spaced
+    bandwidth : float
+        Bandwidth factor, as gaussian_kde's bw_method
+    engine : str, default="fft"
+        "fft" for kde_binned, "truncated" for kde_truncated, "exact" for
+        kde_exact. With "fft", kernels narrower than MIN_KERNEL_CELLS cells
+        are evaluated by kde_truncated with a KERNEL_RADIUS cutoff.
+    cutoff : float, default=DEFAULT_CUTOFF
+        Truncation radius of the "truncated" engine in kernel standard deviations
+
+    Returns:
+    --------
+    density : numpy.ndarray
+        float64 density of shape (len(y_grid), len(x_grid))
+    """
+    accumulator = DensityAccumulator(x_grid, y_grid)
+    accumulator.add(x, y)
+    return accumulator.density(bandwidth, engine, cutoff)
+
+
+class DensityAccumulator:
+    """
+    Running state of a density over a fixed grid: linearly binned counts
+    (float32) and the point moments the kernel covariance is derived from.
+
+    Densities with one kernel are linear in the points, so accumulators of
+    disjoint point sets (e.g. categories) merge into the accumulator of
+    their union, and the combined density needs neither the points binned
+    again nor their covariance recomputed.
+    """
+
+    def __init__(self, x_grid, y_grid):
+        """
+        Initialize an empty accumulator.
+
+        Parameters:
+        -----------
+        x_grid, y_grid : numpy.ndarray
+            Grid node coordinates: x ascending, y descending, both evenly spaced
+        """
+        self.x_grid = x_grid
+        self.y_grid = y_grid
+        self.counts = np.zeros((len(y_grid), len(x_grid)), dtype=np.float32)
+        self.count = 0
+        self.mean = np.zeros(2)
+        # Sum of outer products of deviations from the mean (for the covariance)
+        self.comoment = np.zeros((2, 2))
+        # The exact engine and very narrow kernels need the points themselves
+        self._points = []
+
+    def add(self, x, y):
+        """
+        Accumulate points.
+
+        Parameters:
+        -----------
+        x, y : array-like
+            Point coordinates inside the grid
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if len(x) == 0:
+            return
+        points = np.vstack([x, y])
+        mean = points.mean(axis=1)
+        deviations = points - mean[:, None]
+        self._merge(len(x), mean, deviations @ deviations.T)
+        self.counts += bin_points(x, y, self.x_grid, self.y_grid).astype(np.float32)
+        self._points.append(points)
+
+    def merge(self, other):
+        """
+        Accumulate the points of another accumulator on the same grid.
+
+        Parameters:
+        -----------
+        other : DensityAccumulator
+            The accumulator to add
+        """
+        if other.count == 0:
+            return
+        self._merge(other.count, other.mean, other.comoment)
+        self.counts += other.counts
+        self._points.extend(other._points)
+
+    def binned(self):
+        """
+        Get the accumulated counts and moments without the points, e.g. to
+        send them to another process (see merge_binned).
+
+        Returns:
+        --------
+        binned : dict
+            'counts', 'count', 'mean' and 'comoment'
+        """
+        return {'counts': self.counts, 'count': self.count, 'mean': self.mean, 'comoment': self.comoment}
+
+    def merge_binned(self, binned, x=None, y=None):
+        """
+        Accumulate the counts and moments of another accumulator on the same grid.
+
+        Parameters:
+        -----------
+        binned : dict
+            The other accumulator's binned()
+        x, y : array-like, optional
+            Its points; needed by the "exact" and "truncated" engines and by
+            very narrow kernels, not by the binned engine
+        """
+        if binned['count'] == 0:
+            return
+        self._merge(binned['count'], binned['mean'], binned['comoment'])
+        self.counts += binned['counts']
+        if x is not None:
+            self._points.append(np.vstack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)]))
+
+    def _merge(self, count, mean, comoment):
+        # Pairwise update of the co-moment, stable for coordinates far from zero
+        total = self.count + count
+        delta = mean - self.mean
+        self.comoment = self.comoment + comoment + np.outer(delta, delta) * self.count * count / total
+        self.mean = self.mean + delta * count / total
+        self.count = total
+
+    def covariance(self, bandwidth):
+        """
+        Get the kernel covariance of the accumulated points (see kde_covariance).
+
+        Parameters:
+        -----------
+        bandwidth : float
+            Bandwidth factor, as gaussian_kde's bw_method
+
+        Returns:
+        --------
+        covariance : numpy.ndarray
+            2x2 kernel covariance
+        """
+        return self.comoment / (self.count - 1) * bandwidth ** 2
+
+    def density(self, bandwidth, engine="fft", cutoff=DEFAULT_CUTOFF):
+        """
+        Estimate the density of the accumulated points (see estimate_density).
+
+        Parameters:
+        -----------
+        bandwidth : float
+            Bandwidth factor, as gaussian_kde's bw_method
+        engine : str, default="fft"
+            "fft", "truncated" or "exact"
+        cutoff : float, default=DEFAULT_CUTOFF
+            Truncation radius of the "truncated" engine in kernel standard deviations
+
+        Returns:
+        --------
+        density : numpy.ndarray
+            float64 density of shape (len(y_grid), len(x_grid))
+        """
+        rows, _ = self._row_evaluator(bandwidth, engine, cutoff, _PAIRS_PER_CHUNK)
+        return rows(0, len(self.y_grid))
+
+    def density_blocks(self, bandwidth, engine="fft", cutoff=DEFAULT_CUTOFF, memory_limit=None):
+        """
+        Estimate the density block of rows by block, so that only one block
+        and its working arrays are in memory at a time.
+
+        Parameters:
+        -----------
+        bandwidth : float
+            Bandwidth factor, as gaussian_kde's bw_method
+        engine : str, default="fft"
+            "fft", "truncated" or "exact"
+        cutoff : float, default=DEFAULT_CUTOFF
+            Truncation radius of the "truncated" engine in kernel standard deviations
+        memory_limit : int, optional
+            Bytes available for a block's working arrays. Defaults to one block
+            of the whole raster.
+
+        Yields:
+        -------
+        (row_start, density) : tuple
+            First row of the block and its float32 density
+        """
+        height, width = len(self.y_grid), len(self.x_grid)
+        max_pairs = _PAIRS_PER_CHUNK
+        if memory_limit is not None:
+            max_pairs = max(1, int(memory_limit // BYTES_PER_PAIR))
+        rows, halo = self._row_evaluator(bandwidth, engine, cutoff, max_pairs)
+
+        step = height if memory_limit is None else block_rows(width, memory_limit, halo)
+        for row_start in range(0, height, step):
+            row_stop = min(height, row_start + step)
+            yield row_start, rows(row_start, row_stop).astype(np.float32)
+
+    def _row_evaluator(self, bandwidth, engine, cutoff, max_pairs):
+        """
+        Set up an engine once for the accumulated points.
+
+        Returns:
+        --------
+        (rows, halo) : tuple
+            Function (row_start, row_stop) -> float64 rows, and the number
+            of rows beyond a block the engine reads
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown density engine {engine!r}; expected one of {ENGINES}")
+        covariance = self.covariance(bandwidth)
+        if engine == "fft" and kernel_cells(covariance, self.x_grid, self.y_grid) >= MIN_KERNEL_CELLS:
+            kernel = _binned_kernel(covariance, self.x_grid, self.y_grid)
+            return (_binned_rows(self.counts, covariance, self.count, self.x_grid, self.y_grid, kernel),
+                    kernel.shape[0] // 2)
+
+        points = np.hstack(self._points)
+        if engine == "exact":
+            return _exact_rows(points[0], points[1], self.x_grid, self.y_grid, bandwidth), 0
+        if engine == "fft":
+            # Narrow kernels: evaluate without binning, practically untruncated
+            cutoff = KERNEL_RADIUS
+        kernel = TruncatedKernel(points[0], points[1], self.x_grid, self.y_grid, covariance, cutoff)
+        return (lambda row_start, row_stop: kernel.rows(row_start, row_stop, max_pairs)), 0
+
+
+def normalize(density, low=None, high=None):
+    """
+    Scale a density to [0, 1] (unchanged if it is constant).
+
+    Parameters:
+    -----------
+    density : numpy.ndarray
+        The density, or a block of it
+    low, high : float, optional
+        Minimum and maximum of the whole density when scaling a block.
+        Default to those of density.
+
+    Returns:
+    --------
+    density : numpy.ndarray
+        The scaled density
+    """
+    low = density.min() if low is None else low
+    high = density.max() if high is None else high
+    if high > low:
+        return (density - low) / (high - low)
+    return density
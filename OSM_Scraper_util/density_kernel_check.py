@@ -0,0 +1,71 @@
+# Checks the fast density engines against the exact gaussian_kde engine on
+# fixed synthetic points, with explicit tolerances on the normalized rasters,
+# and checks that the truncated engine is bit-for-bit reproducible across
+# runs, chunk sizes and row blocks. Raises AssertionError on failure.
+# Run with: python density_kernel_check.py
+
+import numpy as np
+
+import density_kernel
+from density_kernel_benchmark import make_points
+
+
+# Largest allowed difference to the exact engine as a fraction of its peak,
+# by (engine, cutoff), for check()'s default grid and bandwidth. The cutoff
+# only applies to the truncated engine.
+TOLERANCES = {
+    ("fft", density_kernel.DEFAULT_CUTOFF): 2e-3,
+    ("truncated", density_kernel.DEFAULT_CUTOFF): 5e-4,
+    ("truncated", 6.0): 1e-7,
+}
+
+
+def check(n=2000, seed=0, cell_size=0.001, bandwidth=0.1):
+    """
+    Run every check and print the measured differences.
+
+    Parameters:
+    -----------
+    n : int, default=2000
+        Number of points
+    seed : int, default=0
+        Random seed of the points
+    cell_size : float, default=0.001
+        Raster cell size in degrees
+    bandwidth : float, default=0.1
+        KDE bandwidth factor
+
+    Raises:
+    -------
+    AssertionError
+        If an engine is outside its tolerance or the truncated engine is not reproducible
+    """
+    x, y = make_points(n, seed)
+    x_grid = np.arange(x.min(), x.max() + cell_size, cell_size)
+    y_grid = np.arange(y.max(), y.min() - cell_size, -cell_size)
+
+    exact = density_kernel.kde_exact(x, y, x_grid, y_grid, bandwidth)
+    for (engine, cutoff), tolerance in TOLERANCES.items():
+        density = density_kernel.estimate_density(x, y, x_grid, y_grid, bandwidth, engine, cutoff)
+        difference = float(np.abs(density - exact).max() / exact.max())
+        print(f"{engine:<10} cutoff {cutoff:<4} max diff/peak {difference:.2e} (tolerance {tolerance:.0e})")
+        assert difference <= tolerance, f"{engine} engine differs from exact by {difference:.2e}"
+
+    covariance = density_kernel.kde_covariance(x, y, bandwidth)
+    height = len(y_grid)
+    first = density_kernel.kde_truncated(x, y, x_grid, y_grid, bandwidth)
+    second = density_kernel.kde_truncated(x, y, x_grid, y_grid, bandwidth)
+    assert np.array_equal(first, second), "truncated engine differs between runs"
+
+    kernel = density_kernel.TruncatedKernel(x, y, x_grid, y_grid, covariance)
+    for max_pairs in (1, 997, 50_000):
+        chunked = kernel.rows(0, height, max_pairs=max_pairs)
+        assert np.array_equal(first, chunked), f"truncated engine depends on max_pairs={max_pairs}"
+
+    blocks = np.vstack([kernel.rows(start, min(height, start + 7)) for start in range(0, height, 7)])
+    assert np.array_equal(first, blocks), "truncated engine depends on row blocks"
+    print("truncated engine bit-for-bit identical across runs, chunk sizes and row blocks")
+
+
+if __name__ == "__main__":
+    check()
@@ -0,0 +1,178 @@
+# Vectorized geometry helpers shared by the OSM services. Every function works on
+# a whole GeoSeries/GeoDataFrame/array through shapely 2's vectorized functions
+# instead of per-row lambdas; masks are numpy boolean arrays usable as gdf[mask].
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+
+# shapely.get_type_id codes (-1 marks missing geometries)
+MISSING = -1
+POINT = 0
+LINESTRING = 1
+LINEARRING = 2
+POLYGON = 3
+MULTIPOINT = 4
+MULTILINESTRING = 5
+MULTIPOLYGON = 6
+GEOMETRYCOLLECTION = 7
+
+_TYPE_IDS = {
+    'Point': POINT,
+    'LineString': LINESTRING,
+    'LinearRing': LINEARRING,
+    'Polygon': POLYGON,
+    'MultiPoint': MULTIPOINT,
+    'MultiLineString': MULTILINESTRING,
+    'MultiPolygon': MULTIPOLYGON,
+    'GeometryCollection': GEOMETRYCOLLECTION,
+}
+
+
+def geometry_array(geoms):
+    """
+    Get the geometries as a numpy object array without copying them.
+
+    Parameters:
+    -----------
+    geoms : GeoSeries, GeoDataFrame, GeometryArray or array-like
+        The geometries (the active geometry column of a GeoDataFrame)
+
+    Returns:
+    --------
+    array : numpy.ndarray
+        Object array of shapely geometries (None where missing)
+    """
+    if isinstance(geoms, gpd.GeoDataFrame):
+        geoms = geoms.geometry
+    if isinstance(geoms, gpd.GeoSeries):
+        geoms = geoms.values
+    return np.asarray(geoms, dtype=object)
+
+
+def type_ids(geoms):
+    """
+    Get the shapely geometry type id of every geometry.
+
+    Parameters:
+    -----------
+    geoms : GeoSeries, GeoDataFrame, GeometryArray or array-like
+        The geometries
+
+    Returns:
+    --------
+    ids : numpy.ndarray
+        One type id per geometry (see the constants above; -1 for missing)
+    """
+    return shapely.get_type_id(geometry_array(geoms))
+
+
+def type_mask(geoms, *geom_types):
+    """
+    Flag geometries of the given types.
+
+    Parameters:
+    -----------
+    geoms : GeoSeries, GeoDataFrame, GeometryArray or array-like
+        The geometries
+    *geom_types : str
+        Geometry type names, e.g. 'Polygon', 'MultiPolygon'
+
+    Returns:
+    --------
+    mask : numpy.ndarray of bool
+        True where the geometry is one of the types (missing geometries are False)
+    """
+    return np.isin(type_ids(geoms), [_TYPE_IDS[geom_type] for geom_type in geom_types])
+
+
+def is_point(geoms):
+    """Flag Point geometries."""
+    return type_ids(geoms) == POINT
+
+
+def is_linear(geoms):
+    """Flag LineString and MultiLineString geometries."""
+    return np.isin(type_ids(geoms), [LINESTRING, MULTILINESTRING])
+
+
+def is_polygonal(geoms):
+    """Flag Polygon and MultiPolygon geometries."""
+    return np.isin(type_ids(geoms), [POLYGON, MULTIPOLYGON])
+
+
+def is_present(geoms):
+    """Flag geometries that are neither missing nor empty."""
+    array = geometry_array(geoms)
+    return ~shapely.is_missing(array) & ~shapely.is_empty(array)
+
+
+def centroids(geoms, mask=None):
+    """
+    Replace geometries by their centroids.
+
+    Parameters:
+    -----------
+    geoms : GeoSeries, GeoDataFrame, GeometryArray or array-like
+        The geometries
+    mask : array-like of bool, optional
+        Only these geometries are replaced. Defaults to all of them.
+
+    Returns:
+    --------
+    array : numpy.ndarray
+        New object array; unmasked geometries are the original objects
+    """
+    array = geometry_array(geoms)
+    if mask is None:
+        return shapely.centroid(array)
+    result = array.copy()
+    result[mask] = shapely.centroid(array[mask])
+    return result
+
+
+def polygons_to_centroids(geoms):
+    """
+    Replace (multi)polygons by their centroids and keep all other geometries.
+
+    Parameters:
+    -----------
+    geoms : GeoSeries, GeoDataFrame, GeometryArray or array-like
+        The geometries
+
+    Returns:
+    --------
+    (array, converted) : tuple
+        New object array of geometries and the number of polygons converted
+    """
+    mask = is_polygonal(geoms)
+    if not mask.any():
+        return geometry_array(geoms), 0
+    return centroids(geoms, mask), int(mask.sum())
+
+
+def simplify(geoms, tolerance, mask=None):
+    """
+    Simplify geometries in one vectorized call.
+
+    Parameters:
+    -----------
+    geoms : GeoSeries, GeoDataFrame, GeometryArray or array-like
+        The geometries
+    tolerance : float
+        Simplification tolerance in the geometries' units
+    mask : array-like of bool, optional
+        Only these geometries are simplified. Defaults to all of them.
+
+    Returns:
+    --------
+    array : numpy.ndarray
+        New object array of geometries
+    """
+    array = geometry_array(geoms)
+    if mask is None:
+        return shapely.simplify(array, tolerance)
+    result = array.copy()
+    result[mask] = shapely.simplify(array[mask], tolerance)
+    return result
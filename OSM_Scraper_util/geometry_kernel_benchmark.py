@@ -0,0 +1,179 @@
+# Microbenchmarks of the geometry kernel against the per-row code it replaced,
+# one case per call site. Run with: python geometry_kernel_benchmark.py [n]
+
+import sys
+import time
+import warnings
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+import geometry_kernel
+from osm_pipeline import CleaningPipeline
+
+
+def make_features(n, seed=0):
+    """
+    Build a synthetic OSM-like feature frame: 60% points, 30% polygons,
+    10% linestrings, around Manhattan.
+
+    Parameters:
+    -----------
+    n : int
+        Number of features
+    seed : int, default=0
+        Random seed
+
+    Returns:
+    --------
+    gdf : geopandas.GeoDataFrame
+        Features with an 'amenity' column
+    """
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-74.02, -73.93, n)
+    y = rng.uniform(40.70, 40.80, n)
+    kind = rng.choice(3, size=n, p=[0.6, 0.3, 0.1])
+
+    geometries = shapely.points(x, y)
+    polygons = kind == 1
+    geometries[polygons] = shapely.buffer(geometries[polygons], 0.0002, quad_segs=2)
+    lines = kind == 2
+    geometries[lines] = shapely.linestrings(
+        np.stack([np.stack([x[lines], y[lines]], axis=1),
+                  np.stack([x[lines] + 0.001, y[lines] + 0.0005], axis=1),
+                  np.stack([x[lines] + 0.002, y[lines]], axis=1)], axis=1))
+
+    amenities = np.array(['restaurant', 'cafe', 'bench', 'school', 'bank'], dtype=object)
+    return gpd.GeoDataFrame({'amenity': amenities[rng.integers(0, len(amenities), n)]},
+                            geometry=geometries, crs="EPSG:4326")
+
+
+def _time(function, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _collect_data_old(gdf):
+    gdf = gdf.copy()
+    polygon_mask = gdf.geometry.apply(lambda geom:
+        geom.geom_type == 'Polygon' or geom.geom_type == 'MultiPolygon')
+    if polygon_mask.any():
+        gdf.loc[polygon_mask, 'geometry'] = gdf.loc[polygon_mask, 'geometry'].centroid
+    return gdf
+
+
+def _collect_data_new(gdf):
+    geometries, num_polygons = geometry_kernel.polygons_to_centroids(gdf)
+    if num_polygons:
+        gdf = gdf.set_geometry(gpd.GeoSeries(geometries, index=gdf.index, crs=gdf.crs))
+    return gdf
+
+
+def _convert_polygons_old(gdf):
+    converted_gdf = gdf.copy()
+    polygon_mask = converted_gdf.geometry.apply(lambda geom:
+        (geom.geom_type == 'Polygon' or geom.geom_type == 'MultiPolygon'))
+    if polygon_mask.any():
+        converted_gdf.loc[polygon_mask, 'geometry'] = converted_gdf.loc[polygon_mask, 'geometry'].centroid
+    return converted_gdf
+
+
+def _convert_polygons_new(gdf):
+    return CleaningPipeline().polygons_to_points().run({'amenity': gdf})
+
+
+def _heatmap_points_old(gdf):
+    amenity_data = gdf.copy()
+    points_mask = amenity_data.geometry.apply(lambda x: x.geom_type == 'Point')
+    return amenity_data[points_mask]
+
+
+def _heatmap_points_new(gdf):
+    return CleaningPipeline().points_only().run({'amenity': gdf}, type_column='facility_type',
+                                                columns=['name'])
+
+
+def _export_shp_old(gdf):
+    gdf_copy = gdf.copy()
+    point_mask = gdf_copy.geometry.apply(
+        lambda geom: geom is not None and geom.geom_type == 'Point')
+    return gdf_copy[point_mask].copy()
+
+
+def _export_shp_new(gdf):
+    return gdf[geometry_kernel.is_point(gdf)].copy()
+
+
+def _preview_old(gdf):
+    drawn = []
+    for geom in gdf.geometry:
+        if not geom:
+            continue
+        if geom.geom_type == 'Point':
+            drawn.append(geom)
+        elif geom.geom_type in ['LineString', 'MultiLineString', 'Polygon', 'MultiPolygon']:
+            simplified = geom.simplify(0.0001)
+            if not simplified.is_empty:
+                drawn.append(simplified)
+    return drawn
+
+
+def _preview_new(gdf):
+    is_point = geometry_kernel.is_point(gdf)
+    is_shape = geometry_kernel.is_linear(gdf) | geometry_kernel.is_polygonal(gdf)
+    simplified = geometry_kernel.simplify(gdf, 0.0001, mask=is_shape)
+    return simplified[geometry_kernel.is_present(simplified) & (is_point | is_shape)]
+
+
+def _street_network_old(gdf):
+    return gdf[gdf.geometry.apply(lambda x: x.geom_type == 'LineString')]
+
+
+def _street_network_new(gdf):
+    return gdf[geometry_kernel.type_mask(gdf, 'LineString')]
+
+
+CASES = [
+    ("on_collect_data_clicked", _collect_data_old, _collect_data_new),
+    ("convert_polygons_to_points", _convert_polygons_old, _convert_polygons_new),
+    ("prepare_heatmap_data", _heatmap_points_old, _heatmap_points_new),
+    ("export_shp_handler", _export_shp_old, _export_shp_new),
+    ("on_preview_clicked", _preview_old, _preview_new),
+    ("process_street_network", _street_network_old, _street_network_new),
+]
+
+
+def run(n=100000):
+    """
+    Time every call site on n synthetic features and print a table.
+
+    Parameters:
+    -----------
+    n : int, default=100000
+        Number of features
+
+    Returns:
+    --------
+    results : list
+        (call site, old seconds, new seconds) tuples
+    """
+    gdf = make_features(n)
+    results = []
+    # GeoSeries.centroid warns about the geographic CRS of the synthetic data
+    warnings.filterwarnings("ignore", message="Geometry is in a geographic CRS")
+    print(f"{'call site':<28}{'per-row (s)':>12}{'kernel (s)':>12}{'speedup':>10}")
+    for name, old, new in CASES:
+        old_seconds = _time(lambda: old(gdf))
+        new_seconds = _time(lambda: new(gdf))
+        results.append((name, old_seconds, new_seconds))
+        print(f"{name:<28}{old_seconds:>12.4f}{new_seconds:>12.4f}{old_seconds / new_seconds:>9.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
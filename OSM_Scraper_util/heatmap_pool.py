@@ -0,0 +1,192 @@
+import queue
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+import density_kernel
+
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def write_density_raster(accumulator, output_path, profile, bandwidth, engine, kernel_cutoff, memory_limit):
+    """
+    Evaluate a density block of rows by block into a raster, then scale it
+    to [0, 1] in place, so no more than one block is held in memory.
+
+    Parameters:
+    -----------
+    accumulator : density_kernel.DensityAccumulator
+        The points of the raster
+    output_path : str
+        Path of the GeoTIFF to write
+    profile : dict
+        rasterio creation options (size, dtype, crs, transform)
+    bandwidth : float
+        KDE bandwidth parameter
+    engine : str
+        Density engine (see density_kernel.estimate_density)
+    kernel_cutoff : float
+        Truncation radius of the "truncated" engine in kernel standard deviations
+    memory_limit : int
+        Memory ceiling in bytes
+    """
+    width, height = profile['width'], profile['height']
+    low, high = np.inf, -np.inf
+
+    with rasterio.open(output_path, 'w+', **profile) as dst:
+        for row_start, block in accumulator.density_blocks(bandwidth, engine, kernel_cutoff, memory_limit):
+            dst.write(block, 1, window=Window(0, row_start, width, len(block)))
+            low = min(low, float(block.min()))
+            high = max(high, float(block.max()))
+
+        # Normalize density between 0 and 1 with the raster's range
+        step = density_kernel.block_rows(width, memory_limit)
+        for row_start in range(0, height, step):
+            window = Window(0, row_start, width, min(step, height - row_start))
+            block = density_kernel.normalize(dst.read(1, window=window), low, high)
+            dst.write(block.astype('float32'), 1, window=window)
+
+
+class HeatmapProcessPool:
+    """
+    Renders density rasters in worker processes. The point coordinates are
+    placed in shared memory once and every worker maps them, so a task only
+    carries the range of points it covers; workers write their rasters
+    themselves, return the binned counts and moments of their points (so
+    the caller can merge them, e.g. into a combined raster, without binning
+    the points again) and report progress through a queue that the calling
+    process forwards to its callback.
+
+    Use as a context manager; the shared memory is released on exit.
+    """
+
+    def __init__(self, x, y, x_grid, y_grid, max_workers=None, logger=None):
+        """
+        Initialize the pool.
+
+        Parameters:
+        -----------
+        x, y : numpy.ndarray
+            Coordinates of every point, ordered so that each raster's points
+            are a contiguous range
+        x_grid, y_grid : numpy.ndarray
+            Grid node coordinates shared by all rasters
+        max_workers : int, optional
+            Number of worker processes. Defaults to the number of CPUs.
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.x = x
+        self.y = y
+        self.x_grid = x_grid
+        self.y_grid = y_grid
+        self.max_workers = max_workers
+        self.logger = logger or logging.getLogger("HeatmapProcessPool")
+        self._memory = None
+        self._pool = None
+        self._messages = None
+
+    def __enter__(self):
+        count = len(self.x)
+        # A zero-sized block cannot be created
+        self._memory = shared_memory.SharedMemory(create=True, size=max(1, 2 * count * 8))
+        points = np.ndarray((2, count), dtype=np.float64, buffer=self._memory.buf)
+        points[0] = self.x
+        points[1] = self.y
+        del points
+
+        context = multiprocessing.get_context()
+        self._messages = context.Queue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._memory.name, count, self.x_grid, self.y_grid, self._messages),
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._pool.shutdown(wait=True, cancel_futures=exc_type is not None)
+        self._messages.close()
+        self._memory.close()
+        self._memory.unlink()
+
+    def render(self, tasks, settings, progress=None):
+        """
+        Render rasters, returning as they finish.
+
+        Parameters:
+        -----------
+        tasks : list of (str, int, int, str)
+            Raster label, first and end point index, and output path
+        settings : dict
+            bandwidth, engine, kernel_cutoff, memory_limit and profile, as for
+            write_density_raster
+        progress : callable, optional
+            Called with each progress message of the workers, in this process
+
+        Yields:
+        -------
+        (label, output_path, binned) : tuple
+            A finished raster and its DensityAccumulator.binned() state
+
+        Raises:
+        -------
+        Exception
+            The error of the first failed raster; the remaining ones are cancelled
+        """
+        pending = {self._pool.submit(_render, label, start, stop, output_path, settings)
+                   for label, start, stop, output_path in tasks}
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                self._forward(progress)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+            self._forward(progress)
+
+    def _forward(self, progress):
+        while True:
+            try:
+                message = self._messages.get_nowait()
+            except queue.Empty:
+                return
+            if progress is not None:
+                progress(message)
+
+
+def _init_worker(memory_name, count, x_grid, y_grid, messages):
+    try:
+        # The creating process owns the block; workers must not unlink it on exit
+        memory = shared_memory.SharedMemory(name=memory_name, track=False)
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=memory_name)
+    _worker['memory'] = memory
+    _worker['points'] = np.ndarray((2, count), dtype=np.float64, buffer=memory.buf)
+    _worker['x_grid'] = x_grid
+    _worker['y_grid'] = y_grid
+    _worker['messages'] = messages
+
+
+def _render(label, start, stop, output_path, settings):
+    messages = _worker['messages']
+    messages.put(f"Processing {label} with {stop - start} points...")
+
+    points = _worker['points']
+    accumulator = density_kernel.DensityAccumulator(_worker['x_grid'], _worker['y_grid'])
+    accumulator.add(points[0, start:stop], points[1, start:stop])
+    write_density_raster(accumulator, output_path, settings['profile'], settings['bandwidth'],
+                         settings['engine'], settings['kernel_cutoff'], settings['memory_limit'])
+
+    messages.put(f"✓ Created raster for {label}")
+    return label, output_path, accumulator.binned()
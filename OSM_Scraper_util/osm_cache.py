@@ -0,0 +1,1001 @@
+import os
+import re
+import json
+import gzip
+import math
+import hashlib
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import box
+from shapely.prepared import prep
+
+from osm_tags import osm_features
+from overpass_parser import OverpassJSONStream
+
+
+def lonlat_to_tile(lon, lat, zoom):
+    """
+    Convert a WGS84 coordinate to slippy-map tile indices.
+
+    Parameters:
+    -----------
+    lon, lat : float
+        Coordinate in degrees
+    zoom : int
+        Zoom level of the tile lattice
+
+    Returns:
+    --------
+    (x, y) : tuple of int
+        Tile column and row
+    """
+    n = 2 ** zoom
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def lonlat_to_tiles(lons, lats, zoom):
+    """
+    Vectorized lonlat_to_tile for arrays of coordinates.
+
+    Parameters:
+    -----------
+    lons, lats : array-like
+        Coordinates in degrees
+    zoom : int
+        Zoom level of the tile lattice
+
+    Returns:
+    --------
+    (x, y) : tuple of numpy.ndarray
+        Tile columns and rows
+    """
+    n = 2 ** zoom
+    lats = np.clip(np.asarray(lats, dtype="float64"), -85.05112878, 85.05112878)
+    x = ((np.asarray(lons, dtype="float64") + 180.0) / 360.0 * n).astype("int64")
+    y = ((1.0 - np.arcsinh(np.tan(np.radians(lats))) / np.pi) / 2.0 * n).astype("int64")
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def tile_bounds(x, y, zoom):
+    """
+    Get the WGS84 bounds of a slippy-map tile.
+
+    Parameters:
+    -----------
+    x, y : int
+        Tile column and row
+    zoom : int
+        Zoom level of the tile lattice
+
+    Returns:
+    --------
+    bounds : tuple
+        (minx, miny, maxx, maxy) in degrees
+    """
+    n = 2 ** zoom
+
+    def lat_of(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return (x / n * 360.0 - 180.0, lat_of(y + 1), (x + 1) / n * 360.0 - 180.0, lat_of(y))
+
+
+def tiles_for_geometry(geometry, zoom):
+    """
+    List the lattice tiles that intersect a geometry.
+
+    Parameters:
+    -----------
+    geometry : shapely.geometry
+        The area in EPSG:4326
+    zoom : int
+        Zoom level of the tile lattice
+
+    Returns:
+    --------
+    tiles : list of (int, int)
+        (x, y) of every intersecting tile
+    """
+    minx, miny, maxx, maxy = geometry.bounds
+    x_min, y_min = lonlat_to_tile(minx, maxy, zoom)
+    x_max, y_max = lonlat_to_tile(maxx, miny, zoom)
+
+    prepared = prep(geometry)
+    return [
+        (x, y)
+        for x in range(x_min, x_max + 1)
+        for y in range(y_min, y_max + 1)
+        if prepared.intersects(box(*tile_bounds(x, y, zoom)))
+    ]
+
+
+class FileCacheBudget:
+    """
+    Age and size limits for a cache kept as one file per entry. A file's
+    modification time is when the entry was stored and its access time when
+    it was last read (set explicitly, so it does not depend on how the file
+    system records reads); expired entries are dropped, then least recently
+    used entries until the folder fits its size budget.
+    """
+
+    def __init__(self, folder, max_bytes=None, ttl=None, logger=None):
+        """
+        Initialize the budget.
+
+        Parameters:
+        -----------
+        folder : str
+            Folder holding the cache files (searched recursively)
+        max_bytes : int, optional
+            Size budget for the folder. None disables the budget.
+        ttl : float, optional
+            Maximum age of an entry in seconds. None keeps entries until evicted.
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.logger = logger or logging.getLogger("FileCacheBudget")
+        self._lock = threading.Lock()
+        # Running total of the folder's size, measured on first use
+        self._bytes = None
+
+    def is_fresh(self, path):
+        """
+        Check that a cache file exists and has not expired; expired files are removed.
+
+        Parameters:
+        -----------
+        path : str
+            The cache file
+
+        Returns:
+        --------
+        fresh : bool
+            True if the entry can be used
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if self.ttl is not None and time.time() - stat.st_mtime > self.ttl:
+            self._remove(path, stat.st_size)
+            return False
+        return True
+
+    def accessed(self, path):
+        """
+        Record a read of a cache file for least recently used eviction.
+
+        Parameters:
+        -----------
+        path : str
+            The cache file
+        """
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def stored(self, path, replaced_bytes=0):
+        """
+        Record a newly written cache file and evict if over budget.
+
+        Parameters:
+        -----------
+        path : str
+            The cache file
+        replaced_bytes : int, default=0
+            Size of the file it replaced, if any
+        """
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += os.path.getsize(path) - replaced_bytes
+            over = self.max_bytes is not None and (self._bytes is None or self._bytes > self.max_bytes)
+        if over:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove expired files, then least recently used files until the folder
+        fits its size budget.
+
+        Returns:
+        --------
+        removed : int
+            Number of files removed
+        """
+        now = time.time()
+        files = []
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_atime, stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        total = 0
+        kept = []
+        for atime, mtime, size, path in files:
+            if self.ttl is not None and now - mtime > self.ttl:
+                self._unlink(path)
+                removed += 1
+            else:
+                kept.append((atime, size, path))
+                total += size
+
+        if self.max_bytes is not None and total > self.max_bytes:
+            for atime, size, path in sorted(kept):
+                if total <= self.max_bytes:
+                    break
+                self._unlink(path)
+                total -= size
+                removed += 1
+
+        with self._lock:
+            self._bytes = total
+        if removed:
+            self.logger.info(f"Evicted {removed} cached files from {self.folder}")
+        return removed
+
+    def _remove(self, path, size):
+        self._unlink(path)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes -= size
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class TileCache:
+    """
+    Cache of feature downloads on a fixed global tile lattice (slippy-map
+    z/x/y tiles), keyed by tile and query signature. Any area can be assembled
+    from the cached tiles it covers plus the ones still missing, so overlapping
+    areas never download the same tile twice.
+
+    Tiles are GeoParquet files, limited in age and total size like the
+    other caches (see FileCacheBudget).
+    """
+
+    def __init__(self, folder, zoom=13, max_bytes=500 * 1024 ** 2, ttl=None, logger=None):
+        """
+        Initialize the tile cache.
+
+        Parameters:
+        -----------
+        folder : str
+            Folder holding the cached tiles
+        zoom : int, default=13
+            Zoom level of the tile lattice. Zoom 13 tiles are roughly 5x5 km at the equator.
+        max_bytes : int, default=500 MB
+            Size budget for the cached tiles; least recently used tiles are
+            evicted beyond it. None disables the budget.
+        ttl : float, optional
+            Maximum age of a tile in seconds, after which it is downloaded
+            again. None keeps tiles until evicted.
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.folder = folder
+        self.zoom = zoom
+        self.logger = logger or logging.getLogger("TileCache")
+        self.budget = FileCacheBudget(folder, max_bytes, ttl, self.logger)
+
+    def tiles_for(self, geometry):
+        """
+        List the cache tiles covering a geometry.
+
+        Parameters:
+        -----------
+        geometry : shapely.geometry
+            The area in EPSG:4326
+
+        Returns:
+        --------
+        tiles : list of (int, int)
+            (x, y) of every intersecting tile at the cache's zoom level
+        """
+        return tiles_for_geometry(geometry, self.zoom)
+
+    def tile_polygon(self, tile):
+        """
+        Get the polygon of a cache tile.
+
+        Parameters:
+        -----------
+        tile : tuple of int
+            (x, y) of the tile
+
+        Returns:
+        --------
+        polygon : shapely.geometry.Polygon
+            The tile's extent in EPSG:4326
+        """
+        return box(*tile_bounds(tile[0], tile[1], self.zoom))
+
+    def _path(self, tile, signature):
+        x, y = tile
+        return os.path.join(self.folder, signature, str(self.zoom), str(x), f"{y}.parquet")
+
+    def get(self, tile, signature):
+        """
+        Load a cached tile.
+
+        Parameters:
+        -----------
+        tile : tuple of int
+            (x, y) of the tile
+        signature : str
+            Query signature from osm_tiling.query_signature()
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame or None
+            The cached features (possibly empty), or None on a cache miss or expired tile
+        """
+        path = self._path(tile, signature)
+        if not self.budget.is_fresh(path):
+            return None
+        try:
+            gdf = gpd.read_parquet(path)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable cache tile {path}: {str(e)}")
+            return None
+        self.budget.accessed(path)
+        return gdf
+
+    def put(self, tile, signature, gdf):
+        """
+        Store the features of a tile. Empty results are stored too, so empty
+        tiles are not requested again.
+
+        Parameters:
+        -----------
+        tile : tuple of int
+            (x, y) of the tile
+        signature : str
+            Query signature from osm_tiling.query_signature()
+        gdf : geopandas.GeoDataFrame
+            The features the server returned for the tile
+        """
+        path = self._path(tile, signature)
+        replaced = os.path.getsize(path) if os.path.exists(path) else 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            write_geoparquet(gdf, path)
+        except Exception as e:
+            self.logger.warning(f"Could not write cache tile {path}: {str(e)}")
+            return
+        self.budget.stored(path, replaced)
+
+
+class ResponseCacheStore:
+    """
+    Compressed, size-capped store for raw Overpass/Nominatim JSON responses.
+
+    Entries are gzip-compressed JSON files. A SQLite index records what each
+    entry contains (query text, bounding box, tag filters, the OSM data
+    timestamp, element count and size) and when it was last used, which
+    drives LRU and TTL eviction under a total size budget.
+    """
+
+    def __init__(self, folder, max_bytes=500 * 1024 ** 2, ttl=None, logger=None):
+        """
+        Initialize the response store.
+
+        Parameters:
+        -----------
+        folder : str
+            Folder holding the compressed entries and the index
+        max_bytes : int, default=500 MB
+            Size budget for the compressed entries; least recently used entries
+            are evicted beyond it. None disables the budget.
+        ttl : float, optional
+            Maximum age of an entry in seconds. None keeps entries until evicted.
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.logger = logger or logging.getLogger("ResponseCacheStore")
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(folder, "index.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, query TEXT, bbox TEXT, tags TEXT, "
+            "timestamp_osm_base TEXT, element_count INTEGER, bytes INTEGER, "
+            "created REAL, last_access REAL)"
+        )
+        self._db.commit()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.json.gz")
+
+    def get(self, key):
+        """
+        Load a cached response.
+
+        Parameters:
+        -----------
+        key : str
+            Cache key of the request
+
+        Returns:
+        --------
+        response : dict or None
+            The cached JSON response, or None on a miss or expired entry
+        """
+        with self._lock:
+            if not self._is_valid(key):
+                return None
+
+            try:
+                with gzip.open(self._path(key), "rt", encoding="utf-8") as f:
+                    response = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+                self._delete(key)
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            self._touch(key)
+            return response
+
+    def open(self, key):
+        """
+        Open a cached response for streaming instead of loading it.
+
+        Parameters:
+        -----------
+        key : str
+            Cache key of the request
+
+        Returns:
+        --------
+        f : file object or None
+            Text file object over the decompressed JSON (the caller closes it),
+            or None on a miss or expired entry
+        """
+        with self._lock:
+            if not self._is_valid(key):
+                return None
+
+            try:
+                f = gzip.open(self._path(key), "rt", encoding="utf-8")
+            except OSError as e:
+                self.logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+                self._delete(key)
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            self._touch(key)
+            return f
+
+    def _is_valid(self, key):
+        # Must be called with the lock held; counts a miss and drops expired entries
+        row = self._db.execute("SELECT created FROM entries WHERE key = ?", (key,)).fetchone()
+        expired = row is not None and self.ttl is not None and time.time() - row[0] > self.ttl
+        if row is None or expired:
+            if expired:
+                self._delete(key)
+                self._db.commit()
+            self.misses += 1
+            return False
+        return True
+
+    def _touch(self, key):
+        self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        self.hits += 1
+
+    def put(self, key, response, query=None):
+        """
+        Store a response and evict old entries if the store is over budget.
+
+        Parameters:
+        -----------
+        key : str
+            Cache key of the request
+        response : dict
+            The JSON response
+        query : str, optional
+            The query text, recorded in the index together with the bbox and
+            tag filters parsed from it
+        """
+        metadata = _describe_response(response, query)
+        path = self._path(key)
+        tmp_path = _temp_path(path)
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump(response, f)
+            os.replace(tmp_path, path)
+        finally:
+            _remove_temp(tmp_path)
+        self._index(key, query, metadata)
+
+    def put_stream(self, key, chunks, query=None):
+        """
+        Store a response arriving in chunks without holding it in memory.
+        The index metadata is collected in a second, streaming pass.
+
+        Parameters:
+        -----------
+        key : str
+            Cache key of the request
+        chunks : iterable of bytes
+            The raw JSON response, e.g. requests' iter_content()
+        query : str, optional
+            The query text, recorded in the index
+
+        Returns:
+        --------
+        header : dict
+            The response's top-level members other than "elements"
+            (version, osm3s, remark, ...)
+        """
+        path = self._path(key)
+        # Each writer has its own temporary file, so concurrent stores of the
+        # same key never interleave; a truncated or invalid response is
+        # removed instead of published
+        tmp_path = _temp_path(path)
+        try:
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+
+            with gzip.open(tmp_path, "rt", encoding="utf-8") as f:
+                stream = OverpassJSONStream(f)
+                metadata = _describe_elements(stream.elements(), query)
+                header = stream.header
+            metadata['timestamp_osm_base'] = header.get("osm3s", {}).get("timestamp_osm_base")
+
+            os.replace(tmp_path, path)
+        finally:
+            _remove_temp(tmp_path)
+        self._index(key, query, metadata)
+        return header
+
+    def discard(self, key):
+        """
+        Remove an entry, e.g. a stored response that turned out to be an error.
+
+        Parameters:
+        -----------
+        key : str
+            Cache key of the request
+        """
+        with self._lock:
+            self._delete(key)
+            self._db.commit()
+
+    def _index(self, key, query, metadata):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, query, metadata['bbox'], metadata['tags'], metadata['timestamp_osm_base'],
+                 metadata['element_count'], os.path.getsize(self._path(key)), now, now)
+            )
+            self._db.commit()
+        self.evict()
+
+    def evict(self):
+        """
+        Remove expired entries, then least recently used entries until the
+        store fits its size budget.
+
+        Returns:
+        --------
+        removed : int
+            Number of entries removed
+        """
+        removed = 0
+        with self._lock:
+            if self.ttl is not None:
+                expired = self._db.execute(
+                    "SELECT key FROM entries WHERE created < ?", (time.time() - self.ttl,)
+                ).fetchall()
+                for (key,) in expired:
+                    self._delete(key)
+                    removed += 1
+
+            if self.max_bytes is not None:
+                total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+                if total > self.max_bytes:
+                    for key, size in self._db.execute(
+                            "SELECT key, bytes FROM entries ORDER BY last_access").fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        self._delete(key)
+                        total -= size
+                        removed += 1
+
+            self._db.commit()
+
+        if removed:
+            self.logger.info(f"Evicted {removed} cached responses")
+        return removed
+
+    def _delete(self, key):
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def entries(self):
+        """
+        Describe the cached entries.
+
+        Returns:
+        --------
+        entries : pandas.DataFrame
+            One row per entry with the index metadata, most recently used first
+        """
+        with self._lock:
+            return pd.read_sql_query("SELECT * FROM entries ORDER BY last_access DESC", self._db)
+
+    def stats(self):
+        """
+        Summarize cache usage.
+
+        Returns:
+        --------
+        stats : dict
+            Hits, misses, hit rate, entry count and total compressed bytes
+        """
+        with self._lock:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': count,
+            'bytes': total,
+        }
+
+    def import_legacy(self, folder, delete=False):
+        """
+        Import an uncompressed osmnx-style cache folder (one <sha1>.json file
+        per response). Entries keep their file name as key, so requests that
+        produced them still hit the cache.
+
+        Parameters:
+        -----------
+        folder : str
+            Folder with the legacy JSON files
+        delete : bool, default=False
+            If True, removes each legacy file once it has been imported
+
+        Returns:
+        --------
+        imported : int
+            Number of responses imported
+        """
+        imported = 0
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(folder, filename)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    response = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Skipping unreadable cache file {path}: {str(e)}")
+                continue
+
+            self.put(os.path.splitext(filename)[0], response)
+            imported += 1
+            if delete:
+                os.remove(path)
+
+        self.logger.info(f"Imported {imported} responses from {folder}")
+        return imported
+
+    def close(self):
+        """Close the index database."""
+        with self._lock:
+            self._db.close()
+
+
+def _describe_response(response, query=None):
+    """
+    Collect the index metadata of a response.
+
+    Parameters:
+    -----------
+    response : dict or list
+        An Overpass or Nominatim JSON response
+    query : str, optional
+        The Overpass QL query that produced the response
+
+    Returns:
+    --------
+    metadata : dict
+        'bbox', 'tags', 'timestamp_osm_base' and 'element_count'
+    """
+    elements = response.get("elements", []) if isinstance(response, dict) else response
+    metadata = _describe_elements(elements, query)
+    if isinstance(response, dict):
+        metadata['timestamp_osm_base'] = response.get("osm3s", {}).get("timestamp_osm_base")
+    return metadata
+
+
+def _describe_elements(elements, query=None):
+    """
+    Collect the bbox, tag and element count metadata in a single pass.
+
+    Parameters:
+    -----------
+    elements : iterable
+        The response's elements
+    query : str, optional
+        The Overpass QL query that produced the response
+
+    Returns:
+    --------
+    metadata : dict
+        'bbox', 'tags', 'timestamp_osm_base' (always None here) and 'element_count'
+    """
+    bbox = None
+    tags = None
+    if query:
+        coords = [float(value) for value in re.findall(r"-?\d+\.\d+", " ".join(
+            re.findall(r'poly:"([^"]*)"', query) + re.findall(r"\(([-\d., ]+)\)", query)))]
+        tags = ",".join(sorted(set(re.findall(r'\["[^\]]*\]', query)))) or None
+        # poly: clauses and south,west,north,east bboxes both list lat before lon
+        lats, lons = coords[0::2], coords[1::2]
+        if lats and lons:
+            bbox = f"{min(lons)},{min(lats)},{max(lons)},{max(lats)}"
+
+    # Fall back to the extent of the returned nodes and the feature keys in their tags
+    element_count = 0
+    extent = [math.inf, math.inf, -math.inf, -math.inf]
+    keys = set()
+    for element in elements:
+        element_count += 1
+        if not isinstance(element, dict):
+            continue
+        if bbox is None and "lon" in element:
+            lon, lat = element["lon"], element["lat"]
+            extent = [min(extent[0], lon), min(extent[1], lat), max(extent[2], lon), max(extent[3], lat)]
+        if tags is None:
+            keys.update(key for key in element.get("tags", {}) if key in osm_features)
+
+    if bbox is None and extent[0] != math.inf:
+        bbox = ",".join(str(value) for value in extent)
+    if tags is None:
+        tags = ",".join(sorted(keys)) or None
+
+    return {
+        'bbox': bbox,
+        'tags': tags,
+        'timestamp_osm_base': None,
+        'element_count': element_count,
+    }
+
+
+class ResultCache:
+    """
+    Cache of processed fetch results stored as GeoParquet files, keyed by
+    area, feature type, tags and fetch options. Loading a result skips the
+    JSON parsing and geometry building entirely, and files are read with
+    memory mapping. Results are limited in age and total size like the
+    other caches (see FileCacheBudget). Requires pyarrow; without it the
+    cache stays disabled.
+    """
+
+    def __init__(self, folder, max_bytes=500 * 1024 ** 2, ttl=None, logger=None):
+        """
+        Initialize the result cache.
+
+        Parameters:
+        -----------
+        folder : str
+            Folder holding the GeoParquet files
+        max_bytes : int, default=500 MB
+            Size budget for the cached results; least recently used results
+            are evicted beyond it. None disables the budget.
+        ttl : float, optional
+            Maximum age of a result in seconds, after which the request is
+            fetched again. None keeps results until evicted.
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.folder = folder
+        self.logger = logger or logging.getLogger("ResultCache")
+        self.budget = FileCacheBudget(folder, max_bytes, ttl, self.logger)
+
+        try:
+            import pyarrow  # noqa: F401
+            self.enabled = True
+        except ImportError:
+            self.logger.warning("pyarrow is not installed; the result cache is disabled")
+            self.enabled = False
+
+    def key(self, area_or_polygon, feature_type, tags, options=None):
+        """
+        Build the cache key of a request.
+
+        Parameters:
+        -----------
+        area_or_polygon : str or shapely.geometry
+            Either a place name (string) or a polygon geometry
+        feature_type : str
+            The OSM feature type (e.g., 'amenity', 'shop', 'highway')
+        tags : list or bool
+            List of specific tags, or True for every value
+        options : dict, optional
+            Fetch options that change the result
+
+        Returns:
+        --------
+        key : str
+            Hash identifying the request
+        """
+        if isinstance(area_or_polygon, str):
+            area_part = "place:" + area_or_polygon.strip().lower()
+        else:
+            area_part = "wkb:" + hashlib.sha1(area_or_polygon.wkb).hexdigest()
+
+        tag_part = "*" if tags is True else sorted(str(tag) for tag in tags)
+        payload = json.dumps([area_part, feature_type, tag_part, options or {}], sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.parquet")
+
+    def get(self, key, columns=None):
+        """
+        Load a cached result.
+
+        Parameters:
+        -----------
+        key : str
+            Cache key from key()
+        columns : list, optional
+            Only read these columns (the geometry column is always read)
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame or None
+            The cached result, or None on a miss or expired result
+        """
+        path = self._path(key)
+        if not self.enabled or not self.budget.is_fresh(path):
+            return None
+
+        if columns is not None and "geometry" not in columns:
+            columns = list(columns) + ["geometry"]
+
+        try:
+            gdf = gpd.read_parquet(path, columns=columns, memory_map=True)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable result cache file {path}: {str(e)}")
+            return None
+        self.budget.accessed(path)
+        return gdf
+
+    def put(self, key, gdf):
+        """
+        Store a result.
+
+        Parameters:
+        -----------
+        key : str
+            Cache key from key()
+        gdf : geopandas.GeoDataFrame
+            The processed result
+        """
+        if not self.enabled:
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(key)
+        replaced = os.path.getsize(path) if os.path.exists(path) else 0
+        try:
+            write_geoparquet(gdf, path)
+        except Exception as e:
+            self.logger.warning(f"Could not write result cache file {path}: {str(e)}")
+            return
+        self.budget.stored(path, replaced)
+
+
+def write_geoparquet(gdf, path):
+    """
+    Write a GeoDataFrame to a GeoParquet file atomically (through a
+    temporary file, so readers never see a partial file).
+
+    Parameters:
+    -----------
+    gdf : geopandas.GeoDataFrame
+        The frame to write
+    path : str
+        Destination file
+    """
+    tmp_path = _temp_path(path)
+    try:
+        try:
+            gdf.to_parquet(tmp_path)
+        except (TypeError, ValueError):
+            # OSM tag columns sometimes mix value types (e.g. lists and strings);
+            # store those columns as text rather than failing the write
+            stringify_mixed_columns(gdf).to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        _remove_temp(tmp_path)
+
+
+def stringify_mixed_columns(gdf):
+    """
+    Convert object columns holding more than one value type to strings,
+    keeping missing values as missing.
+
+    Parameters:
+    -----------
+    gdf : geopandas.GeoDataFrame
+        The frame to convert
+
+    Returns:
+    --------
+    gdf : geopandas.GeoDataFrame
+        A frame whose non-geometry object columns each hold a single type
+    """
+    converted = gdf.copy()
+    for column in converted.columns:
+        if column == converted.geometry.name or converted[column].dtype != object:
+            continue
+        values = converted[column].dropna()
+        if values.map(type).nunique() > 1:
+            converted[column] = converted[column].map(_stringify_value)
+    return converted
+
+
+def _stringify_value(value):
+    # pd.isna on a list cell returns an array, so only scalars are tested for missing
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return value
+    return str(value)
+
+
+def _temp_path(path):
+    # A unique file next to path, so os.replace stays on one filesystem
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", 
+                                    prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    return tmp_path
+
+
+def _remove_temp(tmp_path):
+    # Left behind only if the write failed before os.replace
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
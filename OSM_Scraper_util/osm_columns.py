@@ -0,0 +1,126 @@
+import pandas as pd
+from pandas.api.types import is_string_dtype
+
+
+def prune_columns(gdf, feature_type, columns):
+    """
+    Keep only a declared set of tag columns.
+
+    The feature key column and the geometry are always kept, as are the
+    osmnx element/id columns when the frame carries them as columns.
+
+    Parameters:
+    -----------
+    gdf : geopandas.GeoDataFrame
+        The features
+    feature_type : str
+        The OSM feature key (e.g., 'amenity', 'shop')
+    columns : list
+        Tag columns to keep, e.g. ['name']. Columns missing from the frame are ignored.
+
+    Returns:
+    --------
+    gdf : geopandas.GeoDataFrame
+        The features with only the declared columns (the input if nothing was dropped)
+    """
+    if gdf is None:
+        return gdf
+
+    wanted = set(columns) | {feature_type, gdf.geometry.name, 'element', 'id', 'element_type', 'osmid'}
+    keep = [column for column in gdf.columns if column in wanted]
+    if len(keep) == len(gdf.columns):
+        return gdf
+    return gdf[keep]
+
+
+def categorize_columns(gdf, max_unique_ratio=0.5):
+    """
+    Store repeated string columns as pandas categoricals.
+
+    OSM tag columns are mostly empty and repeat a few values (e.g. 'cafe',
+    'yes'); as categoricals each cell takes a small integer code instead of
+    an object pointer. Only columns holding strings alone are converted, so
+    values and missing values are unchanged.
+
+    Parameters:
+    -----------
+    gdf : geopandas.GeoDataFrame
+        The features
+    max_unique_ratio : float, default=0.5
+        Columns with more distinct values than this fraction of their
+        non-missing values (e.g. names) stay object columns
+
+    Returns:
+    --------
+    gdf : geopandas.GeoDataFrame
+        The features with categorical tag columns (the input if nothing was converted)
+    """
+    if gdf is None or len(gdf) == 0:
+        return gdf
+
+    converted = {}
+    for column in gdf.columns:
+        # Object columns and pandas string columns; other dtypes are already compact
+        if column == gdf.geometry.name or not is_string_dtype(gdf[column].dtype):
+            continue
+        values = gdf[column].to_numpy(dtype=object)
+        present = values[~pd.isna(values)]
+        if len(present) == 0:
+            continue
+        if not all(isinstance(value, str) for value in present):
+            continue
+        if len(pd.unique(present)) > max_unique_ratio * len(present):
+            continue
+        converted[column] = pd.Categorical(values)
+
+    if not converted:
+        return gdf
+    return gdf.assign(**converted)
+
+
+def compact_features(gdf, feature_type, columns=None, categorical=False):
+    """
+    Apply the ingest options of a fetch: column pruning, then categoricals.
+
+    Parameters:
+    -----------
+    gdf : geopandas.GeoDataFrame
+        The features
+    feature_type : str
+        The OSM feature key
+    columns : list, optional
+        Tag columns to keep besides the feature key. None keeps every column.
+    categorical : bool, default=False
+        If True, stores repeated string columns as categoricals
+
+    Returns:
+    --------
+    gdf : geopandas.GeoDataFrame
+        The compacted features
+    """
+    if gdf is None:
+        return gdf
+    if columns is not None:
+        gdf = prune_columns(gdf, feature_type, columns)
+    if categorical:
+        gdf = categorize_columns(gdf)
+    return gdf
+
+
+def memory_usage(gdf):
+    """
+    Get the in-memory size of a frame, including the strings of object columns.
+
+    Parameters:
+    -----------
+    gdf : geopandas.GeoDataFrame
+        The features
+
+    Returns:
+    --------
+    size : int
+        Size in bytes (geometry objects are counted as pointers only)
+    """
+    if gdf is None:
+        return 0
+    return int(gdf.memory_usage(deep=True).sum())
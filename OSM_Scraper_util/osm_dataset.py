@@ -0,0 +1,280 @@
+import os
+import re
+import shutil
+import logging
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import box
+
+from osm_cache import lonlat_to_tiles, tile_bounds, write_geoparquet
+
+
+class TileDatasetWriter:
+    """
+    Writes tile results to a spatially partitioned GeoParquet dataset as they
+    arrive, so a tiled fetch never holds the whole result in memory.
+
+    Features are partitioned by the slippy-map tile (at partition_zoom) of
+    their bounding-box center; each write appends one part file per touched
+    partition. Duplicates across tiles are dropped at write time against the
+    set of (element, id) keys already written.
+    """
+
+    def __init__(self, folder, partition_zoom=12, overwrite=True, logger=None):
+        """
+        Initialize the writer.
+
+        Parameters:
+        -----------
+        folder : str
+            Root folder of the dataset
+        partition_zoom : int, default=12
+            Zoom level of the partition tiles (zoom 12 tiles are ~10 km wide)
+        overwrite : bool, default=True
+            If True, removes an existing dataset in the folder first. Otherwise
+            an existing dataset is appended to, and its features count as
+            already written (used to resume an interrupted tiled fetch).
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.folder = folder
+        self.partition_zoom = partition_zoom
+        self.logger = logger or logging.getLogger("TileDatasetWriter")
+        self.row_count = 0
+        self.duplicate_count = 0
+        self._seen = set()
+        self._part = 0
+
+        if overwrite and os.path.isdir(folder):
+            shutil.rmtree(folder)
+        elif os.path.isdir(folder):
+            self._resume()
+        os.makedirs(folder, exist_ok=True)
+
+    def _resume(self):
+        dataset = TileDataset(self.folder, self.partition_zoom)
+        for partition in dataset.partitions:
+            for path in dataset._part_paths(partition):
+                self._part = max(self._part, int(re.search(r"part-(\d+)", path).group(1)) + 1)
+            gdf = dataset.load_partition(partition, columns=[])
+            if gdf is not None:
+                self._seen.update(_osm_keys(gdf).tolist())
+                self.row_count += len(gdf)
+        if self.row_count:
+            self.logger.info(f"Appending to {self.folder} ({self.row_count} features already written)")
+
+    def write(self, gdf):
+        """
+        Append a tile result, skipping features that were already written.
+
+        Parameters:
+        -----------
+        gdf : geopandas.GeoDataFrame
+            Features with the osmnx (element, id) index
+
+        Returns:
+        --------
+        written : int
+            Number of new features written
+        """
+        if gdf is None or len(gdf) == 0:
+            return 0
+
+        keys = _osm_keys(gdf)
+        # Keep the first occurrence within the tile and drop anything seen before
+        new = ~pd.Series(keys).duplicated().to_numpy()
+        new &= np.fromiter((key not in self._seen for key in keys), dtype=bool, count=len(keys))
+        self.duplicate_count += int(len(keys) - new.sum())
+        if not new.any():
+            return 0
+
+        gdf = gdf[new]
+        self._seen.update(keys[new].tolist())
+
+        bounds = gdf.geometry.bounds
+        x, y = lonlat_to_tiles((bounds['minx'] + bounds['maxx']) / 2,
+                               (bounds['miny'] + bounds['maxy']) / 2, self.partition_zoom)
+        partitions = pd.Series(x).astype(str).str.cat(pd.Series(y).astype(str), sep="_").to_numpy()
+
+        for partition in np.unique(partitions):
+            self._write_part(partition, gdf[partitions == partition])
+
+        self.row_count += len(gdf)
+        return len(gdf)
+
+    def _write_part(self, partition, gdf):
+        partition_folder = os.path.join(self.folder, f"tile={partition}")
+        os.makedirs(partition_folder, exist_ok=True)
+        path = os.path.join(partition_folder, f"part-{self._part:05d}.parquet")
+        self._part += 1
+        # Tag columns mixing value types are stored as text
+        write_geoparquet(gdf, path)
+
+    def close(self):
+        """
+        Finish writing.
+
+        Returns:
+        --------
+        dataset : TileDataset
+            Lazy handle on the written dataset
+        """
+        self._seen = set()
+        self.logger.info(f"Wrote {self.row_count} features to {self.folder} "
+                         f"({self.duplicate_count} duplicates skipped)")
+        return TileDataset(self.folder, self.partition_zoom)
+
+
+class TileDataset:
+    """
+    Lazy handle on a partitioned dataset written by TileDatasetWriter.
+    Nothing is read until load() or load_partition() is called.
+    """
+
+    def __init__(self, folder, partition_zoom=12):
+        """
+        Open a dataset.
+
+        Parameters:
+        -----------
+        folder : str
+            Root folder of the dataset
+        partition_zoom : int, default=12
+            Zoom level the dataset was partitioned at
+        """
+        self.folder = folder
+        self.partition_zoom = partition_zoom
+
+    def __repr__(self):
+        return f"TileDataset({self.folder!r}, {len(self.partitions)} partitions)"
+
+    def __len__(self):
+        import pyarrow.parquet as pq
+        return sum(pq.ParquetFile(path).metadata.num_rows
+                   for partition in self.partitions for path in self._part_paths(partition))
+
+    @property
+    def partitions(self):
+        """Partition keys ("x_y" tile indices), sorted."""
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(name.split("=", 1)[1] for name in os.listdir(self.folder)
+                      if name.startswith("tile="))
+
+    def partition_bounds(self, partition):
+        """
+        Get the WGS84 bounds of a partition.
+
+        Parameters:
+        -----------
+        partition : str
+            Partition key from partitions
+
+        Returns:
+        --------
+        bounds : tuple
+            (minx, miny, maxx, maxy) in degrees
+        """
+        x, y = (int(value) for value in partition.split("_"))
+        return tile_bounds(x, y, self.partition_zoom)
+
+    def _part_paths(self, partition):
+        partition_folder = os.path.join(self.folder, f"tile={partition}")
+        return sorted(os.path.join(partition_folder, name) for name in os.listdir(partition_folder)
+                      if re.match(r"part-\d+\.parquet$", name))
+
+    def load_partition(self, partition, columns=None):
+        """
+        Load a single partition.
+
+        Parameters:
+        -----------
+        partition : str
+            Partition key from partitions
+        columns : list, optional
+            Only read these columns (the geometry column is always read)
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The partition's features
+        """
+        if columns is not None and "geometry" not in columns:
+            columns = list(columns) + ["geometry"]
+
+        parts = []
+        for path in self._part_paths(partition):
+            # Parts may lack tag columns others have, so read only what exists
+            if columns is not None:
+                import pyarrow.parquet as pq
+                available = set(pq.read_schema(path).names)
+                part_columns = [column for column in columns if column in available]
+            else:
+                part_columns = None
+            parts.append(gpd.read_parquet(path, columns=part_columns, memory_map=True))
+        return _concat(parts)
+
+    def iter_partitions(self, columns=None):
+        """
+        Iterate over the partitions without loading the whole dataset.
+
+        Parameters:
+        -----------
+        columns : list, optional
+            Only read these columns (the geometry column is always read)
+
+        Yields:
+        -------
+        (partition, gdf) : tuple
+            Partition key and its features
+        """
+        for partition in self.partitions:
+            yield partition, self.load_partition(partition, columns)
+
+    def load(self, columns=None, bbox=None):
+        """
+        Load the dataset, or the partitions overlapping a bounding box.
+
+        Parameters:
+        -----------
+        columns : list, optional
+            Only read these columns (the geometry column is always read)
+        bbox : tuple, optional
+            (minx, miny, maxx, maxy); only partitions overlapping it are read,
+            and only features intersecting it are returned
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame or None
+            The features, or None if the dataset is empty
+        """
+        parts = []
+        for partition in self.partitions:
+            if bbox is not None:
+                minx, miny, maxx, maxy = self.partition_bounds(partition)
+                if minx > bbox[2] or maxx < bbox[0] or miny > bbox[3] or maxy < bbox[1]:
+                    continue
+            parts.append(self.load_partition(partition, columns))
+
+        gdf = _concat(parts)
+        if gdf is not None and bbox is not None:
+            gdf = gdf[gdf.intersects(box(*bbox))]
+        return gdf
+
+
+def _osm_keys(gdf):
+    """(element, id) keys of a feature frame as an object array of tuples."""
+    keys = np.empty(len(gdf), dtype=object)
+    keys[:] = list(gdf.index)
+    return keys
+
+
+def _concat(parts):
+    parts = [part for part in parts if len(part) > 0]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    return gpd.GeoDataFrame(pd.concat(parts), geometry="geometry", crs=parts[0].crs)
@@ -0,0 +1,124 @@
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+import shapely
+
+
+# Index level / column names carrying OSM identity: osmnx 2.x and osmnx 1.x
+_IDENTITY_NAMES = [("element", "id"), ("element_type", "osmid")]
+
+
+class FeatureDeduplicator:
+    """
+    Removes duplicate features from OSM results.
+
+    Features are identified by their OSM identity (element type and id) when
+    the frame carries it, either as the osmnx (element, id) index or as
+    columns. Otherwise geometries are compared through their WKB encoding,
+    produced in one vectorized shapely call and hashed by pandas. Each call's
+    method, row counts and duration are recorded in `history`.
+    """
+
+    def __init__(self, logger=None):
+        """
+        Initialize the deduplicator.
+
+        Parameters:
+        -----------
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.logger = logger or logging.getLogger("FeatureDeduplicator")
+        self.history = []
+
+    @property
+    def last_stats(self):
+        """Statistics of the most recent call, or None."""
+        return self.history[-1] if self.history else None
+
+    def deduplicate(self, gdf, label=None):
+        """
+        Drop repeated features, keeping the first occurrence.
+
+        Parameters:
+        -----------
+        gdf : geopandas.GeoDataFrame
+            The features to de-duplicate
+        label : str, optional
+            Name recorded with the statistics (e.g. the calling step)
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The de-duplicated features (the input itself if nothing was removed)
+        """
+        if gdf is None or len(gdf) == 0:
+            return gdf
+
+        start = time.perf_counter()
+        identity = self.identity_keys(gdf)
+        if identity is not None:
+            method = "identity"
+            duplicated = identity.duplicated(keep="first").to_numpy()
+        else:
+            method = "wkb"
+            wkb = shapely.to_wkb(np.asarray(gdf.geometry.values))
+            duplicated = pd.Series(wkb).duplicated(keep="first").to_numpy()
+
+        result = gdf[~duplicated] if duplicated.any() else gdf
+
+        stats = {
+            'label': label,
+            'method': method,
+            'rows_before': len(gdf),
+            'rows_after': len(result),
+            'removed': int(duplicated.sum()),
+            'seconds': time.perf_counter() - start,
+        }
+        self.history.append(stats)
+        self.logger.info(f"Removed {stats['removed']} duplicate features by {method} "
+                         f"in {stats['seconds']:.3f}s")
+        return result
+
+    @staticmethod
+    def identity_keys(gdf):
+        """
+        Get the OSM identity of each feature, if the frame carries it.
+
+        Parameters:
+        -----------
+        gdf : geopandas.GeoDataFrame
+            The features
+
+        Returns:
+        --------
+        keys : pandas.DataFrame or None
+            Element type and id per feature, or None without identity information
+        """
+        index_names = list(gdf.index.names)
+        for type_name, id_name in _IDENTITY_NAMES:
+            if type_name in index_names and id_name in index_names:
+                return pd.DataFrame({
+                    'element': gdf.index.get_level_values(type_name),
+                    'id': gdf.index.get_level_values(id_name),
+                })
+            if type_name in gdf.columns and id_name in gdf.columns:
+                return pd.DataFrame({
+                    'element': gdf[type_name].to_numpy(),
+                    'id': gdf[id_name].to_numpy(),
+                })
+        return None
+
+    def summary(self):
+        """
+        Summarize all calls so far.
+
+        Returns:
+        --------
+        summary : pandas.DataFrame
+            One row per call with label, method, row counts and seconds
+        """
+        return pd.DataFrame(self.history, columns=['label', 'method', 'rows_before',
+                                                   'rows_after', 'removed', 'seconds'])
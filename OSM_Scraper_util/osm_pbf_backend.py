@@ -0,0 +1,239 @@
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from overpass_parser import feature_frame, is_area_feature
+
+
+class PbfBackend:
+    """
+    Offline feature source reading a local .osm.pbf extract with pyosmium.
+
+    Features are read in a single streaming pass and returned in the same
+    schema as osmnx feature frames ((element, id) index, one column per tag,
+    osmnx's polygon rules). Optionally, the first request for a feature type
+    writes every feature of that type to a GeoParquet spatial index next to
+    the extract; later requests read only the row groups overlapping the
+    requested area instead of rescanning the extract.
+    """
+
+    def __init__(self, path, index_folder=None, build_index=True, logger=None):
+        """
+        Initialize the backend.
+
+        Parameters:
+        -----------
+        path : str
+            Path of the .osm.pbf extract
+        index_folder : str, optional
+            Folder holding the per-feature-type spatial indexes.
+            Defaults to "<path>.index".
+        build_index : bool, default=True
+            If True, builds the spatial index of a feature type on its first request
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"OSM extract not found: {path}")
+
+        self.path = path
+        self.index_folder = index_folder or path + ".index"
+        self.build_index = build_index
+        self.logger = logger or logging.getLogger("PbfBackend")
+        self._index_locks = {}
+        self._locks_lock = threading.Lock()
+
+    def features(self, feature_type, values=None, polygon=None, centroids_only=False):
+        """
+        Read the features of a type, optionally limited to values and an area.
+
+        Parameters:
+        -----------
+        feature_type : str
+            The OSM feature type (e.g., 'amenity', 'shop', 'highway')
+        values : list, optional
+            Tag values to keep. None keeps every value.
+        polygon : shapely.geometry, optional
+            Area in EPSG:4326; only features intersecting it are returned
+        centroids_only : bool, default=False
+            If True, returns the bounding-box center of each feature, like
+            Overpass "out center" output
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The matching features
+        """
+        if self.build_index or self.has_index(feature_type):
+            gdf = self._read_index(feature_type, polygon)
+        else:
+            gdf = self.scan(feature_type, polygon=polygon)
+
+        if values is not None and len(gdf) > 0:
+            gdf = gdf[gdf[feature_type].isin(values)]
+        if polygon is not None and len(gdf) > 0:
+            gdf = gdf[gdf.intersects(polygon)]
+
+        if centroids_only and len(gdf) > 0:
+            bounds = gdf.geometry.bounds
+            gdf = gdf.set_geometry(gpd.points_from_xy((bounds['minx'] + bounds['maxx']) / 2,
+                                                      (bounds['miny'] + bounds['maxy']) / 2,
+                                                      crs=gdf.crs))
+        return gdf
+
+    def scan(self, feature_type, polygon=None):
+        """
+        Read every feature carrying a key in one streaming pass over the extract.
+
+        Parameters:
+        -----------
+        feature_type : str
+            The OSM key to read
+        polygon : shapely.geometry, optional
+            Only features whose bounds overlap the polygon's bounds are kept
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The features, sorted by (element, id)
+        """
+        try:
+            import osmium
+        except ImportError:
+            raise ImportError("Reading .osm.pbf extracts requires pyosmium (pip install osmium)")
+
+        self.logger.info(f"Scanning {self.path} for '{feature_type}' features")
+        bounds = None if polygon is None else polygon.bounds
+        factory = osmium.geom.WKBFactory()
+
+        element_types = []
+        ids = []
+        tags = []
+        geometries = []
+
+        processor = (osmium.FileProcessor(self.path)
+                     .with_locations()
+                     .with_areas(osmium.filter.KeyFilter(feature_type)))
+
+        for obj in processor:
+            if feature_type not in obj.tags:
+                continue
+
+            object_tags = {tag.k: tag.v for tag in obj.tags}
+            try:
+                if isinstance(obj, osmium.osm.Node):
+                    element_type, element_id = "node", obj.id
+                    wkb = factory.create_point(obj)
+                elif isinstance(obj, osmium.osm.Way):
+                    # Closed area ways come back from the area assembler as well
+                    if obj.is_closed() and len(obj.nodes) >= 4 and is_area_feature(object_tags):
+                        continue
+                    element_type, element_id = "way", obj.id
+                    wkb = factory.create_linestring(obj)
+                elif isinstance(obj, osmium.osm.Area):
+                    if obj.from_way():
+                        if not is_area_feature(object_tags):
+                            continue
+                        element_type = "way"
+                    else:
+                        element_type = "relation"
+                    element_id = obj.orig_id()
+                    wkb = factory.create_multipolygon(obj)
+                else:
+                    continue
+            except RuntimeError as e:
+                # Missing node locations or broken rings, as osmnx drops them too
+                self.logger.debug(f"Skipping {obj.id}: {str(e)}")
+                continue
+
+            geometry = shapely.from_wkb(wkb)
+            if bounds is not None:
+                minx, miny, maxx, maxy = geometry.bounds
+                if minx > bounds[2] or maxx < bounds[0] or miny > bounds[3] or maxy < bounds[1]:
+                    continue
+
+            # osmium builds every area as a MultiPolygon; osmnx uses Polygon for single parts
+            if geometry.geom_type == "MultiPolygon" and len(geometry.geoms) == 1:
+                geometry = geometry.geoms[0]
+
+            element_types.append(element_type)
+            ids.append(element_id)
+            tags.append(object_tags)
+            geometries.append(geometry)
+
+        gdf = feature_frame(element_types, ids, tags, np.asarray(geometries, dtype=object), "EPSG:4326")
+        return gdf[~gdf.index.duplicated()].sort_index()
+
+    def has_index(self, feature_type):
+        """
+        Check whether an up-to-date spatial index exists for a feature type.
+
+        Parameters:
+        -----------
+        feature_type : str
+            The OSM key
+
+        Returns:
+        --------
+        has_index : bool
+            True if the index exists and was built from the current extract
+        """
+        path = self._index_path(feature_type)
+        meta_path = path + ".json"
+        if not os.path.exists(path) or not os.path.exists(meta_path):
+            return False
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f) == self._source_signature()
+        except (OSError, ValueError):
+            return False
+
+    def build(self, feature_type):
+        """
+        Build the spatial index of a feature type.
+
+        The features are written to GeoParquet sorted along a Hilbert curve,
+        with a bbox covering column, so area reads only touch nearby row groups.
+
+        Parameters:
+        -----------
+        feature_type : str
+            The OSM key to index
+        """
+        gdf = self.scan(feature_type)
+        path = self._index_path(feature_type)
+        os.makedirs(self.index_folder, exist_ok=True)
+
+        if len(gdf) > 0:
+            gdf = gdf.iloc[np.argsort(gdf.geometry.hilbert_distance(), kind="stable")]
+
+        tmp_path = path + ".tmp"
+        gdf.to_parquet(tmp_path, write_covering_bbox=True, row_group_size=10000)
+        os.replace(tmp_path, path)
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(self._source_signature(), f)
+        self.logger.info(f"Indexed {len(gdf)} '{feature_type}' features in {path}")
+
+    def _read_index(self, feature_type, polygon):
+        with self._locks_lock:
+            lock = self._index_locks.setdefault(feature_type, threading.Lock())
+        # Concurrent tile requests wait for a single build
+        with lock:
+            if not self.has_index(feature_type):
+                self.build(feature_type)
+
+        bbox = None if polygon is None else polygon.bounds
+        return gpd.read_parquet(self._index_path(feature_type), bbox=bbox).sort_index()
+
+    def _index_path(self, feature_type):
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in feature_type)
+        return os.path.join(self.index_folder, f"{safe_name}.parquet")
+
+    def _source_signature(self):
+        stat = os.stat(self.path)
+        return {'path': os.path.abspath(self.path), 'size': stat.st_size, 'mtime': stat.st_mtime}
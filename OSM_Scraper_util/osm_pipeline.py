@@ -0,0 +1,315 @@
+import time
+import logging
+import contextlib
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+import geometry_kernel
+from osm_dedup import FeatureDeduplicator
+
+
+# Facility types that carry no information for density analysis
+DEFAULT_UNWANTED_FACILITIES = [
+    'bench', 'atm', 'drinking_water', 'toilets', 'waste_basket',
+    'vending_machine', 'fountain', 'training', 'waste_disposal',
+    'recycling', 'payment_terminal', 'yes', 'driving_school',
+    'public_bookcase'
+]
+
+def _copy_on_write():
+    # Copy-on-Write is always on from pandas 3.0 and the option is deprecated there
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return contextlib.nullcontext()
+    return pd.option_context("mode.copy_on_write", True)
+
+
+class _Source:
+    """Column views of one input frame plus the rows still selected."""
+
+    def __init__(self, gdf, type_column, label):
+        self.gdf = gdf
+        self.type_column = type_column
+        self.label = label
+        self.geometry = geometry_kernel.geometry_array(gdf)
+        self.type_ids = geometry_kernel.type_ids(self.geometry)
+        self.centroid_rows = np.zeros(len(gdf), dtype=bool)
+        self.keep = np.ones(len(gdf), dtype=bool)
+        self.names = None
+
+    def types(self):
+        if self.type_column in self.gdf.columns:
+            return self.gdf[self.type_column]
+        return pd.Series(None, index=self.gdf.index, dtype=object)
+
+    def current_geometry(self, rows):
+        """Geometries of the given rows with pending centroid conversions applied."""
+        geometry = self.geometry[rows]
+        convert = self.centroid_rows[rows]
+        if convert.any():
+            geometry = geometry_kernel.centroids(geometry, convert)
+        return geometry
+
+
+class CleaningPipeline:
+    """
+    Single-pass cleaning of OSM feature frames.
+
+    Stages are declared with chained calls and run together by run(). Row
+    filters only narrow a shared boolean selection and geometry conversions
+    are recorded as pending; no stage copies the input. Rows and columns are
+    gathered once, at the end, directly into the output frame, and the number
+    of rows left after each stage is recorded in `stage_counts`.
+
+    Example:
+    --------
+    pipeline = (CleaningPipeline()
+                .points_only()
+                .filter_types()
+                .drop_historical()
+                .deduplicate())
+    heatmap_gdf = pipeline.run({'amenity': amenity_gdf, 'shop': shop_gdf},
+                               type_column='facility_type', columns=['name'])
+    """
+
+    def __init__(self, deduplicator=None, logger=None):
+        """
+        Initialize the pipeline.
+
+        Parameters:
+        -----------
+        deduplicator : FeatureDeduplicator, optional
+            Deduplicator used by the deduplicate stage
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.logger = logger or logging.getLogger("CleaningPipeline")
+        self.deduplicator = deduplicator or FeatureDeduplicator(self.logger)
+        self.stages = []
+        self.stage_counts = []
+
+    def _add(self, name, function):
+        self.stages.append((name, function))
+        return self
+
+    def points_only(self):
+        """Keep point features (including polygons already converted to points)."""
+        def stage(sources):
+            for source in sources:
+                is_point = (source.type_ids == geometry_kernel.POINT) | source.centroid_rows
+                source.keep &= is_point
+        return self._add("points_only", stage)
+
+    def polygons_to_points(self):
+        """Replace (multi)polygons by their centroids."""
+        def stage(sources):
+            for source in sources:
+                source.centroid_rows |= np.isin(source.type_ids, [geometry_kernel.POLYGON,
+                                                                  geometry_kernel.MULTIPOLYGON])
+        return self._add("polygons_to_points", stage)
+
+    def filter_types(self, unwanted=None):
+        """
+        Drop features whose type value is unwanted.
+
+        Parameters:
+        -----------
+        unwanted : list, optional
+            Type values to drop. Defaults to DEFAULT_UNWANTED_FACILITIES.
+        """
+        unwanted = DEFAULT_UNWANTED_FACILITIES if unwanted is None else unwanted
+
+        def stage(sources):
+            for source in sources:
+                source.keep &= ~source.types().isin(unwanted).to_numpy()
+        return self._add("filter_types", stage)
+
+    def drop_historical(self):
+        """Drop historical features (type values containing 'was:')."""
+        def stage(sources):
+            for source in sources:
+                historical = source.types().astype(str).str.contains('was:', regex=False)
+                source.keep &= ~historical.to_numpy(dtype=bool)
+        return self._add("drop_historical", stage)
+
+    def fill_names(self):
+        """
+        Ensure a name for every feature: 'name', else 'name:en', else a
+        generated 'unnamed_<feature type>_<n>' numbered over the kept rows.
+        """
+        def stage(sources):
+            for source in sources:
+                if 'name' in source.gdf.columns:
+                    names = source.gdf['name']
+                elif 'name:en' in source.gdf.columns:
+                    names = source.gdf['name:en']
+                else:
+                    names = pd.Series(None, index=source.gdf.index, dtype=object)
+                names = names.to_numpy(dtype=object)
+
+                missing = pd.isna(names) & source.keep
+                if missing.any():
+                    names = names.copy()
+                    names[missing] = [f"unnamed_{source.label}_{i}" for i in range(int(missing.sum()))]
+                source.names = names
+        return self._add("fill_names", stage)
+
+    def deduplicate(self):
+        """Drop repeated features across all inputs, by OSM identity or geometry."""
+        def stage(sources):
+            start = time.perf_counter()
+            rows = [np.flatnonzero(source.keep) for source in sources]
+            identities = [self.deduplicator.identity_keys(source.gdf) for source in sources]
+
+            # Identity only works if every input carries it
+            if all(keys is not None for keys in identities):
+                method = "identity"
+                keys = pd.concat([keys.iloc[source_rows] for keys, source_rows in zip(identities, rows)],
+                                 ignore_index=True)
+            else:
+                method = "wkb"
+                keys = pd.Series(np.concatenate([shapely.to_wkb(source.current_geometry(source_rows))
+                                                 for source, source_rows in zip(sources, rows)]))
+            duplicated = keys.duplicated(keep='first').to_numpy()
+            self.deduplicator.history.append({
+                'label': "pipeline", 'method': method, 'rows_before': len(keys),
+                'rows_after': int(len(keys) - duplicated.sum()), 'removed': int(duplicated.sum()),
+                'seconds': time.perf_counter() - start,
+            })
+
+            offset = 0
+            for source, source_rows in zip(sources, rows):
+                source.keep[source_rows[duplicated[offset:offset + len(source_rows)]]] = False
+                offset += len(source_rows)
+        return self._add("deduplicate", stage)
+
+    def categorize(self, categories):
+        """
+        Add a 'category' column mapping type values to categories.
+
+        Parameters:
+        -----------
+        categories : dict
+            Mapping of category names to lists of facility types
+        """
+        lookup = {facility_type: category
+                  for category, facility_types in categories.items()
+                  for facility_type in facility_types}
+
+        def stage(sources):
+            self._categories = lookup
+        return self._add("categorize", stage)
+
+    def run(self, sources, type_column=None, columns=None):
+        """
+        Run all stages and build the output frame.
+
+        Parameters:
+        -----------
+        sources : dict
+            Feature type -> GeoDataFrame. The feature type names the column
+            holding each frame's type values (e.g. 'amenity', 'shop').
+        type_column : str, optional
+            If given, the type values of all sources are written to this
+            column and a 'source' column records the feature type. If None,
+            the type columns keep their names.
+        columns : list, optional
+            Other columns to keep. None keeps every column.
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame or None
+            The cleaned features, or None if no input had rows
+        """
+        self.stage_counts = []
+        self._categories = None
+
+        with _copy_on_write():
+            inputs = [_Source(gdf, feature_type, feature_type)
+                      for feature_type, gdf in sources.items()
+                      if gdf is not None and len(gdf) > 0]
+            if not inputs:
+                return None
+
+            self._record("input", inputs, time.perf_counter())
+            for name, stage in self.stages:
+                start = time.perf_counter()
+                stage(inputs)
+                self._record(name, inputs, start)
+
+            return self._materialize(inputs, type_column, columns)
+
+    def _record(self, name, sources, start):
+        rows = int(sum(source.keep.sum() for source in sources))
+        self.stage_counts.append({'stage': name, 'rows': rows,
+                                  'seconds': time.perf_counter() - start})
+        if name != "input":
+            self.logger.info(f"{name}: {rows} rows")
+
+    def _materialize(self, sources, type_column, columns):
+        if len(sources) == 1 and type_column is None and columns is None:
+            # A single frame keeps its columns and dtypes: one row gather
+            source = sources[0]
+            rows = np.flatnonzero(source.keep)
+            result = source.gdf if len(rows) == len(source.gdf) else source.gdf.iloc[rows]
+            if source.centroid_rows[rows].any():
+                result = result.set_geometry(gpd.GeoSeries(source.current_geometry(rows),
+                                                           index=result.index, crs=result.crs))
+            if source.names is not None:
+                result = result.assign(name=source.names[rows])
+            return self._add_categories(result, source.type_column)
+
+        parts = []
+        for source in sources:
+            rows = np.flatnonzero(source.keep)
+            gdf = source.gdf
+
+            if columns is None:
+                selected = [column for column in gdf.columns if column != gdf.geometry.name]
+            else:
+                selected = [column for column in columns if column in gdf.columns]
+                if type_column is None and source.type_column not in selected:
+                    selected.append(source.type_column)
+
+            data = {column: gdf[column].to_numpy()[rows] for column in selected}
+            if source.names is not None:
+                data['name'] = source.names[rows]
+            elif columns is not None and 'name' in columns and 'name' not in data:
+                data['name'] = np.full(len(rows), None, dtype=object)
+            if type_column is not None:
+                data[type_column] = source.types().to_numpy()[rows]
+                data['source'] = np.full(len(rows), source.label, dtype=object)
+
+            parts.append((gdf.index[rows], data, source.current_geometry(rows)))
+
+        index = parts[0][0].append([index for index, _, _ in parts[1:]]) if len(parts) > 1 else parts[0][0]
+        names = list(dict.fromkeys(column for _, data, _ in parts for column in data))
+        data = {}
+        for column in names:
+            data[column] = np.concatenate([
+                part_data[column] if column in part_data else np.full(len(part_index), None, dtype=object)
+                for part_index, part_data, _ in parts
+            ])
+        geometry = np.concatenate([geometry for _, _, geometry in parts])
+
+        result = gpd.GeoDataFrame(data, index=index, geometry=geometry, crs=sources[0].gdf.crs)
+        return self._add_categories(result, type_column or sources[0].type_column)
+
+    def _add_categories(self, gdf, type_column):
+        if self._categories is None:
+            return gdf
+        categories = gdf[type_column].map(self._categories).fillna('uncategorized')
+        return gdf.assign(category=categories.to_numpy(dtype=object))
+
+    def summary(self):
+        """
+        Per-stage row counts of the last run.
+
+        Returns:
+        --------
+        summary : pandas.DataFrame
+            One row per stage with the rows left and the time spent
+        """
+        return pd.DataFrame(self.stage_counts, columns=['stage', 'rows', 'seconds'])
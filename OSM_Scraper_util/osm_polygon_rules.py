@@ -0,0 +1,127 @@
+# Area rules and multipolygon assembly for OSM features, following osmnx
+# 2.1.1 (osmnx/features.py, MIT license), so the parser builds the same
+# geometries as osmnx without depending on its private helpers.
+
+import logging
+
+from shapely import MultiLineString, MultiPolygon, Polygon, prepare
+from shapely.ops import linemerge, polygonize, unary_union
+
+
+# OSM tags that make a closed way a polygon, based on
+# https://wiki.openstreetmap.org/wiki/Overpass_turbo/Polygon_Features
+POLYGON_FEATURES = {
+    "aeroway": {"polygon": "blocklist", "values": {"taxiway"}},
+    "amenity": {"polygon": "all"},
+    "area": {"polygon": "all"},
+    "area:highway": {"polygon": "all"},
+    "barrier": {
+        "polygon": "passlist",
+        "values": {"city_wall", "ditch", "hedge", "retaining_wall", "spikes"},
+    },
+    "boundary": {"polygon": "all"},
+    "building": {"polygon": "all"},
+    "building:part": {"polygon": "all"},
+    "craft": {"polygon": "all"},
+    "golf": {"polygon": "all"},
+    "highway": {"polygon": "passlist", "values": {"elevator", "escape", "rest_area", "services"}},
+    "historic": {"polygon": "all"},
+    "indoor": {"polygon": "all"},
+    "landuse": {"polygon": "all"},
+    "leisure": {"polygon": "all"},
+    "man_made": {"polygon": "blocklist", "values": {"cutline", "embankment", "pipeline"}},
+    "military": {"polygon": "all"},
+    "natural": {
+        "polygon": "blocklist",
+        "values": {"arete", "cliff", "coastline", "ridge", "tree_row"},
+    },
+    "office": {"polygon": "all"},
+    "place": {"polygon": "all"},
+    "power": {"polygon": "passlist", "values": {"generator", "plant", "substation", "transformer"}},
+    "public_transport": {"polygon": "all"},
+    "railway": {
+        "polygon": "passlist",
+        "values": {"platform", "roundhouse", "station", "turntable"},
+    },
+    "ruins": {"polygon": "all"},
+    "shop": {"polygon": "all"},
+    "tourism": {"polygon": "all"},
+    "waterway": {"polygon": "passlist", "values": {"boatyard", "dam", "dock", "riverbank"}},
+}
+
+logger = logging.getLogger("osm_polygon_rules")
+
+
+def build_relation_geometry(members, way_geometries):
+    """
+    Build the geometry of a multipolygon or boundary relation from the
+    geometries of its member ways. Outer and inner ring fragments are merged
+    and polygonized, then the inner rings are cut out of the outer polygons
+    containing them.
+
+    Parameters:
+    -----------
+    members : list of dict
+        The relation's members ("type", "ref" and "role")
+    way_geometries : dict
+        LineString or Polygon of each member way, by way id
+
+    Returns:
+    --------
+    geometry : shapely.geometry.Polygon or MultiPolygon
+        The relation's geometry; an empty Polygon if a member way is missing
+    """
+    inner_linestrings = []
+    outer_linestrings = []
+    inner_polygons = []
+    outer_polygons = []
+
+    for member in members:
+        if member["type"] != "way":
+            continue
+        geometry = way_geometries.get(member["ref"])
+        if geometry is None:
+            # Without every member the relation cannot be built; the empty
+            # geometry is dropped with the other invalid ones
+            logger.warning(f"Cannot build relation geometry, missing member way {member['ref']}")
+            return Polygon()
+        role = member["role"]
+        if role == "outer" and geometry.geom_type == "LineString":
+            outer_linestrings.append(geometry)
+        elif role == "outer" and geometry.geom_type == "Polygon":
+            outer_polygons.append(geometry)
+        elif role == "inner" and geometry.geom_type == "LineString":
+            inner_linestrings.append(geometry)
+        elif role == "inner" and geometry.geom_type == "Polygon":
+            inner_polygons.append(geometry)
+
+    outer_polygons += _polygonize_fragments(outer_linestrings)
+    inner_polygons += _polygonize_fragments(inner_linestrings)
+    return _remove_polygon_holes(outer_polygons, inner_polygons)
+
+
+def _polygonize_fragments(linestrings):
+    merged = linemerge(linestrings)
+    if merged.geom_type == "LineString":
+        merged = MultiLineString([merged])
+    polygons = []
+    for linestring in merged.geoms:
+        polygons += polygonize(linestring)
+    return polygons
+
+
+def _remove_polygon_holes(outer_polygons, inner_polygons):
+    # Islands inside a hole of a larger polygon are kept as separate outer polygons
+    if len(inner_polygons) == 0:
+        geometry = unary_union(outer_polygons)
+    else:
+        polygons_with_holes = []
+        for outer in outer_polygons:
+            prepare(outer)
+            holes = [inner for inner in inner_polygons if outer.contains(inner)]
+            polygons_with_holes.append(outer.difference(unary_union(holes)))
+        geometry = unary_union(polygons_with_holes)
+
+    if isinstance(geometry, (Polygon, MultiPolygon)):
+        return geometry
+    return Polygon()
@@ -0,0 +1,165 @@
+import re
+import logging
+
+from osm_tags import osm_features
+
+
+# Characters with a meaning in the POSIX extended regexes Overpass uses
+_REGEX_SPECIAL = re.compile(r"[.^$*+?()\[\]{}|\\]")
+
+
+class CompiledQuery:
+    """
+    The tag part of a feature request after compilation: what is sent to the
+    server, and the exact value filter that has to be applied locally.
+    """
+
+    def __init__(self, feature_type, values, mode):
+        """
+        Initialize the compiled query.
+
+        Parameters:
+        -----------
+        feature_type : str
+            The OSM feature type (e.g., 'amenity', 'shop', 'highway')
+        values : list or None
+            The requested tag values, or None if every value was requested
+        mode : str
+            'values' to request each value explicitly, 'regex' to request all
+            values with a single key-regex filter, or 'key' to request every
+            feature carrying the key and filter the values locally
+        """
+        self.feature_type = feature_type
+        self.values = values
+        self.mode = mode
+
+    @property
+    def request_tags(self):
+        """Tag specification actually sent to the server (True means key=*)."""
+        if self.mode == 'key':
+            return True
+        return list(self.values)
+
+    @property
+    def needs_local_filter(self):
+        """True if the server may return values that were not requested."""
+        return self.mode == 'key' and self.values is not None
+
+    def osmnx_tags(self):
+        """
+        Tags dictionary in the form expected by osmnx. osmnx cannot express
+        regex filters, so regex queries are sent as explicit value lists.
+
+        Returns:
+        --------
+        tags : dict
+            {feature_type: list of values} or {feature_type: True}
+        """
+        return {self.feature_type: self.request_tags}
+
+    def overpass_filters(self):
+        """
+        Tag filters in Overpass QL syntax.
+
+        Returns:
+        --------
+        filters : list of str
+            A single filter: key=*, an exact value, or a key-regex over the values
+        """
+        key = self._escape(self.feature_type)
+        if self.mode == 'key':
+            return [f'["{key}"]']
+        if self.mode == 'regex' or len(self.values) > 1:
+            pattern = "|".join(_REGEX_SPECIAL.sub(r"\\\g<0>", str(value)) for value in self.values)
+            return [f'["{key}"~"^({self._escape(pattern)})$"]']
+        return [f'["{key}"="{self._escape(str(self.values[0]))}"]']
+
+    @staticmethod
+    def _escape(text):
+        return text.replace("\\", "\\\\").replace('"', '\\"')
+
+    def apply_local_filter(self, gdf):
+        """
+        Keep only features whose feature type value was requested.
+
+        Parameters:
+        -----------
+        gdf : geopandas.GeoDataFrame
+            Features returned by the server
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The features matching the requested values
+        """
+        if gdf is None or len(gdf) == 0 or not self.needs_local_filter:
+            return gdf
+        if self.feature_type not in gdf.columns:
+            return gdf.iloc[0:0]
+        return gdf[gdf[self.feature_type].isin(self.values)]
+
+
+class OverpassQueryCompiler:
+    """
+    Compiles a feature type and tag list into a compact server request.
+
+    Short lists are requested value by value. Long lists that cover most of
+    the known values for a key collapse into a single key=* request, and the
+    exact values are then selected locally with a vectorized isin. Other long
+    lists become a single key-regex filter for queries the service builds itself.
+    """
+
+    def __init__(self, max_values=20, key_coverage=0.5, known_values=None, logger=None):
+        """
+        Initialize the query compiler.
+
+        Parameters:
+        -----------
+        max_values : int, default=20
+            Longest tag list that is still requested value by value
+        key_coverage : float, default=0.5
+            Minimum fraction of the known values for a key a long list must
+            cover before it is collapsed into a key=* request
+        known_values : dict, optional
+            Known values per feature type. Defaults to osm_tags.osm_features.
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.max_values = max_values
+        self.key_coverage = key_coverage
+        self.known_values = known_values if known_values is not None else osm_features
+        self.logger = logger or logging.getLogger("OverpassQueryCompiler")
+
+    def compile(self, feature_type, tags):
+        """
+        Compile a feature request.
+
+        Parameters:
+        -----------
+        feature_type : str
+            The OSM feature type (e.g., 'amenity', 'shop', 'highway')
+        tags : list or bool
+            List of specific tags to fetch, or True for every value. An empty
+            list (or None) also requests every value, as a plain key query.
+
+        Returns:
+        --------
+        query : CompiledQuery
+            The compiled request
+        """
+        if tags is True or not tags:
+            return CompiledQuery(feature_type, None, 'key')
+
+        # Keep the caller's order but drop repeated values
+        values = list(dict.fromkeys(tags))
+        if len(values) <= self.max_values:
+            return CompiledQuery(feature_type, values, 'values')
+
+        known = set(self.known_values.get(feature_type, []))
+        coverage = len(known.intersection(values)) / len(known) if known else 1.0
+        if coverage >= self.key_coverage:
+            self.logger.info(f"Collapsed {len(values)} {feature_type} values into a single "
+                             f"'{feature_type}=*' query")
+            return CompiledQuery(feature_type, values, 'key')
+
+        return CompiledQuery(feature_type, values, 'regex')
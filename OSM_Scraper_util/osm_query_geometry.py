@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+from shapely.geometry import box
+
+import geometry_kernel
+
+
+class QueryGeometry:
+    """
+    A boundary prepared for querying: the polygon sent to the server and the
+    exact boundary used to clip what comes back.
+    """
+
+    def __init__(self, boundary, query_polygon):
+        """
+        Initialize the query geometry.
+
+        Parameters:
+        -----------
+        boundary : shapely.geometry
+            The exact boundary. A copy of it is prepared for repeated
+            predicates; the caller's geometry is left untouched.
+        query_polygon : shapely.geometry.Polygon or MultiPolygon
+            Simplified polygon covering the boundary
+        """
+        # shapely.prepare modifies the geometry it is given, and the boundary
+        # is often the user's own polygon (e.g. an uploaded shapefile)
+        boundary = shapely.from_wkb(shapely.to_wkb(boundary))
+        shapely.prepare(boundary)
+        self.boundary = boundary
+        self.query_polygon = query_polygon
+
+    def __repr__(self):
+        return (f"QueryGeometry({self.boundary_vertices} boundary vertices, "
+                f"{self.query_vertices} query vertices)")
+
+    @property
+    def boundary_vertices(self):
+        """Number of vertices of the exact boundary."""
+        return int(shapely.get_num_coordinates(self.boundary))
+
+    @property
+    def query_vertices(self):
+        """Number of vertices of the query polygon."""
+        return int(shapely.get_num_coordinates(self.query_polygon))
+
+    def clip(self, gdf):
+        """
+        Keep the features intersecting the exact boundary.
+
+        Parameters:
+        -----------
+        gdf : geopandas.GeoDataFrame
+            Features returned for the query polygon
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The features intersecting the boundary (the input if all do)
+        """
+        if gdf is None or len(gdf) == 0:
+            return gdf
+        inside = shapely.intersects(self.boundary, geometry_kernel.geometry_array(gdf))
+        return gdf if inside.all() else gdf[inside]
+
+    def clip_tile(self, gdf, tile):
+        """
+        Keep the features of a tile that intersect the exact boundary.
+
+        Features returned for a rectangular tile intersect the tile, so for
+        tiles lying inside the boundary only points outside the tile (e.g.
+        centers of large features reaching into it) need the exact test.
+        Other tiles are clipped with clip().
+
+        Parameters:
+        -----------
+        gdf : geopandas.GeoDataFrame
+            Features returned for the tile
+        tile : shapely.geometry.Polygon
+            The rectangular tile they were requested for
+
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The features intersecting the boundary (the input if all do)
+        """
+        if gdf is None or len(gdf) == 0:
+            return gdf
+        if not self.boundary.contains(tile):
+            return self.clip(gdf)
+
+        geometry = geometry_kernel.geometry_array(gdf)
+        # Coordinates are NaN for non-points, which never count as outside
+        x = shapely.get_x(geometry)
+        y = shapely.get_y(geometry)
+        minx, miny, maxx, maxy = tile.bounds
+        outside = (x < minx) | (x > maxx) | (y < miny) | (y > maxy)
+        if not outside.any():
+            return gdf
+
+        keep = np.ones(len(gdf), dtype=bool)
+        keep[outside] = shapely.intersects(self.boundary, geometry[outside])
+        return gdf if keep.all() else gdf[keep]
+
+
+class QueryGeometryPreparer:
+    """
+    Turns detailed boundaries (uploaded shapefiles, administrative areas)
+    into short Overpass query polygons.
+
+    The query polygon is the boundary without holes, buffered outwards,
+    simplified and snapped to a coordinate grid. The buffer is larger than
+    the simplification tolerance plus the grid size, so the query polygon
+    always covers the boundary; features outside the boundary that it lets
+    through are removed locally by QueryGeometry.clip. Results are cached
+    per boundary, so every workflow of a service reuses them.
+    """
+
+    def __init__(self, tolerance=0.0005, grid_size=0.0001, max_vertices=500, cache_size=32,
+                 logger=None):
+        """
+        Initialize the preparer.
+
+        Parameters:
+        -----------
+        tolerance : float, default=0.0005
+            Initial simplification tolerance in degrees (~50 m)
+        grid_size : float, default=0.0001
+            Coordinate grid of the query polygon in degrees (~10 m)
+        max_vertices : int, default=500
+            The tolerance is doubled until the query polygon has at most this many vertices
+        cache_size : int, default=32
+            Number of prepared boundaries kept in memory
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.tolerance = tolerance
+        self.grid_size = grid_size
+        self.max_vertices = max_vertices
+        self.cache_size = cache_size
+        self.logger = logger or logging.getLogger("QueryGeometryPreparer")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prepare(self, boundary):
+        """
+        Get the query geometry of a boundary, from the cache when possible.
+
+        Parameters:
+        -----------
+        boundary : shapely.geometry
+            The boundary in EPSG:4326
+
+        Returns:
+        --------
+        query_geometry : QueryGeometry
+            The query polygon and the prepared exact boundary
+        """
+        key = hashlib.sha1(shapely.to_wkb(boundary)).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        query_geometry = QueryGeometry(boundary, self.query_polygon(boundary))
+        self.logger.info(f"Prepared query polygon: {query_geometry.boundary_vertices} -> "
+                         f"{query_geometry.query_vertices} vertices")
+
+        with self._lock:
+            self._cache[key] = query_geometry
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return query_geometry
+
+    def query_polygon(self, boundary):
+        """
+        Build a short polygon covering a boundary.
+
+        Parameters:
+        -----------
+        boundary : shapely.geometry
+            The boundary in EPSG:4326
+
+        Returns:
+        --------
+        polygon : shapely.geometry.Polygon or MultiPolygon
+            Polygon covering the boundary, with coordinates on the grid
+        """
+        # Overpass poly: filters only use exterior rings
+        outline = _without_holes(boundary)
+        if shapely.get_num_coordinates(outline) <= self.max_vertices:
+            return outline
+
+        minx, miny, maxx, maxy = boundary.bounds
+        extent = max(maxx - minx, maxy - miny)
+        tolerance = self.tolerance
+        polygon = None
+        while tolerance < extent:
+            candidate = shapely.buffer(outline, tolerance + self.grid_size, quad_segs=2)
+            candidate = shapely.simplify(candidate, tolerance)
+            candidate = shapely.set_precision(candidate, self.grid_size)
+            if candidate.geom_type in ("Polygon", "MultiPolygon") and candidate.covers(boundary):
+                polygon = candidate
+                if shapely.get_num_coordinates(polygon) <= self.max_vertices:
+                    break
+            tolerance *= 2
+
+        if polygon is None:
+            # The bounding box, widened to the grid, always covers the boundary
+            polygon = box(minx - self.grid_size, miny - self.grid_size,
+                          maxx + self.grid_size, maxy + self.grid_size)
+        return polygon
+
+
+def _without_holes(geometry):
+    """Polygon or MultiPolygon of the exterior rings of a (multi)polygon."""
+    parts = shapely.get_parts(geometry)
+    polygons = [shapely.Polygon(part.exterior) for part in parts if part.geom_type == "Polygon"]
+    if not polygons:
+        return geometry.envelope
+    return polygons[0] if len(polygons) == 1 else shapely.MultiPolygon(polygons)
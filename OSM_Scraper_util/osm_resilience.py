@@ -0,0 +1,495 @@
+import os
+import re
+import json
+import time
+import random
+import shutil
+import logging
+import threading
+
+import requests
+import geopandas as gpd
+
+from osm_cache import write_geoparquet
+
+
+# HTTP statuses worth retrying: rate limited, overloaded or briefly unavailable servers
+TRANSIENT_STATUS_CODES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request once the circuit breaker has tripped."""
+
+
+def status_code_of(error):
+    """
+    Get the HTTP status code carried by a request error, if any.
+
+    Parameters:
+    -----------
+    error : Exception
+        Error raised by requests, osmnx or the Overpass client
+
+    Returns:
+    --------
+    status_code : int or None
+        The status code, or None if the error does not carry one
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None and isinstance(error, requests.HTTPError) and error.response is not None:
+        status_code = error.response.status_code
+    if status_code is None:
+        # osmnx only reports the status in the message ("... responded: 429 Too Many Requests")
+        match = re.search(r"(?:responded:|status code)\s*(\d{3})", str(error))
+        status_code = int(match.group(1)) if match else None
+    return status_code
+
+
+def is_transient(error):
+    """
+    Check whether a request error is worth retrying as is.
+
+    Connection failures, client-side timeouts and 429/502/503/504 responses
+    are transient. Errors caused by the request itself (bad queries, server
+    runtime errors on too large areas) are not; tiles hitting those are split
+    instead.
+
+    Parameters:
+    -----------
+    error : Exception
+        The error raised by the request
+
+    Returns:
+    --------
+    transient : bool
+        True if the same request may succeed later
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return status_code_of(error) in TRANSIENT_STATUS_CODES
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests after too many consecutive failures in a run, so
+    an unreachable or overloaded server fails the remaining tiles fast (and
+    leaves them to be resumed) instead of retrying each of them at length.
+    """
+
+    def __init__(self, failure_threshold=5, logger=None):
+        """
+        Initialize the circuit breaker.
+
+        Parameters:
+        -----------
+        failure_threshold : int, default=5
+            Number of consecutive failed calls (after retries) that trips the breaker
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.failure_threshold = failure_threshold
+        self.logger = logger or logging.getLogger("CircuitBreaker")
+        self._failures = 0
+        self._open = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """True once the breaker has tripped in this run."""
+        return self._open
+
+    def reset(self):
+        """Close the breaker for a new run."""
+        with self._lock:
+            self._failures = 0
+            self._open = False
+
+    def check(self):
+        """
+        Raise if the breaker is open.
+
+        Raises:
+        -------
+        CircuitOpenError
+            If too many calls failed in a row in this run
+        """
+        if self._open:
+            raise CircuitOpenError("Too many consecutive request failures; skipping request")
+
+    def record_success(self):
+        """Record a successful call."""
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self):
+        """Record a call that failed after all retries."""
+        with self._lock:
+            self._failures += 1
+            if not self._open and self._failures >= self.failure_threshold:
+                self._open = True
+                self.logger.error(f"Circuit breaker open after {self._failures} consecutive failures")
+
+
+class RetryPolicy:
+    """
+    Runs calls with retries and exponential backoff on transient errors,
+    consulting an optional circuit breaker before every attempt.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=2.0, max_delay=60.0, breaker=None,
+                 slot_monitor=None, logger=None):
+        """
+        Initialize the retry policy.
+
+        Parameters:
+        -----------
+        max_attempts : int, default=4
+            Maximum number of attempts per call
+        base_delay : float, default=2.0
+            Delay before the first retry in seconds; doubled for each further retry
+        max_delay : float, default=60.0
+            Upper bound on a single delay in seconds
+        breaker : CircuitBreaker, optional
+            Default breaker of calls that do not pass their own (see call)
+        slot_monitor : OverpassSlotMonitor, optional
+            If given, a 429 response waits for a free Overpass slot instead of
+            a blind backoff
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.slot_monitor = slot_monitor
+        self.logger = logger or logging.getLogger("RetryPolicy")
+
+    def delay(self, attempt, error=None):
+        """
+        Get the pause before a retry.
+
+        Parameters:
+        -----------
+        attempt : int
+            Number of attempts made so far (1 after the first failure)
+        error : Exception, optional
+            The error of the last attempt; a Retry-After value it carries is honored
+
+        Returns:
+        --------
+        delay : float
+            Seconds to wait
+        """
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            return min(self.max_delay, float(retry_after))
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        # Jitter keeps concurrent tiles from retrying in lockstep
+        return delay * random.uniform(0.75, 1.25)
+
+    def call(self, fn, *args, description="request", breaker=None, **kwargs):
+        """
+        Call fn, retrying transient errors.
+
+        Parameters:
+        -----------
+        fn : callable
+            The request to run
+        *args, **kwargs :
+            Arguments passed to fn
+        description : str, default="request"
+            Name of the call used in log messages
+        breaker : CircuitBreaker, optional
+            Breaker of the run the call belongs to. Defaults to the policy's breaker.
+
+        Returns:
+        --------
+        result : any
+            fn's return value
+
+        Raises:
+        -------
+        CircuitOpenError
+            If the breaker is open
+        Exception
+            The last error, once it is not transient or attempts are exhausted
+        """
+        breaker = breaker or self.breaker
+        attempt = 0
+        while True:
+            if breaker is not None:
+                breaker.check()
+            attempt += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                if attempt >= self.max_attempts:
+                    if breaker is not None:
+                        breaker.record_failure()
+                    raise
+                self._pause(attempt, e, description)
+                continue
+
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    def _pause(self, attempt, error, description):
+        delay = self.delay(attempt, error)
+        if status_code_of(error) == 429 and self.slot_monitor is not None:
+            # The server knows when this client's next slot frees up
+            status = self.slot_monitor.get_status()
+            if status is not None and status['available'] == 0 and status['wait'] > 0:
+                delay = min(self.max_delay, status['wait'])
+                self.logger.warning(f"{description} rate limited (attempt {attempt}); "
+                                    f"next Overpass slot in {delay:.0f}s")
+                time.sleep(delay)
+                return
+        self.logger.warning(f"{description} failed (attempt {attempt}/{self.max_attempts}): "
+                            f"{str(error)[:200]}; retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+class TileRunJournal:
+    """
+    On-disk record of a tiled fetch, so an interrupted or partly failed run
+    can be resumed: finished tiles are kept and only the outstanding tiles
+    (failed, or never finished) are fetched again.
+
+    The journal lives in its own folder per request. Finished tiles are held
+    in memory and only written (as GeoParquet files) when the run ends with
+    tiles outstanding, so runs that succeed write nothing but the state
+    file, which is itself saved in batches. A journal older than its TTL is
+    discarded instead of resumed.
+    """
+
+    def __init__(self, folder, ttl=None, save_every=25, save_interval=5.0, logger=None):
+        """
+        Open (or start) the journal of a request.
+
+        Parameters:
+        -----------
+        folder : str
+            Folder of this request's journal
+        ttl : float, optional
+            Maximum age in seconds of a journal that may be resumed; older
+            ones are discarded. None resumes journals of any age.
+        save_every : int, default=25
+            Number of recorded changes after which the state is saved
+        save_interval : float, default=5.0
+            Seconds after which pending changes are saved regardless
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.folder = folder
+        self.ttl = ttl
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.logger = logger or logging.getLogger("TileRunJournal")
+        self._lock = threading.Lock()
+        self._state = _empty_state()
+        self._next_part = 0
+        # Finished tiles not written yet: bounds key -> (depth, features)
+        self._unsaved = {}
+        self._changes = 0
+        self._last_save = time.monotonic()
+
+        state_path = os.path.join(folder, "state.json")
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, "r", encoding="utf-8") as f:
+                    self._state = json.load(f)
+                self._next_part = len(self._state['completed'])
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Could not read tile journal {state_path}: {str(e)}")
+
+            if self.ttl is not None and self.age > self.ttl:
+                self.logger.warning(f"Discarding tile journal {folder} from {self.age / 3600:.1f} hours ago "
+                                    f"(older than {self.ttl / 3600:.1f} hours)")
+                shutil.rmtree(folder, ignore_errors=True)
+                self._state = _empty_state()
+                self._next_part = 0
+
+    @property
+    def is_resumable(self):
+        """True if an earlier run left outstanding tiles."""
+        return bool(self._state['outstanding'])
+
+    @property
+    def age(self):
+        """Seconds since the journal's run was planned."""
+        return time.time() - self._state.get('created', 0)
+
+    def outstanding(self):
+        """
+        Get the tiles still to fetch.
+
+        Returns:
+        --------
+        tiles : list of (tuple, int)
+            Tile bounds (minx, miny, maxx, maxy) and quadtree depth
+        """
+        return [(tuple(float(value) for value in key.split(",")), depth)
+                for key, depth in self._state['outstanding'].items()]
+
+    def completed_parts(self):
+        """
+        Load the results of the finished tiles.
+
+        Returns:
+        --------
+        gdfs : list of geopandas.GeoDataFrame
+            One frame per finished tile that had features
+        """
+        parts = []
+        for name in self._state['completed'].values():
+            if name is not None:
+                parts.append(gpd.read_parquet(os.path.join(self.folder, name)))
+        return parts
+
+    def plan(self, tiles):
+        """
+        Start a new run, discarding what an earlier run left behind, and
+        record the tiles it is going to fetch.
+
+        Parameters:
+        -----------
+        tiles : list of (shapely.geometry.Polygon, int)
+            Tiles with their quadtree depth
+        """
+        with self._lock:
+            shutil.rmtree(self.folder, ignore_errors=True)
+            self._state = _empty_state()
+            self._next_part = 0
+            self._unsaved = {}
+            for cell, depth in tiles:
+                self._state['outstanding'][_bounds_key(cell.bounds)] = depth
+            self._save()
+
+    def split(self, cell, subcells, depth):
+        """
+        Record that a tile was replaced by its quadrants.
+
+        Parameters:
+        -----------
+        cell : shapely.geometry.Polygon
+            The tile that was split
+        subcells : list of shapely.geometry.Polygon
+            The quadrants submitted in its place
+        depth : int
+            Quadtree depth of the quadrants
+        """
+        with self._lock:
+            self._state['outstanding'].pop(_bounds_key(cell.bounds), None)
+            for subcell in subcells:
+                self._state['outstanding'][_bounds_key(subcell.bounds)] = depth
+            self._changed()
+
+    def complete(self, cell, gdf=None):
+        """
+        Record a finished tile and keep its features.
+
+        Parameters:
+        -----------
+        cell : shapely.geometry.Polygon
+            The tile
+        gdf : geopandas.GeoDataFrame, optional
+            Its features; None or empty if they were stored elsewhere or there were none
+        """
+        key = _bounds_key(cell.bounds)
+        with self._lock:
+            depth = self._state['outstanding'].pop(key, 0)
+            self._state['failed'].pop(key, None)
+            if gdf is not None and len(gdf) > 0:
+                # Stays outstanding on disk until its features are written
+                self._unsaved[key] = (depth, gdf)
+            else:
+                self._state['completed'][key] = None
+            self._changed()
+
+    def fail(self, cell, error):
+        """
+        Record a tile that could not be fetched; it stays outstanding.
+
+        Parameters:
+        -----------
+        cell : shapely.geometry.Polygon
+            The tile
+        error : Exception
+            The last error
+        """
+        with self._lock:
+            self._state['failed'][_bounds_key(cell.bounds)] = str(error)[:500]
+            self._changed()
+
+    def failures(self):
+        """
+        Get the tiles that failed in the last run.
+
+        Returns:
+        --------
+        failures : list of dict
+            'bounds' and 'error' of each failed tile
+        """
+        return [{'bounds': tuple(float(value) for value in key.split(",")), 'error': error}
+                for key, error in self._state['failed'].items()]
+
+    def finish(self):
+        """
+        End the run: remove the journal if nothing is outstanding, otherwise
+        write the finished tiles and save the state so the run can be resumed.
+
+        Returns:
+        --------
+        complete : bool
+            True if every tile finished
+        """
+        with self._lock:
+            if not self._state['outstanding']:
+                self._unsaved = {}
+                shutil.rmtree(self.folder, ignore_errors=True)
+                return True
+
+            os.makedirs(self.folder, exist_ok=True)
+            for key, (depth, gdf) in self._unsaved.items():
+                name = f"tile-{self._next_part:05d}.parquet"
+                self._next_part += 1
+                write_geoparquet(gdf, os.path.join(self.folder, name))
+                self._state['completed'][key] = name
+            self._unsaved = {}
+            self._save()
+            return False
+
+    def _changed(self):
+        # Must be called with the lock held; saves once enough changes or time accumulated
+        self._changes += 1
+        if self._changes >= self.save_every or time.monotonic() - self._last_save >= self.save_interval:
+            self._save()
+
+    def _save(self):
+        # Finished tiles whose features are only in memory are saved as outstanding
+        state = dict(self._state)
+        state['outstanding'] = dict(self._state['outstanding'])
+        for key, (depth, _) in self._unsaved.items():
+            state['outstanding'][key] = depth
+
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, "state.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+        self._changes = 0
+        self._last_save = time.monotonic()
+
+
+def _empty_state():
+    return {'created': time.time(), 'outstanding': {}, 'completed': {}, 'failed': {}}
+
+
+def _bounds_key(bounds):
+    return ",".join(f"{value:.6f}" for value in bounds)
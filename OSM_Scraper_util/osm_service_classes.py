@@ -5,14 +5,35 @@ from shapely.geometry import box
 import numpy as np
 import logging
 import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import shapely
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 import rasterio
 from rasterio.transform import from_origin
-from scipy.stats import gaussian_kde
 import folium
 from folium.plugins import MarkerCluster
 
+from osm_tile_executor import TileExecutor, OverpassSlotMonitor
+from osm_tiling import DensityIndex, QuadtreeTilePlanner, query_signature
+from osm_query_compiler import OverpassQueryCompiler
+from overpass_client import OverpassClient, OverpassError
+from overpass_parser import build_point_frame, OverpassStreamParser
+from osm_cache import TileCache, ResponseCacheStore, ResultCache
+from osm_pbf_backend import PbfBackend
+from osm_dataset import TileDatasetWriter
+from osm_dedup import FeatureDeduplicator
+from osm_pipeline import CleaningPipeline, DEFAULT_UNWANTED_FACILITIES
+from osm_columns import compact_features, prune_columns
+from osm_query_geometry import QueryGeometryPreparer
+from osm_resilience import CircuitBreaker, RetryPolicy, TileRunJournal, is_transient
+import geometry_kernel
+import density_kernel
+from heatmap_pool import HeatmapProcessPool, write_density_raster
+
 
 class OSMDataService:
     """
@@ -20,7 +41,9 @@ class OSMDataService:
     Centralizes query logic, error handling, and data post-processing.
     """
     
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, max_workers=4, cache_folder=None, pbf_path=None,
+                 count_queries=False, memory_cache_size=8, cache_ttl=30 * 24 * 3600, 
+                 resume_ttl=24 * 3600, single_request_features=50000):
         """
         Initialize the OSM data service.
 
@@ -28,19 +51,89 @@ class OSMDataService:
         -----------
         logger : logging.Logger, optional
             Logger for outputting status messages. If None, a new logger will be created.
+        max_workers : int, default=4
+            Maximum number of tiles fetched concurrently by the tiled approach.
+            Requests actually sent to Overpass are also capped by its slot limit.
+        cache_folder : str, optional
+            Folder for the service's own caches (e.g. observed feature densities).
+            Defaults to osmnx's cache folder.
+        pbf_path : str, optional
+            Local .osm.pbf extract. If given, features are read from the extract
+            (with a spatial index built on first use) instead of the Overpass API.
+        count_queries : bool, default=False
+            If True, requests are measured with cheap Overpass count queries
+            (or the density history) before fetching, so requests above
+            single_request_features are tiled up front instead of after a
+            failed attempt. This costs a count request per new area.
+        memory_cache_size : int, default=8
+            Number of fetch_osm_data results kept in memory, so workflows
+            requesting the same data in one session reuse it. 0 keeps none;
+            identical requests running at the same time still share one fetch.
+        cache_ttl : float, default=30 days
+            Maximum age in seconds of cached responses, tiles and results,
+            after which they are downloaded again, and of observed feature
+            densities. None keeps them until evicted for space.
+        resume_ttl : float, default=1 day
+            Maximum age in seconds of an incomplete tiled run that is resumed
+            (see fetch_data_by_tiles); older runs start over. None resumes
+            runs of any age.
+        single_request_features : int, default=50000
+            Estimated feature count above which count_queries tiles a request
+            up front; smaller requests are sent as one request.
         """
         self.logger = logger or logging.getLogger("OSMDataService")
+        self.max_workers = max_workers
+        self.count_queries = count_queries
+        self.single_request_features = single_request_features
+        self.resume_ttl = resume_ttl
+        self.cache_folder = cache_folder or ox.settings.cache_folder
+        
+        # Feature densities remembered across runs so tiles can be sized up front
+        self.density_index = DensityIndex(os.path.join(self.cache_folder, "density_index.json"), 
+                                          ttl=cache_ttl, logger=self.logger)
+        self.tile_planner = QuadtreeTilePlanner(self.density_index, logger=self.logger)
+        self.query_compiler = OverpassQueryCompiler(logger=self.logger)
+        self.response_cache = ResponseCacheStore(os.path.join(self.cache_folder, "responses"), 
+                                                 ttl=cache_ttl, logger=self.logger)
+        # Transient errors (429/504, dropped connections) are retried with backoff.
+        # Each run passes its own circuit breaker, so concurrent runs (e.g. a
+        # tiled fetch and a coalesced request) never reset each other's.
+        # The server's slot limit is read when the first request is sent.
+        slot_monitor = OverpassSlotMonitor(logger=self.logger)
+        self.retry_policy = RetryPolicy(slot_monitor=slot_monitor, logger=self.logger)
+        self.geocode_retry_policy = RetryPolicy(logger=self.logger)
+        self.overpass_client = OverpassClient(logger=self.logger, cache_store=self.response_cache,
+                                              retry_policy=self.retry_policy, slot_monitor=slot_monitor)
+        self.tile_cache = TileCache(os.path.join(self.cache_folder, "tiles"), ttl=cache_ttl, 
+                                    logger=self.logger)
+        self.result_cache = ResultCache(os.path.join(self.cache_folder, "results"), ttl=cache_ttl, 
+                                        logger=self.logger)
+        self.pbf_backend = PbfBackend(pbf_path, logger=self.logger) if pbf_path else None
+        # Simplified query polygons and prepared clip boundaries, cached per boundary
+        self.query_geometry = QueryGeometryPreparer(logger=self.logger)
+        self.deduplicator = FeatureDeduplicator(self.logger)
+        self.failed_tiles = []
+        self.incomplete_tiles = []
+        self._geocoded = {}
+        # fetch_osm_data futures by request key: running ones are joined by
+        # identical requests, finished ones are reused (oldest dropped first)
+        self.memory_cache_size = memory_cache_size
+        self._requests = OrderedDict()
+        self._requests_lock = threading.Lock()
     
     def fetch_osm_data(self, area_or_polygon, feature_type, tags, 
                        progress_callback=None, convert_polygons_to_points=False,
-                       auto_tiled=True, grid_size=3):
+                       auto_tiled=True, grid_size=3, centroids_only=False, use_tile_cache=False,
+                       use_result_cache=True, columns=None, categorical=False, bbox_tiles=False):
         """
         Unified method for fetching OSM data that handles both place names and polygons.
         
         Parameters:
         -----------
         area_or_polygon : str or shapely.geometry
-            Either a place name (string) or a polygon geometry
+            Either a place name (string) or a polygon geometry. Place names that
+            geocode to an OSM relation are queried by Overpass area id; other
+            places and polygons are queried by their coordinates.
         feature_type : str
             The OSM feature type (e.g., 'amenity', 'shop', 'highway')
         tags : list
@@ -53,6 +146,29 @@ class OSMDataService:
             If True, automatically switches to tiled approach if the initial query fails
         grid_size : int, default=3
             Number of grid cells to use in each dimension for tiled queries
+        centroids_only : bool, default=False
+            If True, asks Overpass for one center point per feature ("out center")
+            and builds a point GeoDataFrame directly, without downloading way and
+            relation geometries. Centers are computed by the server from each
+            feature's bounding box.
+        use_tile_cache : bool, default=False
+            If True, assembles the area from the global tile cache and only
+            downloads the tiles that are not cached yet (see fetch_data_by_cached_tiles)
+        use_result_cache : bool, default=True
+            If True, returns the result of an identical earlier request from
+            memory, or from the on-disk result cache, instead of re-parsing
+            responses. On-disk results expire after cache_ttl. Identical
+            requests already running are always joined instead of fetched twice.
+        columns : list, optional
+            Tag columns to keep, e.g. ['name']. The feature key column and the
+            geometry are always kept. None keeps every tag column osmnx returns.
+            Tiled fetches prune each tile as it arrives.
+        categorical : bool, default=False
+            If True, stores repeated string tag columns (e.g. the feature key)
+            as pandas categoricals
+        bbox_tiles : bool, default=False
+            If True, tiled fetches request each tile as a plain bbox and clip
+            the features to the boundary locally (see fetch_data_by_tiles)
             
         Returns:
         --------
@@ -62,41 +178,330 @@ class OSMDataService:
         self._log_progress("Fetching {} data with {} tags...", 
                           feature_type, len(tags), progress_callback)
         
-        # Create a tags dictionary for OSMnx
-        tags_dict = {feature_type: tags}
+        options = {
+            'convert_polygons_to_points': convert_polygons_to_points,
+            'centroids_only': centroids_only,
+        }
+        # Older entries were stored without these options; keep their keys valid
+        if columns is not None:
+            options['columns'] = sorted(columns)
+        if categorical:
+            options['categorical'] = True
+        if bbox_tiles:
+            options['bbox_tiles'] = True
+        if self.pbf_backend is not None:
+            options['source'] = self.pbf_backend.path
+        cache_key = self.result_cache.key(area_or_polygon, feature_type, tags, options)
+        
+        future, owner = self._claim_request(cache_key, reuse=use_result_cache)
+        if not owner:
+            if not future.done():
+                self._log_progress("Waiting for an identical {} request already in progress...", 
+                                  feature_type, None, progress_callback)
+            gdf = future.result()
+            if gdf is not None:
+                self._log_progress("✓ Reusing {} {} features fetched in this session", 
+                                  len(gdf), feature_type, progress_callback)
+            return _shallow_copy(gdf)
+        
+        try:
+            gdf = None
+            if use_result_cache and self.result_cache.enabled:
+                gdf = self.result_cache.get(cache_key)
+                if gdf is not None:
+                    self._log_progress("✓ Loaded {} {} features from the result cache", 
+                                      len(gdf), feature_type, progress_callback)
+            
+            if gdf is None:
+                gdf = self._fetch_osm_data(area_or_polygon, feature_type, tags, progress_callback, 
+                                           convert_polygons_to_points, auto_tiled, grid_size, 
+                                           centroids_only, use_tile_cache, columns, categorical,
+                                           bbox_tiles)
+                
+                if use_result_cache and self.result_cache.enabled and gdf is not None and len(gdf) > 0:
+                    self.result_cache.put(cache_key, gdf)
+        except BaseException as e:
+            self._release_request(cache_key, future, error=e)
+            raise
+        
+        self._release_request(cache_key, future, gdf)
+        return _shallow_copy(gdf)
+
+    def _claim_request(self, key, reuse=True):
+        """
+        Look up the future of a request, registering a new one if there is none.
+        
+        Parameters:
+        -----------
+        key : str
+            Request key (see ResultCache.key)
+        reuse : bool, default=True
+            If False, finished results are not reused; a running identical
+            request is still joined
+            
+        Returns:
+        --------
+        (future, owner) : tuple
+            The request's future, and True if the caller must run the request
+            and release the future with _release_request
+        """
+        with self._requests_lock:
+            future = self._requests.get(key)
+            if future is not None and (reuse or not future.done()):
+                self._requests.move_to_end(key)
+                return future, False
+            future = Future()
+            self._requests[key] = future
+            return future, True
+
+    def _release_request(self, key, future, gdf=None, error=None):
+        """
+        Publish the outcome of a request to the callers waiting on its future.
+        
+        Parameters:
+        -----------
+        key : str
+            Request key
+        future : concurrent.futures.Future
+            The future returned by _claim_request
+        gdf : geopandas.GeoDataFrame, optional
+            The result
+        error : BaseException, optional
+            The error the request failed with; failed requests are not kept
+        """
+        with self._requests_lock:
+            if error is not None:
+                if self._requests.get(key) is future:
+                    del self._requests[key]
+            else:
+                # Running requests are never dropped, so late callers can still join them
+                finished = [other for other, value in self._requests.items() if value.done()]
+                for other in finished[:max(0, len(finished) + 1 - self.memory_cache_size)]:
+                    del self._requests[other]
+                if self.memory_cache_size <= 0 and self._requests.get(key) is future:
+                    del self._requests[key]
+        
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(gdf)
+
+    def _fetch_osm_data(self, area_or_polygon, feature_type, tags, progress_callback,
+                        convert_polygons_to_points, auto_tiled, grid_size, 
+                        centroids_only, use_tile_cache, columns=None, categorical=False,
+                        bbox_tiles=False):
+        """
+        Fetch and process data without consulting the result cache.
+        Parameters are the same as for fetch_osm_data.
+        """
+        # Compile the tag list into a compact query; long lists are requested
+        # as key=* and the exact values are selected locally
+        query = self.query_compiler.compile(feature_type, tags)
+        tags_dict = query.osmnx_tags()
+        breaker = CircuitBreaker(logger=self.logger)
+        
+        if use_tile_cache:
+            return self.fetch_data_by_cached_tiles(
+                area_or_polygon, feature_type, tags, progress_callback, 
+                convert_polygons_to_points, centroids_only=centroids_only,
+                columns=columns, categorical=categorical, bbox_tiles=bbox_tiles
+            )
+        
+        # Requests too large for a single request are tiled up front instead
+        # of after a failed attempt
+        boundary = None
+        if auto_tiled and self._tile_counter(query) is not None:
+            boundary = self._get_boundary(area_or_polygon)
+            estimate = self._estimate_request_size(boundary, query, breaker)
+            if estimate is not None and estimate > self.single_request_features:
+                self._log_progress("Estimated ~{} features, above the single-request limit of {}; "
+                                  "fetching by tiles", int(estimate), 
+                                  self.single_request_features, progress_callback)
+                return self.fetch_data_by_tiles(
+                    area_or_polygon, feature_type, tags, 
+                    progress_callback, convert_polygons_to_points, grid_size,
+                    centroids_only=centroids_only, columns=columns, categorical=categorical,
+                    bbox_tiles=bbox_tiles
+                )
         
         try:
+            # Places that geocode to an OSM relation are queried by Overpass area id
+            # instead of sending the boundary's coordinates
+            area_clauses = None
+            if isinstance(area_or_polygon, str) and self.pbf_backend is None:
+                area_clauses = self._place_area_clauses(area_or_polygon)
+            
+            if centroids_only or self.pbf_backend is not None or area_clauses is not None:
+                # Point-only, offline and area-id requests go through the service's own backends
+                if boundary is None:
+                    boundary = self._get_boundary(area_or_polygon)
+                if boundary is None:
+                    raise ValueError(f"Could not geocode area: {area_or_polygon}")
+                if area_clauses is not None:
+                    self._log_progress("Using Overpass {} for place name: {}", 
+                                      area_clauses[0], area_or_polygon, progress_callback)
+                if centroids_only:
+                    self._log_progress("Fetching feature centers only", None, None, progress_callback)
+                if area_clauses is None and self.pbf_backend is None:
+                    # Query a short covering polygon, then clip to the exact boundary
+                    query_geometry = self.query_geometry.prepare(boundary)
+                    gdf = self._fetch_area(query_geometry.query_polygon, query, 
+                                           centroids_only=centroids_only, breaker=breaker)
+                    gdf = query_geometry.clip(gdf)
+                else:
+                    gdf = self._fetch_area(boundary, query, centroids_only=centroids_only, 
+                                           area_clauses=area_clauses, breaker=breaker)
             # Determine if we're using a place name or a polygon
-            if isinstance(area_or_polygon, str):
+            elif isinstance(area_or_polygon, str):
                 # It's a place name
-                self._log_progress("Using place name: {}", area_or_polygon, progress_callback)
-                gdf = ox.features_from_place(area_or_polygon, tags=tags_dict)
+                self._log_progress("Using place name: {}", area_or_polygon, None, progress_callback)
+                gdf = self._osmnx_features(ox.features_from_place, area_or_polygon, tags=tags_dict,
+                                           description="osmnx place request", breaker=breaker)
             else:
-                # It's a polygon
-                self._log_progress("Using polygon geometry", None, progress_callback)
-                gdf = ox.features_from_polygon(area_or_polygon, tags=tags_dict)
+                # It's a polygon: query a short covering polygon, then clip to the exact boundary
+                query_geometry = self.query_geometry.prepare(area_or_polygon)
+                self._log_progress("Using polygon geometry ({} query vertices)", 
+                                  query_geometry.query_vertices, None, progress_callback)
+                gdf = self._osmnx_features(ox.features_from_polygon, query_geometry.query_polygon,
+                                           tags=tags_dict, description="osmnx polygon request",
+                                           breaker=breaker)
+                gdf = query_geometry.clip(gdf)
+
+            gdf = query.apply_local_filter(gdf)
 
             # Process the results
-            return self._process_results(gdf, feature_type, convert_polygons_to_points, progress_callback)
+            return self._process_results(gdf, feature_type, convert_polygons_to_points, progress_callback,
+                                         columns, categorical)
             
         except Exception as e:
             # Handle query errors
-            if auto_tiled and ("too long" in str(e).lower() or "bad request" in str(e).lower()):
+            if auto_tiled and self._is_size_error(e):
                 self._log_progress("Query too large, switching to tiled approach...", 
                                   None, progress_callback)
                 return self.fetch_data_by_tiles(
                     area_or_polygon, feature_type, tags, 
-                    progress_callback, convert_polygons_to_points, grid_size
+                    progress_callback, convert_polygons_to_points, grid_size,
+                    centroids_only=centroids_only, columns=columns, categorical=categorical,
+                    bbox_tiles=bbox_tiles
                 )
             else:
                 self._log_progress("Error fetching data: {}", str(e), progress_callback, is_error=True)
                 raise e
 
+    def stream_osm_data(self, area_or_polygon, feature_type, tags, batch_size=10000,
+                        centroids_only=False, progress_callback=None):
+        """
+        Fetch OSM data as a stream of GeoDataFrame batches. The response is
+        streamed to disk and parsed incrementally, so peak memory is bounded
+        by the batch size and the node coordinate arrays instead of the size
+        of the response. Suited to very large requests (e.g. all buildings of
+        a borough) that do not fit in memory as Python dicts.
+
+        Parameters:
+        -----------
+        area_or_polygon : str or shapely.geometry
+            Either a place name (string) or a polygon geometry
+        feature_type : str
+            The OSM feature type (e.g., 'amenity', 'shop', 'highway')
+        tags : list or bool
+            List of specific tags to fetch, or True for every value
+        batch_size : int, default=10000
+            Maximum number of features per batch
+        centroids_only : bool, default=False
+            If True, request one center point per feature instead of full geometries
+        progress_callback : callable, optional
+            Function to call with progress updates
+
+        Yields:
+        -------
+        gdf : geopandas.GeoDataFrame
+            Up to batch_size features in the same schema as fetch_osm_data
+        """
+        query = self.query_compiler.compile(feature_type, tags)
+        boundary = self._get_boundary(area_or_polygon)
+        if boundary is None:
+            raise ValueError(f"Could not geocode area: {area_or_polygon}")
+
+        area_clauses = None
+        if isinstance(area_or_polygon, str):
+            area_clauses = self._place_area_clauses(area_or_polygon)
+
+        # The server already restricts area-id queries to the place; polygon
+        # queries use a short covering polygon and are clipped locally
+        query_geometry = None
+        if area_clauses is None:
+            query_geometry = self.query_geometry.prepare(boundary)
+            area_clauses = self.overpass_client.polygon_clauses(query_geometry.query_polygon)
+
+        query_text = self.overpass_client.build_query(
+            area_clauses, query.overpass_filters(), out="center" if centroids_only else "geom"
+        )
+
+        total = 0
+        breaker = CircuitBreaker(logger=self.logger)
+        for batch in self._query_batches(query_text, query, batch_size, query_geometry, breaker):
+            total += len(batch)
+            self._log_progress("Streamed {} {} features", total, feature_type, progress_callback)
+            yield batch
+
+    def _query_batches(self, query_text, query, batch_size=10000, query_geometry=None, breaker=None):
+        """
+        Run a query through the streaming parser and yield the requested features.
+        
+        Parameters:
+        -----------
+        query_text : str
+            The Overpass QL query
+        query : CompiledQuery
+            The compiled tag query the text was built from
+        batch_size : int, default=10000
+            Maximum number of features per batch
+        query_geometry : QueryGeometry, optional
+            If given, only features intersecting its exact boundary are kept
+        breaker : CircuitBreaker, optional
+            Circuit breaker of the run the request belongs to
+            
+        Yields:
+        -------
+        gdf : geopandas.GeoDataFrame
+            Non-empty batches of features carrying the requested key
+        """
+        parser = OverpassStreamParser(batch_size=batch_size, logger=self.logger)
+
+        with self.overpass_client.query_stream(query_text, breaker=breaker) as f:
+            for batch in parser.batches(f):
+                # Tagged member nodes and ways come back with the recursion; keep
+                # only features carrying the requested key
+                if query.feature_type not in batch.columns:
+                    continue
+                batch = batch[batch[query.feature_type].notna().to_numpy() & geometry_kernel.is_present(batch)]
+                batch = query.apply_local_filter(batch)
+                if query_geometry is not None:
+                    batch = query_geometry.clip(batch)
+                if len(batch) > 0:
+                    yield batch
+
+        remark = parser.header.get("remark", "")
+        if "error" in remark.lower():
+            raise OverpassError(remark)
+
     def fetch_data_by_tiles(self, area_or_polygon, feature_type, tags, 
                            progress_callback=None, convert_polygons_to_points=False, 
-                           grid_size=3, recursive=True):
+                           grid_size=3, recursive=True, max_workers=None, min_cell_size=None,
+                           centroids_only=False, output_folder=None, columns=None, categorical=False,
+                           bbox_tiles=False):
         """
-        Fetch data by dividing the area into a grid of smaller tiles for large areas.
+        Fetch data by dividing the area into smaller tiles for large areas.
+        Tiles are planned as a quadtree: their initial size comes from densities
+        observed in earlier runs (or a fixed grid when there is no history), and
+        any tile whose request fails is split into quadrants until it succeeds or
+        reaches the minimum size. Tiles are fetched concurrently and combined as
+        they finish.
+        
+        Progress is journaled in the cache folder: if tiles fail (see
+        incomplete_tiles_report) or the run is interrupted, calling again
+        with the same arguments within the service's resume_ttl fetches only
+        the outstanding tiles and reuses the finished ones.
         
         Parameters:
         -----------
@@ -111,161 +516,623 @@ class OSMDataService:
         convert_polygons_to_points : bool, default=False
             If True, converts polygon geometries to their centroids
         grid_size : int, default=3
-            Number of grid cells to use in each dimension
+            Number of grid cells to use in each dimension when no density history exists
         recursive : bool, default=True
             If True, recursively subdivides tiles that are still too large
+        max_workers : int, optional
+            Maximum number of tiles fetched at the same time. Defaults to the
+            service's max_workers setting.
+        min_cell_size : float, optional
+            Tiles smaller than this (in degrees) are not split further.
+            Defaults to the tile planner's setting.
+        centroids_only : bool, default=False
+            If True, fetches one center point per feature instead of full geometries
+        output_folder : str, optional
+            If given, each tile's features are written to a spatially partitioned
+            GeoParquet dataset in this folder as soon as the tile arrives, with
+            duplicates dropped at write time, instead of being combined in memory
+        columns : list, optional
+            Tag columns to keep besides the feature key; each tile is pruned as
+            it arrives. None keeps every column.
+        categorical : bool, default=False
+            If True, stores repeated string tag columns of the combined result
+            as categoricals (not applied to an output_folder dataset)
+        bbox_tiles : bool, default=False
+            If True, each tile is requested as a plain bbox, which Overpass
+            evaluates much faster than a poly: filter, and the features are
+            clipped to the boundary locally with a prepared geometry. Tiles
+            lying inside the boundary skip the test.
             
         Returns:
         --------
-        gdf : geopandas.GeoDataFrame
-            Combined GeoDataFrame from all tiles, or None if no data found
+        gdf : geopandas.GeoDataFrame or TileDataset
+            Combined GeoDataFrame from all tiles, or None if no data found.
+            With output_folder, a lazy TileDataset handle on the written dataset.
         """
-        self._log_progress("Dividing area into {}x{} grid...", 
-                          grid_size, grid_size, progress_callback)
-        
         # Handle both place names and polygons
         boundary = self._get_boundary(area_or_polygon)
         if boundary is None:
             return None
         
-        # Get the bounds
-        minx, miny, maxx, maxy = boundary.bounds
+        planner = self.tile_planner
+        if min_cell_size is not None:
+            planner = QuadtreeTilePlanner(self.density_index, planner.target_features,
+                                          min_cell_size, planner.max_depth, planner.max_tiles, 
+                                          self.logger)
+        
+        query = self.query_compiler.compile(feature_type, tags)
+        # Consecutive failures stop this run only; the remaining tiles are left to resume
+        breaker = CircuitBreaker(logger=self.logger)
+        signature = query_signature(feature_type, query.request_tags)
+        journal = self._tile_journal(boundary, signature, centroids_only, bbox_tiles, columns,
+                                     output_folder, convert_polygons_to_points)
+        resuming = journal.is_resumable
+        if resuming:
+            # An earlier run left failed tiles: fetch only those, keep the rest
+            cells = [(box(*bounds), depth) for bounds, depth in journal.outstanding()]
+            self._log_progress("Resuming an earlier run from {}: {} tiles outstanding", 
+                              _format_age(journal.age), len(cells), progress_callback)
+        else:
+            # Tiles are sized from density history or count queries before any download
+            cells = planner.plan(boundary, signature, self._tile_counter(query, breaker), grid_size)
+            journal.plan(cells)
+            self._log_progress("Planned {} tiles for {} data", 
+                              len(cells), feature_type, progress_callback)
         
-        # Calculate the size of each grid cell
-        cell_width = (maxx - minx) / grid_size
-        cell_height = (maxy - miny) / grid_size
+        query_geometry = self.query_geometry.prepare(boundary) if bbox_tiles else None
         
         # Create a list to store all the GeoDataFrames
         all_gdfs = []
-        
-        # Create a tags dictionary for OSMnx
-        tags_dict = {feature_type: tags}
-        
-        # Total number of cells to process
-        total_cells = grid_size * grid_size
+        writer = None
+        if output_folder:
+            writer = TileDatasetWriter(output_folder, overwrite=not resuming, logger=self.logger)
+        elif resuming:
+            all_gdfs = journal.completed_parts()
+        self.failed_tiles = []
+        self.incomplete_tiles = []
+        
+        total_cells = len(cells)
         cells_processed = 0
         
-        # Loop through the grid
-        for i in range(grid_size):
-            for j in range(grid_size):
-                cells_processed += 1
-                
-                # Calculate the bounds of this cell
-                cell_minx = minx + i * cell_width
-                cell_maxx = minx + (i + 1) * cell_width
-                cell_miny = miny + j * cell_height
-                cell_maxy = miny + (j + 1) * cell_height
-                
-                # Create a polygon for this cell
-                cell = box(cell_minx, cell_miny, cell_maxx, cell_maxy)
-                
-                # Skip if the cell doesn't intersect with the boundary
-                if not cell.intersects(boundary):
-                    continue
-                
-                self._log_progress("Fetching grid cell {}/{} ...", 
-                                  cells_processed, total_cells, progress_callback)
+        executor = self._tile_executor(max_workers)
+        self._log_progress("Fetching tiles with up to {} concurrent requests...", 
+                          executor.concurrency, None, progress_callback)
+        
+        try:
+            with executor:
+                # Work items are (cell, depth) so the planner can bound the recursion
+                for (cell, depth), gdf, error in executor.stream(
+                        lambda item: self._fetch_tile(item[0], query, centroids_only, bbox_tiles, 
+                                                      breaker), cells):
+                    cells_processed += 1
+                    progress = "{}/{}".format(cells_processed, total_cells)
                 
-                try:
-                    # Get the data for this cell using polygon argument
-                    gdf = ox.features_from_polygon(cell, tags=tags_dict)
+                    if error is None:
+                        # Densities describe what the server returned, before local filtering
+                        self.density_index.record(signature, cell.bounds, 
+                                                  len(gdf) if gdf is not None else 0)
+                        gdf = query.apply_local_filter(gdf)
+                        if query_geometry is not None:
+                            gdf = query_geometry.clip_tile(gdf, cell)
+                        if columns is not None:
+                            gdf = prune_columns(gdf, feature_type, columns)
+                        count = len(gdf) if gdf is not None else 0
                     
-                    if gdf is not None and len(gdf) > 0:
-                        all_gdfs.append(gdf)
-                        self._log_progress("  ✓ Found {} features in this cell", 
-                                          len(gdf), None, progress_callback)
+                        if count > 0 and writer is not None:
+                            if convert_polygons_to_points:
+                                gdf = self.convert_polygons_to_points(gdf, feature_type)
+                            written = writer.write(gdf)
+                            self._log_progress("  ✓ Tile {}: found {} features", 
+                                              progress, "{} ({} new)".format(count, written), 
+                                              progress_callback)
+                        elif count > 0:
+                            # Stream the result into the combine step right away
+                            all_gdfs.append(gdf)
+                            self._log_progress("  ✓ Tile {}: found {} features", 
+                                              progress, count, progress_callback)
+                        else:
+                            self._log_progress("  Tile {}: no features", 
+                                              progress, None, progress_callback)
+                        journal.complete(cell, gdf if writer is None else None)
+                        continue
                 
-                except Exception as e:
-                    self._log_progress("  ✗ Error fetching cell: {}", 
-                                      str(e), progress_callback, is_error=True)
-                    
-                    # If we still get an error and recursive is True, try with smaller cells
-                    if recursive and ("too long" in str(e).lower() or "bad request" in str(e).lower()):
-                        self._log_progress("  Trying with smaller subdivisions...", 
+                    self._log_progress("  ✗ Error fetching tile {}: {}", 
+                                      progress, str(error), progress_callback, is_error=True)
+                
+                    # Split failed tiles into quadrants until they succeed or hit the minimum size
+                    if recursive and self._is_size_error(error) and planner.can_split(cell, depth):
+                        self._log_progress("  Splitting tile into quadrants...", 
                                           None, None, progress_callback)
-                        
-                        # Process subcells recursively
-                        subcell_gdf = self._process_subcells(
-                            cell_minx, cell_miny, cell_maxx, cell_maxy, 
-                            feature_type, tags, progress_callback
-                        )
-                        
-                        if subcell_gdf is not None and len(subcell_gdf) > 0:
-                            all_gdfs.append(subcell_gdf)
+                        subcells = [subcell for subcell in planner.split(cell) if subcell.intersects(boundary)]
+                        journal.split(cell, subcells, depth + 1)
+                        for subcell in subcells:
+                            executor.submit((subcell, depth + 1))
+                            total_cells += 1
+                    else:
+                        journal.fail(cell, error)
+                        self._record_incomplete_tile(cell, error)
+        finally:
+            # Interrupted runs keep their finished tiles too
+            complete = journal.finish()
+        
+        self.density_index.save()
+        
+        if not complete:
+            self._log_progress("⚠ {} tiles could not be fetched; their features are missing from the result", 
+                              len(self.failed_tiles), None, progress_callback, is_error=True)
+            self._log_progress("  Run the same request again to fetch only the {} missing tiles", 
+                              len(self.failed_tiles), None, progress_callback, is_error=True)
+        
+        if writer is not None:
+            dataset = writer.close()
+            if writer.row_count == 0:
+                self._log_progress("No features found in any grid cells", 
+                                  None, None, progress_callback)
+                return None
+            self._log_progress("Total features after grid processing: {} ({} partitions)", 
+                              writer.row_count, len(dataset.partitions), progress_callback)
+            return dataset
         
         # Combine all the GeoDataFrames
         if all_gdfs:
-            combined_gdf = pd.concat(all_gdfs, ignore_index=True)
+            # Keep the (element, id) index so duplicates can be matched by identity
+            combined_gdf = pd.concat(all_gdfs)
             
             # Remove duplicate geometries
             combined_gdf = self._remove_duplicates(combined_gdf)
             
             self._log_progress("Total features after grid processing: {}", 
-                              len(combined_gdf), progress_callback)
+                              len(combined_gdf), None, progress_callback)
             
             # Process the results
             return self._process_results(
-                combined_gdf, feature_type, convert_polygons_to_points, progress_callback
+                combined_gdf, feature_type, convert_polygons_to_points, progress_callback,
+                columns, categorical
             )
         else:
             self._log_progress("No features found in any grid cells", 
-                              None, progress_callback)
+                              None, None, progress_callback)
             return None
 
-    def _process_subcells(self, cell_minx, cell_miny, cell_maxx, cell_maxy, 
-                         feature_type, tags, progress_callback=None, subcell_size=2):
+    def fetch_data_by_cached_tiles(self, area_or_polygon, feature_type, tags, 
+                                   progress_callback=None, convert_polygons_to_points=False,
+                                   centroids_only=False, max_workers=None, columns=None,
+                                   categorical=False, bbox_tiles=False):
         """
-        Process subcells when a tile is still too large.
+        Fetch data on the global tile lattice of the tile cache. Tiles already
+        in the cache are loaded from disk, missing tiles are downloaded
+        concurrently and cached, and the combined result is clipped to the area.
+        Overlapping areas (e.g. a borough and a custom polygon inside it) reuse
+        each other's downloads.
         
         Parameters:
         -----------
-        cell_minx, cell_miny, cell_maxx, cell_maxy : float
-            Boundaries of the cell to subdivide
+        area_or_polygon : str or shapely.geometry
+            Either a place name (string) or a polygon geometry
         feature_type : str
-            The OSM feature type
+            The OSM feature type (e.g., 'amenity', 'shop', 'highway')
         tags : list
-            List of specific tags to fetch
+            List of specific tags to fetch for the feature type
         progress_callback : callable, optional
             Function to call with progress updates
-        subcell_size : int, default=2
-            Number of subcells in each dimension
+        convert_polygons_to_points : bool, default=False
+            If True, converts polygon geometries to their centroids
+        centroids_only : bool, default=False
+            If True, fetches one center point per feature instead of full geometries
+        max_workers : int, optional
+            Maximum number of tiles fetched at the same time. Defaults to the
+            service's max_workers setting.
+        columns : list, optional
+            Tag columns to keep besides the feature key. Tiles are cached with
+            every column and pruned when loaded. None keeps every column.
+        categorical : bool, default=False
+            If True, stores repeated string tag columns as categoricals
+        bbox_tiles : bool, default=False
+            If True, missing tiles are requested as plain bboxes instead of
+            poly: filters. Cached tiles hold the same features either way.
+            
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            Features intersecting the area, or None if no data found
+        """
+        boundary = self._get_boundary(area_or_polygon)
+        if boundary is None:
+            return None
+        
+        query = self.query_compiler.compile(feature_type, tags)
+        breaker = CircuitBreaker(logger=self.logger)
+        # Tiles hold the raw server response, so the key is the query actually sent
+        signature = query_signature(feature_type, query.request_tags)
+        if centroids_only:
+            signature += "-center"
+        
+        tiles = self.tile_cache.tiles_for(boundary)
+        tile_gdfs = []
+        missing = []
+        for tile in tiles:
+            cached = self.tile_cache.get(tile, signature)
+            if cached is None:
+                missing.append(tile)
+            elif len(cached) > 0:
+                tile_gdfs.append((tile, cached))
+        
+        self._log_progress("{} of {} cache tiles already downloaded", 
+                          len(tiles) - len(missing), len(tiles), progress_callback)
+        
+        self.failed_tiles = []
+        self.incomplete_tiles = []
+        if missing:
+            # Each lattice tile may be split if it is too large; parts are
+            # collected per tile and the tile is cached once all parts succeed
+            parts = {tile: [] for tile in missing}
+            remaining = {tile: 1 for tile in missing}
+            failed = {}
+            tiles_done = 0
+            
+            executor = self._tile_executor(max_workers)
+            with executor:
+                work = [(tile, self.tile_cache.tile_polygon(tile), 0) for tile in missing]
+                for (tile, cell, depth), gdf, error in executor.stream(
+                        lambda item: self._fetch_tile(item[1], query, centroids_only, bbox_tiles, 
+                                                      breaker), work):
+                    remaining[tile] -= 1
+                    
+                    if error is None:
+                        if gdf is not None and len(gdf) > 0:
+                            parts[tile].append(gdf)
+                    elif self._is_size_error(error) and self.tile_planner.can_split(cell, depth):
+                        for subcell in self.tile_planner.split(cell):
+                            executor.submit((tile, subcell, depth + 1))
+                            remaining[tile] += 1
+                    else:
+                        self._log_progress("  ✗ Error fetching cache tile {}: {}", 
+                                          tile, str(error), progress_callback, is_error=True)
+                        failed[tile] = error
+                    
+                    if remaining[tile] > 0:
+                        continue
+                    
+                    tiles_done += 1
+                    if tile in failed:
+                        # Successful tiles are cached, so the next run fetches only these
+                        self._record_incomplete_tile(self.tile_cache.tile_polygon(tile), failed[tile])
+                        continue
+                    
+                    tile_gdf = self._combine_tile_parts(parts.pop(tile))
+                    self.tile_cache.put(tile, signature, tile_gdf)
+                    if len(tile_gdf) > 0:
+                        tile_gdfs.append((tile, tile_gdf))
+                    self._log_progress("  ✓ Downloaded tile {}/{}", 
+                                      tiles_done, len(missing), progress_callback)
+        
+        if self.failed_tiles:
+            self._log_progress("⚠ {} tiles could not be fetched; their features are missing from the result", 
+                              len(self.failed_tiles), None, progress_callback, is_error=True)
+        
+        if not tile_gdfs:
+            self._log_progress("No {} features found.", feature_type, None, progress_callback)
+            return None
+        
+        # Clip each tile to the requested area with the prepared boundary;
+        # tiles inside the area skip the test
+        query_geometry = self.query_geometry.prepare(boundary)
+        clipped = []
+        for tile, tile_gdf in tile_gdfs:
+            tile_gdf = query_geometry.clip_tile(tile_gdf, self.tile_cache.tile_polygon(tile))
+            if columns is not None:
+                tile_gdf = prune_columns(tile_gdf, feature_type, columns)
+            if len(tile_gdf) > 0:
+                clipped.append(tile_gdf)
+        
+        if not clipped:
+            self._log_progress("No {} features found.", feature_type, None, progress_callback)
+            return None
+        
+        # Features crossing tile edges are returned by every tile they touch
+        combined_gdf = self._combine_tile_parts(clipped)
+        combined_gdf = query.apply_local_filter(combined_gdf)
+        
+        return self._process_results(
+            combined_gdf, feature_type, convert_polygons_to_points, progress_callback,
+            columns, categorical
+        )
+
+    def incomplete_tiles_report(self):
+        """
+        Report the tiles of the last tiled fetch that could not be fetched.
+        
+        Returns:
+        --------
+        report : geopandas.GeoDataFrame
+            One row per incomplete tile with its geometry, the error and
+            whether the error was transient (rate limiting, server overload,
+            network). Empty if every tile was fetched.
+        """
+        return gpd.GeoDataFrame(
+            {'error': [entry['error'] for entry in self.incomplete_tiles],
+             'transient': [entry['transient'] for entry in self.incomplete_tiles]},
+            geometry=[entry['tile'] for entry in self.incomplete_tiles], crs=ox.settings.default_crs
+        )
+
+    def _record_incomplete_tile(self, tile, error):
+        """Add a tile that could not be fetched to failed_tiles and the incomplete-tiles report."""
+        self.failed_tiles.append(tile)
+        self.incomplete_tiles.append({'tile': tile, 'error': str(error), 
+                                      'transient': is_transient(error)})
+
+    def _tile_journal(self, boundary, signature, centroids_only, bbox_tiles, columns, 
+                      output_folder, convert_polygons_to_points):
+        """
+        Open the journal of a tiled fetch; identical requests share it.
+        
+        Parameters:
+        -----------
+        boundary : shapely.geometry
+            The requested area
+        signature : str
+            Query signature of the request
+        centroids_only, bbox_tiles, columns, output_folder, convert_polygons_to_points :
+            The fetch_data_by_tiles options that change the stored tile results
             
         Returns:
         --------
-        gdf : geopandas.GeoDataFrame or None
-            Combined GeoDataFrame from all subcells, or None if no data found
+        journal : TileRunJournal
+            The request's journal (empty if no earlier run left tiles outstanding)
+        """
+        digest = hashlib.sha1(shapely.to_wkb(boundary))
+        digest.update(repr((signature, centroids_only, bbox_tiles, 
+                            sorted(columns) if columns is not None else None,
+                            os.path.abspath(output_folder) if output_folder else None,
+                            convert_polygons_to_points)).encode("utf-8"))
+        return TileRunJournal(os.path.join(self.cache_folder, "runs", digest.hexdigest()), 
+                              ttl=self.resume_ttl, logger=self.logger)
+
+    def _combine_tile_parts(self, gdfs):
         """
-        subcell_gdfs = []
-        subcell_width = (cell_maxx - cell_minx) / subcell_size
-        subcell_height = (cell_maxy - cell_miny) / subcell_size
+        Concatenate tile results and drop features returned by several tiles.
         
-        tags_dict = {feature_type: tags}
+        Parameters:
+        -----------
+        gdfs : list of geopandas.GeoDataFrame
+            Results indexed by (element, id)
+            
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The combined features, each OSM element once
+        """
+        if not gdfs:
+            return gpd.GeoDataFrame(geometry=[], crs=ox.settings.default_crs)
+        combined = pd.concat(gdfs) if len(gdfs) > 1 else gdfs[0]
+        return self.deduplicator.deduplicate(combined, label="tiles")
+
+    def _tile_executor(self, max_workers=None):
+        """
+        Create the executor for concurrent tile requests. Reads from a local
+        extract are neither rate limited nor bound to Overpass slots.
         
-        for si in range(subcell_size):
-            for sj in range(subcell_size):
-                subcell_minx = cell_minx + si * subcell_width
-                subcell_maxx = cell_minx + (si + 1) * subcell_width
-                subcell_miny = cell_miny + sj * subcell_height
-                subcell_maxy = cell_miny + (sj + 1) * subcell_height
-                
-                subcell = box(subcell_minx, subcell_miny, subcell_maxx, subcell_maxy)
-                
-                try:
-                    sub_gdf = ox.features_from_polygon(subcell, tags=tags_dict)
-                    if sub_gdf is not None and len(sub_gdf) > 0:
-                        subcell_gdfs.append(sub_gdf)
-                        self._log_progress("    ✓ Subdivision {}/{}: Found {} features", 
-                                          si*subcell_size+sj+1, subcell_size*subcell_size, 
-                                          len(sub_gdf), progress_callback)
-                except Exception as sub_e:
-                    self._log_progress("    ✗ Error in subdivision: {}", 
-                                      str(sub_e), progress_callback, is_error=True)
-        
-        # Combine all subcell GeoDataFrames
-        if subcell_gdfs:
-            return pd.concat(subcell_gdfs, ignore_index=True)
-        else:
+        Parameters:
+        -----------
+        max_workers : int, optional
+            Maximum number of concurrent requests. Defaults to self.max_workers.
+            
+        Returns:
+        --------
+        executor : TileExecutor
+            The executor, not yet entered
+        """
+        if self.pbf_backend is not None:
+            return TileExecutor(max_workers=max_workers or self.max_workers, 
+                                endpoint="file://" + os.path.abspath(self.pbf_backend.path),
+                                requests_per_second=None, logger=self.logger)
+        return TileExecutor(max_workers=max_workers or self.max_workers, logger=self.logger)
+
+    def _fetch_area(self, polygon, query, centroids_only=False, area_clauses=None, breaker=None):
+        """
+        Run a single request for a compiled query over one polygon.
+        
+        Parameters:
+        -----------
+        polygon : shapely.geometry
+            The area to query
+        query : CompiledQuery
+            The compiled tag query
+        centroids_only : bool, default=False
+            If True, requests "out center" points through the Overpass client
+            instead of full geometries through osmnx
+        area_clauses : list of str, optional
+            Overpass area or bbox clauses used instead of the polygon's coordinates
+            (see _place_area_clauses and _fetch_tile). Full geometries are then parsed by the
+            service's streaming parser, since osmnx only queries by polygon.
+        breaker : CircuitBreaker, optional
+            Circuit breaker of the run the request belongs to
+            
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The features returned by the server, before local value filtering
+        """
+        if self.pbf_backend is not None:
+            return self.pbf_backend.features(query.feature_type, query.values, polygon, 
+                                             centroids_only=centroids_only)
+        
+        if centroids_only:
+            overpass_query = self.overpass_client.build_query(
+                area_clauses or self.overpass_client.polygon_clauses(polygon), 
+                query.overpass_filters(), out="center"
+            )
+            response = self.overpass_client.query(overpass_query, breaker=breaker)
+            return build_point_frame(response.get("elements", []), crs=ox.settings.default_crs)
+        
+        if area_clauses is not None:
+            overpass_query = self.overpass_client.build_query(area_clauses, query.overpass_filters(), 
+                                                              out="geom")
+            batches = list(self._query_batches(overpass_query, query, breaker=breaker))
+            if not batches:
+                return gpd.GeoDataFrame(geometry=[], crs=ox.settings.default_crs)
+            return pd.concat(batches) if len(batches) > 1 else batches[0]
+        
+        return self._osmnx_features(ox.features_from_polygon, polygon, tags=query.osmnx_tags(),
+                                    description="osmnx polygon request", breaker=breaker)
+
+    def _osmnx_features(self, fn, *args, description="osmnx request", breaker=None, **kwargs):
+        """
+        Run an osmnx features request with retries. osmnx raises when an area
+        has no matching features; that case is returned as an empty result.
+        
+        Parameters:
+        -----------
+        fn : callable
+            The osmnx function, e.g. ox.features_from_polygon
+        *args, **kwargs :
+            Arguments passed to fn
+        description : str, default="osmnx request"
+            Name of the request used in log messages
+        breaker : CircuitBreaker, optional
+            Circuit breaker of the run the request belongs to
+            
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The features, possibly empty
+        """
+        try:
+            return self.retry_policy.call(fn, *args, description=description, breaker=breaker, 
+                                          **kwargs)
+        except Exception as e:
+            if not _is_empty_response(e):
+                raise
+            return gpd.GeoDataFrame(geometry=[], crs=ox.settings.default_crs)
+
+    def estimate_size(self, area_or_polygon, feature_type, tags):
+        """
+        Estimate how many features a request would return, before fetching it.
+        
+        Parameters:
+        -----------
+        area_or_polygon : str or shapely.geometry
+            Either a place name (string) or a polygon geometry
+        feature_type : str
+            The OSM feature type (e.g., 'amenity', 'shop', 'highway')
+        tags : list
+            List of specific tags to fetch for the feature type
+            
+        Returns:
+        --------
+        estimate : float or None
+            Estimated number of features in the area's bounding box, or None
+            if there is no density history and no count could be made
+        """
+        return self._estimate_request_size(self._get_boundary(area_or_polygon), 
+                                           self.query_compiler.compile(feature_type, tags))
+
+    def _estimate_request_size(self, boundary, query, breaker=None):
+        """
+        Estimate the size of a request from the density history, or from a
+        count query for its bounding box (which is then recorded).
+        
+        Parameters:
+        -----------
+        boundary : shapely.geometry or None
+            The request's boundary (see _get_boundary)
+        query : CompiledQuery
+            The compiled tag query
+        breaker : CircuitBreaker, optional
+            Circuit breaker of the run the request belongs to
+            
+        Returns:
+        --------
+        estimate : float or None
+            Estimated feature count, or None if unknown
+        """
+        counter = self._tile_counter(query, breaker)
+        if counter is None or boundary is None:
+            return None
+        
+        signature = query_signature(query.feature_type, query.request_tags)
+        bounds = boundary.bounds
+        estimate = self.density_index.estimate_count(signature, bounds)
+        if estimate is None:
+            estimate = counter(box(*bounds))
+            if estimate is not None:
+                self.density_index.record(signature, bounds, estimate)
+                self.density_index.save()
+        return estimate
+
+    def _tile_counter(self, query, breaker=None):
+        """
+        Get the function measuring tile sizes with count queries.
+        
+        Parameters:
+        -----------
+        query : CompiledQuery
+            The compiled tag query
+        breaker : CircuitBreaker, optional
+            Circuit breaker of the run the request belongs to
+            
+        Returns:
+        --------
+        counter : callable or None
+            Function taking a rectangular tile and returning its feature
+            count (None if the count fails), or None when count queries are
+            off or features come from a local extract
+        """
+        if not self.count_queries or self.pbf_backend is not None:
             return None
+        
+        def count(tile):
+            try:
+                return self.overpass_client.count(self.overpass_client.bbox_clauses(tile), 
+                                                  query.overpass_filters(), breaker=breaker)
+            except Exception as e:
+                self.logger.warning(f"Count query failed: {str(e)}")
+                return None
+        return count
+
+    def _fetch_tile(self, tile, query, centroids_only=False, bbox=False, breaker=None):
+        """
+        Run the request for one rectangular tile.
+        
+        Parameters:
+        -----------
+        tile : shapely.geometry.Polygon
+            The tile
+        query : CompiledQuery
+            The compiled tag query
+        centroids_only : bool, default=False
+            If True, requests one center point per feature
+        bbox : bool, default=False
+            If True, requests the tile as a plain bbox instead of a poly: filter
+        breaker : CircuitBreaker, optional
+            Circuit breaker of the run the request belongs to
+            
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            The features returned by the server, before local value filtering
+        """
+        area_clauses = self.overpass_client.bbox_clauses(tile) if bbox else None
+        return self._fetch_area(tile, query, centroids_only=centroids_only, area_clauses=area_clauses,
+                                breaker=breaker)
+
+    def _is_size_error(self, error):
+        """
+        Check whether an error means the request was too large for the server.
+        
+        Parameters:
+        -----------
+        error : Exception
+            The error raised by the request
+            
+        Returns:
+        --------
+        is_size_error : bool
+            True if splitting the request area may make it succeed
+        """
+        message = str(error).lower()
+        return any(marker in message for marker in 
+                   ("too long", "bad request", "timed out", "timeout", "out of memory"))
 
     def clean_data(self, gdf, feature_type=None, filter_types=None):
         """
@@ -288,42 +1155,26 @@ class OSMDataService:
         if gdf is None or len(gdf) == 0:
             return gdf
         
-        # Make a copy to avoid modifying the original
-        cleaned_gdf = gdf.copy()
+        pipeline = CleaningPipeline(self.deduplicator, self.logger)
         
-        # Define unwanted feature types if not provided
+        # Unwanted types only apply to amenities and shops unless given explicitly
         if filter_types is None and feature_type in ['amenity', 'shop']:
-            filter_types = [
-                'bench', 'atm', 'drinking_water', 'toilets', 'waste_basket', 
-                'vending_machine', 'fountain', 'training', 'waste_disposal', 
-                'recycling', 'payment_terminal', 'yes', 'driving_school', 
-                'public_bookcase'
-            ]
-        
-        # Apply the filter if we have unwanted types
+            filter_types = DEFAULT_UNWANTED_FACILITIES
         if filter_types is not None and feature_type is not None:
-            type_column = feature_type  # The column name is usually the feature type
-            if type_column in cleaned_gdf.columns:
-                before_len = len(cleaned_gdf)
-                cleaned_gdf = cleaned_gdf[~cleaned_gdf[type_column].isin(filter_types)]
-                self.logger.info(f"Removed {before_len - len(cleaned_gdf)} unwanted {feature_type} types")
+            pipeline.filter_types(filter_types)
         
         # Remove entries containing 'was:' (historical features)
         if feature_type is not None:
-            type_column = feature_type
-            if type_column in cleaned_gdf.columns:
-                before_len = len(cleaned_gdf)
-                cleaned_gdf = cleaned_gdf[~cleaned_gdf[type_column].astype(str).str.contains('was:')]
-                self.logger.info(f"Removed {before_len - len(cleaned_gdf)} historical entries")
+            pipeline.drop_historical()
         
-        # Remove duplicate geometries
-        cleaned_gdf = self._remove_duplicates(cleaned_gdf)
+        # Remove duplicate features in the same pass
+        pipeline.deduplicate()
         
-        return cleaned_gdf
+        return pipeline.run({feature_type or 'feature': gdf})
 
     def _remove_duplicates(self, gdf):
         """
-        Remove duplicate geometries from a GeoDataFrame.
+        Remove duplicate features from a GeoDataFrame.
         
         Parameters:
         -----------
@@ -335,21 +1186,8 @@ class OSMDataService:
         gdf : geopandas.GeoDataFrame
             The de-duplicated data
         """
-        if gdf is None or len(gdf) == 0:
-            return gdf
-            
-        # Make a copy to avoid modifying the original
-        unique_gdf = gdf.copy()
-        
-        # Create a string representation of geometries for comparison
-        before_len = len(unique_gdf)
-        unique_gdf['geom_str'] = unique_gdf.geometry.apply(lambda x: str(x))
-        unique_gdf = unique_gdf.drop_duplicates(subset=['geom_str'])
-        unique_gdf = unique_gdf.drop(columns=['geom_str'])
-        
-        self.logger.info(f"Removed {before_len - len(unique_gdf)} duplicate geometries")
-        
-        return unique_gdf
+        # Features are matched by OSM identity when available, by geometry otherwise
+        return self.deduplicator.deduplicate(gdf, label="fetch")
 
     def convert_polygons_to_points(self, gdf, feature_type=None):
         """
@@ -370,20 +1208,12 @@ class OSMDataService:
         if gdf is None or len(gdf) == 0:
             return gdf
             
-        # Make a copy to avoid modifying the original
-        converted_gdf = gdf.copy()
-        
-        # Identify polygons and multipolygons
-        polygon_mask = converted_gdf.geometry.apply(
-            lambda geom: geom is not None and 
-            (geom.geom_type == 'Polygon' or geom.geom_type == 'MultiPolygon')
-        )
+        # Only the geometry column is replaced; the other columns are shared, not copied
+        pipeline = CleaningPipeline(self.deduplicator, self.logger).polygons_to_points()
+        converted_gdf = pipeline.run({feature_type or 'feature': gdf})
         
-        # Convert polygons to centroid points
-        if polygon_mask.any():
-            num_polygons = polygon_mask.sum()
-            converted_gdf.loc[polygon_mask, 'geometry'] = converted_gdf.loc[polygon_mask, 'geometry'].centroid
-            
+        num_polygons = int(geometry_kernel.is_polygonal(gdf).sum())
+        if num_polygons:
             type_info = f" for {feature_type} features" if feature_type else ""
             self.logger.info(f"Converted {num_polygons} polygons to points{type_info}")
         
@@ -408,28 +1238,12 @@ class OSMDataService:
         if gdf is None or len(gdf) == 0:
             return gdf
             
-        # Make a copy to avoid modifying the original
-        std_gdf = gdf.copy()
-        
-        # Ensure 'name' column exists
-        if 'name' not in std_gdf.columns:
-            if 'name:en' in std_gdf.columns:
-                std_gdf['name'] = std_gdf['name:en']
-            else:
-                std_gdf['name'] = None
-        
-        # Fill missing names with generic names if needed
-        if 'name' in std_gdf.columns:
-            nan_mask = std_gdf['name'].isna()
-            if nan_mask.any():
-                # Create list of unnamed identifiers
-                unnamed_items = [f"unnamed_{feature_type}_{i}" for i in range(sum(nan_mask))]
-                # Assign to NaN locations
-                std_gdf.loc[nan_mask, 'name'] = unnamed_items
-        
-        return std_gdf
+        # Missing names come from 'name:en' or become unnamed_<feature_type>_<n>
+        pipeline = CleaningPipeline(self.deduplicator, self.logger).fill_names()
+        return pipeline.run({feature_type: gdf})
 
-    def _process_results(self, gdf, feature_type, convert_polygons_to_points, progress_callback):
+    def _process_results(self, gdf, feature_type, convert_polygons_to_points, progress_callback,
+                         columns=None, categorical=False):
         """
         Process the results of a data fetch operation.
         
@@ -443,6 +1257,10 @@ class OSMDataService:
             Whether to convert polygons to points
         progress_callback : callable, optional
             Function to call with progress updates
+        columns : list, optional
+            Tag columns to keep besides the feature key. None keeps every column.
+        categorical : bool, default=False
+            Whether to store repeated string tag columns as categoricals
             
         Returns:
         --------
@@ -461,7 +1279,7 @@ class OSMDataService:
         if convert_polygons_to_points:
             gdf = self.convert_polygons_to_points(gdf, feature_type)
         
-        return gdf
+        return compact_features(gdf, feature_type, columns, categorical)
 
     def _get_boundary(self, area_or_polygon):
         """
@@ -480,8 +1298,7 @@ class OSMDataService:
         if isinstance(area_or_polygon, str):
             # It's a place name - get boundary from geocoding
             try:
-                self.logger.info(f"Geocoding area: {area_or_polygon}")
-                boundary = ox.geocode_to_gdf(area_or_polygon).unary_union
+                boundary = self._geocode(area_or_polygon).unary_union
                 return boundary
             except Exception as e:
                 self.logger.error(f"Error geocoding area: {str(e)}")
@@ -490,6 +1307,55 @@ class OSMDataService:
             # It's already a polygon
             return area_or_polygon
 
+    def _geocode(self, place):
+        """
+        Geocode a place name once per service; the boundary and the OSM
+        identity of the place are both needed for a single request.
+        
+        Parameters:
+        -----------
+        place : str
+            The place name
+            
+        Returns:
+        --------
+        gdf : geopandas.GeoDataFrame
+            osmnx's geocoder result (boundary geometry, osm_type, osm_id, ...)
+        """
+        if place not in self._geocoded:
+            self.logger.info(f"Geocoding area: {place}")
+            self._geocoded[place] = self.geocode_retry_policy.call(ox.geocode_to_gdf, place,
+                                                                   description="Nominatim geocoding")
+        return self._geocoded[place]
+
+    def _place_area_clauses(self, place):
+        """
+        Get the Overpass area clauses for a place name, if it geocodes to an
+        OSM relation (administrative boundaries, parks, ...). Overpass
+        resolves the area itself, so the query stays short however detailed
+        the boundary is.
+        
+        Parameters:
+        -----------
+        place : str
+            The place name
+            
+        Returns:
+        --------
+        clauses : list of str or None
+            An area: clause, or None if the place is not a relation (or
+            could not be geocoded) and must be queried by polygon
+        """
+        try:
+            result = self._geocode(place).iloc[0]
+        except Exception as e:
+            self.logger.error(f"Error geocoding area: {str(e)}")
+            return None
+        
+        if result.get("osm_type") != "relation" or pd.isna(result.get("osm_id")):
+            return None
+        return self.overpass_client.area_clauses(int(result["osm_id"]))
+
     def _log_progress(self, message, arg1, arg2, progress_callback=None, is_error=False):
 
         """
@@ -536,7 +1402,7 @@ class HeatmapService:
     Centralizes heatmap data preparation, categorization, and raster generation.
     """
     
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, max_workers=1, parallel_min_cells=5_000_000):
         """
         Initialize the heatmap service.
         
@@ -544,18 +1410,24 @@ class HeatmapService:
         -----------
         logger : logging.Logger, optional
             Logger for outputting status messages. If None, a new logger will be created.
+        max_workers : int, default=1
+            Number of worker processes rendering heatmap rasters. 1 renders
+            them one after another in this process.
+        parallel_min_cells : int, default=5000000
+            Smallest total number of raster cells (cells per raster times
+            category rasters) worth starting worker processes for; smaller
+            jobs are rendered in this process, where they finish sooner.
         """
         self.logger = logger or logging.getLogger("HeatmapService")
+        self.max_workers = max_workers
+        self.parallel_min_cells = parallel_min_cells
+        self.deduplicator = FeatureDeduplicator(self.logger)
         
         # Default list of unwanted facility types
-        self.unwanted_facilities = [
-            'bench', 'atm', 'drinking_water', 'toilets', 'waste_basket', 
-            'vending_machine', 'fountain', 'training', 'waste_disposal', 
-            'recycling', 'payment_terminal', 'yes', 'driving_school', 
-            'public_bookcase'
-        ]
+        self.unwanted_facilities = list(DEFAULT_UNWANTED_FACILITIES)
     
-    def prepare_heatmap_data(self, amenity_gdf=None, shop_gdf=None, progress_callback=None):
+    def prepare_heatmap_data(self, amenity_gdf=None, shop_gdf=None, progress_callback=None, 
+                             categories=None):
         """
         Combine and prepare amenity and shop data for heatmap generation.
         
@@ -567,73 +1439,51 @@ class HeatmapService:
             GeoDataFrame containing shop data
         progress_callback : callable, optional
             Function to call with progress updates
+        categories : dict, optional
+            If given, the 'category' column is added in the same pass
+            (see categorize_facilities)
             
         Returns:
         --------
         combined_gdf : geopandas.GeoDataFrame
             Combined and processed GeoDataFrame ready for heatmap generation
         """
-        # List for storing combined data
-        combined_data = []
-        
-        # Process amenity data if available
-        if amenity_gdf is not None and len(amenity_gdf) > 0:
-            # Make a copy to avoid modifying the original
-            amenity_data = amenity_gdf.copy()
-            
-            # Keep only points
-            points_mask = amenity_data.geometry.apply(lambda x: x.geom_type == 'Point')
-            amenity_data = amenity_data[points_mask].copy()
-            
-            # Standardize columns
-            if 'name' in amenity_data.columns:
-                amenity_data = amenity_data[['geometry', 'name', 'amenity']].copy()
-            else:
-                amenity_data['name'] = None
-                amenity_data = amenity_data[['geometry', 'name', 'amenity']].copy()
-            
-            # Rename columns for consistency
-            amenity_data = amenity_data.rename(columns={'amenity': 'facility_type'})
-            amenity_data['source'] = 'amenity'
-            
-            combined_data.append(amenity_data)
-            self._log_progress(f"Added {len(amenity_data)} amenity points to heatmap dataset", progress_callback)
-        
-        # Process shop data if available
-        if shop_gdf is not None and len(shop_gdf) > 0:
-            # Make a copy to avoid modifying the original
-            shop_data = shop_gdf.copy()
-            
-            # Keep only points
-            points_mask = shop_data.geometry.apply(lambda x: x.geom_type == 'Point')
-            shop_data = shop_data[points_mask].copy()
-            
-            # Standardize columns
-            if 'name' in shop_data.columns:
-                shop_data = shop_data[['geometry', 'name', 'shop']].copy()
-            else:
-                shop_data['name'] = None
-                shop_data = shop_data[['geometry', 'name', 'shop']].copy()
-            
-            # Rename columns for consistency
-            shop_data = shop_data.rename(columns={'shop': 'facility_type'})
-            shop_data['source'] = 'shop'
-            
-            combined_data.append(shop_data)
-            self._log_progress(f"Added {len(shop_data)} shop points to heatmap dataset", progress_callback)
-        
-        # Combine the datasets
-        if combined_data:
-            combined_gdf = pd.concat(combined_data, ignore_index=True)
-            self._log_progress(f"Combined dataset has {len(combined_gdf)} points", progress_callback)
-            
-            # Clean the data
-            combined_gdf = self.clean_heatmap_data(combined_gdf, progress_callback)
-            
-            return combined_gdf
-        else:
+        # All steps run as one pass over the inputs; rows and columns are gathered once at the end
+        pipeline = (CleaningPipeline(self.deduplicator, self.logger)
+                    .points_only()
+                    .filter_types(self.unwanted_facilities)
+                    .drop_historical()
+                    .deduplicate())
+        if categories is not None:
+            pipeline.categorize(categories)
+        
+        combined_gdf = pipeline.run({'amenity': amenity_gdf, 'shop': shop_gdf}, 
+                                    type_column='facility_type', columns=['name'])
+        
+        if combined_gdf is None:
             self._log_progress("No amenity or shop data available for heatmap", progress_callback)
             return None
+        
+        self._log_stage_counts(pipeline, progress_callback)
+        self._log_progress(f"Combined dataset has {len(combined_gdf)} points", progress_callback)
+        return combined_gdf
+    
+    def _log_stage_counts(self, pipeline, progress_callback=None):
+        """
+        Report how many rows each pipeline stage removed.
+        
+        Parameters:
+        -----------
+        pipeline : CleaningPipeline
+            A pipeline that has been run
+        progress_callback : callable, optional
+            Function to call with progress updates
+        """
+        counts = pipeline.stage_counts
+        for previous, current in zip(counts, counts[1:]):
+            removed = previous['rows'] - current['rows']
+            self._log_progress(f"  {current['stage']}: removed {removed}, {current['rows']} left "
+                               f"({current['seconds']:.2f}s)", progress_callback)
     
     def clean_heatmap_data(self, gdf, progress_callback=None):
         """
@@ -655,25 +1505,12 @@ class HeatmapService:
         if gdf is None or len(gdf) == 0:
             return gdf
         
-        # Make a copy to avoid modifying the original
-        cleaned_gdf = gdf.copy()
-        
-        # Remove unwanted facility types
-        before_len = len(cleaned_gdf)
-        cleaned_gdf = cleaned_gdf[~cleaned_gdf['facility_type'].isin(self.unwanted_facilities)]
-        self._log_progress(f"Removed {before_len - len(cleaned_gdf)} unwanted facility types", progress_callback)
-        
-        # Remove entries containing 'was:' in facility_type (historical features)
-        before_len = len(cleaned_gdf)
-        cleaned_gdf = cleaned_gdf[~cleaned_gdf['facility_type'].astype(str).str.contains('was:')]
-        self._log_progress(f"Removed {before_len - len(cleaned_gdf)} historical entries", progress_callback)
-        
-        # Remove duplicate geometries
-        before_len = len(cleaned_gdf)
-        cleaned_gdf['geom_str'] = cleaned_gdf.geometry.apply(lambda x: str(x))
-        cleaned_gdf = cleaned_gdf.drop_duplicates(subset=['geom_str'])
-        cleaned_gdf = cleaned_gdf.drop(columns=['geom_str'])
-        self._log_progress(f"Removed {before_len - len(cleaned_gdf)} duplicate geometries", progress_callback)
+        pipeline = (CleaningPipeline(self.deduplicator, self.logger)
+                    .filter_types(self.unwanted_facilities)
+                    .drop_historical()
+                    .deduplicate())
+        cleaned_gdf = pipeline.run({'facility_type': gdf})
+        self._log_stage_counts(pipeline, progress_callback)
         
         return cleaned_gdf
     
@@ -698,21 +1535,9 @@ class HeatmapService:
         if gdf is None or len(gdf) == 0:
             return gdf
         
-        # Make a copy to avoid modifying the original
-        categorized_gdf = gdf.copy()
-        
-        # Flatten the nested dictionary structure to get {amenity_type: category}
-        amenity_to_category = {}
-        for category, facility_types in categories.items():
-            for facility_type in facility_types:
-                amenity_to_category[facility_type] = category
-        
-        # Create a function to categorize each amenity
-        def categorize_amenity(amenity):
-            return amenity_to_category.get(amenity, 'uncategorized')
-        
-        # Apply categorization
-        categorized_gdf['category'] = categorized_gdf['facility_type'].apply(categorize_amenity)
+        # Only the new column is added; the input's data is shared, not copied
+        pipeline = CleaningPipeline(self.deduplicator, self.logger).categorize(categories)
+        categorized_gdf = pipeline.run({'facility_type': gdf})
         
         self._log_progress(f"Data categorized with {categorized_gdf['category'].nunique()} unique categories", 
                          progress_callback)
@@ -720,7 +1545,9 @@ class HeatmapService:
         return categorized_gdf
     
     def generate_heatmaps(self, gdf, output_folder, cell_size=0.001, bandwidth=0.1, 
-                         selected_categories=None, progress_callback=None):
+                         selected_categories=None, progress_callback=None, engine="exact",
+                         kernel_cutoff=density_kernel.DEFAULT_CUTOFF, memory_limit_mb=512,
+                         max_workers=None):
         """
         Generate heatmap rasters for the given categories.
         
@@ -738,6 +1565,25 @@ class HeatmapService:
             List of specific categories to process. If None, all categories will be processed.
         progress_callback : callable, optional
             Function to call with progress updates
+        engine : str, default="exact"
+            Density engine: "exact" evaluates scipy's gaussian_kde at every
+            cell (runtime grows with points times cells), "fft" bins the
+            points onto the grid and convolves with the kernel (runtime
+            independent of the point count; within ~2e-3 of "exact" after
+            normalization), "truncated" adds each point's kernel only within
+            kernel_cutoff standard deviations (runtime linear in the point
+            count, suited to small bandwidths; bit-for-bit reproducible)
+        kernel_cutoff : float, default=4.0
+            Truncation radius of the "truncated" engine in kernel standard deviations
+        memory_limit_mb : float, default=512
+            Memory ceiling for evaluating a raster, in megabytes. Rasters are
+            evaluated and written in blocks of rows (float32) that fit it.
+            The binned point counts of the grid are held in full regardless.
+            With several workers the ceiling applies to each of them.
+        max_workers : int, optional
+            Number of worker processes; above 1, the category rasters are
+            rendered in parallel, one per process, if the job has at least the
+            service's parallel_min_cells. Defaults to the service's max_workers setting.
             
         Returns:
         --------
@@ -765,16 +1611,20 @@ class HeatmapService:
             self._log_progress(f"Processing {len(selected_categories)} selected categories", progress_callback)
         
         # Filter data to selected categories
-        filtered_data = gdf[gdf['category'].isin(selected_categories)].copy()
+        filtered_data = gdf[gdf['category'].isin(selected_categories)]
         self._log_progress(f"Filtered data to {len(filtered_data)} points in selected categories", progress_callback)
         
+        # Point coordinates and the rows of each category, extracted once for all categories
+        x = filtered_data.geometry.x.to_numpy()
+        y = filtered_data.geometry.y.to_numpy()
+        category_rows = filtered_data.groupby('category', sort=False).indices
+        
         # Get the total bounds for creating the grid
         x_min, y_min, x_max, y_max = filtered_data.total_bounds
         
         # Create the base grid that will be used for all categories
         x_grid = np.arange(x_min, x_max + cell_size, cell_size)
         y_grid = np.arange(y_max, y_min - cell_size, -cell_size)
-        xx, yy = np.meshgrid(x_grid, y_grid)
         
         # Calculate grid dimensions
         height = len(y_grid)
@@ -782,8 +1632,24 @@ class HeatmapService:
         
         self._log_progress(f"Raster dimensions: {width}x{height} pixels", progress_callback)
         
-        # Create the transform for the raster
-        transform = from_origin(x_min, y_max, cell_size, cell_size)
+        # Raster and density settings shared by every output
+        settings = {
+            'profile': {
+                'driver': 'GTiff',
+                'height': height,
+                'width': width,
+                'count': 1,
+                'dtype': 'float32',
+                'crs': filtered_data.crs,
+                'transform': from_origin(x_min, y_max, cell_size, cell_size),
+                'nodata': None
+            },
+            'bandwidth': bandwidth,
+            'engine': engine,
+            'kernel_cutoff': kernel_cutoff,
+            'memory_limit': int(memory_limit_mb * 1024 ** 2)
+        }
+        max_workers = self.max_workers if max_workers is None else max_workers
         
         # Dictionary to store results
         results = {
@@ -792,109 +1658,174 @@ class HeatmapService:
                 'cell_size': cell_size,
                 'bandwidth': bandwidth,
                 'dimensions': (width, height),
-                'bounds': (x_min, y_min, x_max, y_max)
+                'bounds': (x_min, y_min, x_max, y_max),
+                'engine': engine,
+                'kernel_cutoff': kernel_cutoff if engine == "truncated" else None,
+                'memory_limit_mb': memory_limit_mb
             }
         }
         
+        raster_count = sum(len(category_rows.get(category, ())) >= 15 
+                           for category in dict.fromkeys(selected_categories))
+        if max_workers > 1 and raster_count > 1 and width * height * raster_count >= self.parallel_min_cells:
+            results['raster_paths'] = self._render_heatmaps_in_processes(
+                x, y, category_rows, selected_categories, x_grid, y_grid, output_folder,
+                settings, max_workers, progress_callback)
+        else:
+            results['raster_paths'] = self._render_heatmaps(
+                x, y, category_rows, selected_categories, x_grid, y_grid, output_folder,
+                settings, progress_callback)
+        
+        self._log_progress("\nHeatmap generation complete!", progress_callback)
+        self._log_progress(f"All rasters saved to: {output_folder}", progress_callback)
+        
+        return results
+    
+    def _render_heatmaps(self, x, y, category_rows, categories, x_grid, y_grid, output_folder,
+                         settings, progress_callback=None):
+        """
+        Render the category rasters and the combined raster one after another.
+        
+        Parameters:
+        -----------
+        x, y : numpy.ndarray
+            Point coordinates
+        category_rows : dict
+            Positions in x and y of each category's points
+        categories : list
+            Categories to render
+        x_grid, y_grid : numpy.ndarray
+            Grid node coordinates
+        output_folder : str
+            Path to the folder where rasters will be saved
+        settings : dict
+            Raster profile and density settings (see heatmap_pool.write_density_raster)
+        progress_callback : callable, optional
+            Function to call with progress updates
+            
+        Returns:
+        --------
+        raster_paths : dict
+            Raster path of each rendered category and of 'all_categories'
+        """
+        raster_paths = {}
+        
+        # The combined raster is built from the per-category accumulators instead
+        # of a second pass over every point
+        all_accumulator = density_kernel.DensityAccumulator(x_grid, y_grid)
+        
         # Process each selected category
-        for category in selected_categories:
-            category_gdf = filtered_data[filtered_data['category'] == category]
+        for category in dict.fromkeys(categories):
+            rows = category_rows.get(category, np.empty(0, dtype=np.intp))
+            
+            # Every point counts towards the combined raster, including those
+            # of categories too small for a raster of their own
+            accumulator = density_kernel.DensityAccumulator(x_grid, y_grid)
+            accumulator.add(x[rows], y[rows])
+            all_accumulator.merge(accumulator)
             
-            if len(category_gdf) < 15:
-                self._log_progress(f"Skipping {category} due to low point count ({len(category_gdf)} points)", 
+            if len(rows) < 15:
+                self._log_progress(f"Skipping {category} due to low point count ({len(rows)} points)", 
                                  progress_callback)
                 continue
             
-            self._log_progress(f"Processing {category} with {len(category_gdf)} points...", progress_callback)
-            
-            # Initialize an empty density array
-            density = np.zeros((height, width), dtype='float32')
-            
-            # Get coordinates
-            x_coords = category_gdf.geometry.x
-            y_coords = category_gdf.geometry.y
-            
-            # Stack coordinates for KDE
-            positions = np.vstack([xx.ravel(), yy.ravel()])
-            values = np.vstack([x_coords, y_coords])
-            
-            # Perform KDE with specified bandwidth
-            kernel = gaussian_kde(values, bw_method=bandwidth)
-            density = kernel(positions)
-            density = density.reshape(xx.shape)
-            
-            # Normalize density between 0 and 1
-            if density.max() > density.min():
-                density = (density - density.min()) / (density.max() - density.min())
+            self._log_progress(f"Processing {category} with {len(rows)} points...", progress_callback)
             
-            # Save raster
+            # Perform KDE with specified bandwidth and save the normalized raster
             output_path = os.path.join(output_folder, f"{category}_density.tif")
-            
-            with rasterio.open(
-                output_path,
-                'w',
-                driver='GTiff',
-                height=height,
-                width=width,
-                count=1,
-                dtype='float32',
-                crs=filtered_data.crs,
-                transform=transform,
-                nodata=None
-            ) as dst:
-                dst.write(density.astype('float32'), 1)
+            write_density_raster(accumulator, output_path, **settings)
             
             # Store the path in results
-            results['raster_paths'][category] = output_path
+            raster_paths[category] = output_path
             self._log_progress(f"✓ Created raster for {category}", progress_callback)
         
         # Create a raster for all points combined
         self._log_progress("\nCreating combined heatmap of all points...", progress_callback)
         
-        # Initialize an empty density array
-        all_density = np.zeros((height, width), dtype='float32')
-        
-        # Get coordinates for all points
-        x_coords = filtered_data.geometry.x
-        y_coords = filtered_data.geometry.y
-        
-        # Stack coordinates for KDE
-        positions = np.vstack([xx.ravel(), yy.ravel()])
-        values = np.vstack([x_coords, y_coords])
+        # Perform KDE on the merged accumulators and save the normalized raster
+        all_output_path = os.path.join(output_folder, "all_categories_density.tif")
+        write_density_raster(all_accumulator, all_output_path, **settings)
         
-        # Perform KDE
-        kernel = gaussian_kde(values, bw_method=bandwidth)
-        all_density = kernel(positions)
-        all_density = all_density.reshape(xx.shape)
+        raster_paths['all_categories'] = all_output_path
+        self._log_progress(f"✓ Created combined raster for all categories", progress_callback)
+        return raster_paths
+    
+    def _render_heatmaps_in_processes(self, x, y, category_rows, categories, x_grid, y_grid,
+                                      output_folder, settings, max_workers, progress_callback=None):
+        """
+        Render the category rasters in a process pool, one raster per task,
+        then the combined raster in this process from the merged per-category
+        counts (see _render_heatmaps for the parameters).
         
-        # Normalize density between 0 and 1
-        if all_density.max() > all_density.min():
-            all_density = (all_density - all_density.min()) / (all_density.max() - all_density.min())
+        Returns:
+        --------
+        raster_paths : dict
+            Raster path of each rendered category and of 'all_categories'
+        """
+        # Order the points category by category, so each task is a range of them
+        categories = list(dict.fromkeys(categories))
+        empty = np.empty(0, dtype=np.intp)
+        order = np.concatenate([category_rows.get(category, empty) for category in categories] + [empty])
+        x, y = x[order], y[order]
+        
+        ranges = []
+        tasks = []
+        start = 0
+        for category in categories:
+            stop = start + len(category_rows.get(category, empty))
+            ranges.append((start, stop))
+            if stop - start < 15:
+                self._log_progress(f"Skipping {category} due to low point count ({stop - start} points)", 
+                                 progress_callback)
+            else:
+                tasks.append((category, start, stop, os.path.join(output_folder, f"{category}_density.tif")))
+            start = stop
+        
+        workers = min(max_workers, len(tasks))
+        self._log_progress(f"Rendering {len(tasks)} rasters in {workers} worker processes", progress_callback)
+        
+        # The combined raster is built from the per-category counts the workers
+        # return. They are merged in category order, as they would be one after
+        # another, so the result does not depend on which worker finishes first.
+        all_accumulator = density_kernel.DensityAccumulator(x_grid, y_grid)
+        binned = {}
+        merged = 0
+        
+        def merge_ready():
+            nonlocal merged
+            while merged < len(categories):
+                category = categories[merged]
+                start, stop = ranges[merged]
+                if stop - start < 15:
+                    # Too small for a raster of its own, but part of the combined one
+                    accumulator = density_kernel.DensityAccumulator(x_grid, y_grid)
+                    accumulator.add(x[start:stop], y[start:stop])
+                    all_accumulator.merge(accumulator)
+                elif category in binned:
+                    all_accumulator.merge_binned(binned.pop(category), x[start:stop], y[start:stop])
+                else:
+                    return
+                merged += 1
+        
+        raster_paths = {}
+        if tasks:
+            with HeatmapProcessPool(x, y, x_grid, y_grid, workers, self.logger) as pool:
+                for category, output_path, category_binned in pool.render(
+                        tasks, settings, lambda message: self._log_progress(message, progress_callback)):
+                    raster_paths[category] = output_path
+                    binned[category] = category_binned
+                    merge_ready()
+        merge_ready()
+        
+        # Same order as rendering one after another
+        raster_paths = {category: raster_paths[category] for category, _, _, _ in tasks}
         
-        # Save combined raster
+        self._log_progress("\nCreating combined heatmap of all points...", progress_callback)
         all_output_path = os.path.join(output_folder, "all_categories_density.tif")
-        
-        with rasterio.open(
-            all_output_path,
-            'w',
-            driver='GTiff',
-            height=height,
-            width=width,
-            count=1,
-            dtype='float32',
-            crs=filtered_data.crs,
-            transform=transform,
-            nodata=None
-        ) as dst:
-            dst.write(all_density.astype('float32'), 1)
-        
-        # Store the path in results
-        results['raster_paths']['all_categories'] = all_output_path
+        write_density_raster(all_accumulator, all_output_path, **settings)
+        raster_paths['all_categories'] = all_output_path
         self._log_progress(f"✓ Created combined raster for all categories", progress_callback)
-        self._log_progress("\nHeatmap generation complete!", progress_callback)
-        self._log_progress(f"All rasters saved to: {output_folder}", progress_callback)
-        
-        return results
+        return raster_paths
     
     def create_heatmap_preview(self, output_folder, selected_categories, progress_callback=None):
         """
@@ -1035,7 +1966,7 @@ class StreetNetworkService:
         
         # Keep only LineString geometries
         self._log_progress(f"Filtering for LineStrings (before: {len(network_gdf)} features)", progress_callback)
-        network_gdf = network_gdf[network_gdf.geometry.apply(lambda x: x.geom_type == 'LineString')]
+        network_gdf = network_gdf[geometry_kernel.type_mask(network_gdf, 'LineString')]
         self._log_progress(f"After filtering: {len(network_gdf)} LineString features", progress_callback)
         
         # Standardize the columns
@@ -1321,3 +2252,18 @@ class StreetNetworkService:
             progress_callback(message)
 
 
+def _shallow_copy(gdf):
+    """Copy of a shared result that callers can modify without affecting others."""
+    return gdf.copy(deep=False) if gdf is not None else None
+
+
+def _is_empty_response(error):
+    # osmnx signals "no matching features" with an error class from its
+    # private _errors module; match it by name rather than importing it
+    return type(error).__name__ == "InsufficientResponseError"
+
+
+def _format_age(seconds):
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} minutes ago"
+    return f"{seconds / 3600:.1f} hours ago"
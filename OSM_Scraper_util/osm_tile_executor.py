@@ -0,0 +1,296 @@
+import re
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import osmnx as ox
+import requests
+
+
+class EndpointRateLimiter:
+    """
+    Token-bucket rate limiter shared by every request sent to one endpoint.
+    Limiters are registered per endpoint URL so that separate executors (and
+    separate service instances) never exceed the rate for the same server.
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, requests_per_second=1.0, burst=1):
+        """
+        Initialize the rate limiter.
+
+        Parameters:
+        -----------
+        requests_per_second : float, default=1.0
+            Sustained number of requests allowed per second. Zero or None disables limiting.
+        burst : int, default=1
+            Number of requests that may be sent back to back before limiting kicks in
+        """
+        self.requests_per_second = requests_per_second
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_endpoint(cls, endpoint, requests_per_second=1.0, burst=1):
+        """
+        Get the shared limiter for an endpoint, creating it on first use.
+
+        Parameters:
+        -----------
+        endpoint : str
+            The endpoint URL the limiter applies to
+        requests_per_second : float, default=1.0
+            Rate used if the limiter has to be created
+        burst : int, default=1
+            Burst size used if the limiter has to be created
+
+        Returns:
+        --------
+        limiter : EndpointRateLimiter
+            The limiter shared by all callers of this endpoint
+        """
+        with cls._registry_lock:
+            if endpoint not in cls._registry:
+                cls._registry[endpoint] = cls(requests_per_second, burst)
+            return cls._registry[endpoint]
+
+    def acquire(self):
+        """
+        Block until a request token is available, then consume it.
+        """
+        if not self.requests_per_second:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._last_refill
+                self._tokens = min(self.burst, self._tokens + elapsed * self.requests_per_second)
+                self._last_refill = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait_time = (1 - self._tokens) / self.requests_per_second
+
+            time.sleep(wait_time)
+
+
+class OverpassSlotMonitor:
+    """
+    Reads the Overpass /status endpoint to find out how many query slots this
+    client is allowed and how long to wait until the next one frees up.
+
+    The status is read lazily: requests hold a slot (see slot()), and only
+    the first request actually sent reads it, so runs served from caches or
+    a local extract never contact the status endpoint.
+    """
+
+    def __init__(self, endpoint=None, logger=None, max_wait=60):
+        """
+        Initialize the slot monitor.
+
+        Parameters:
+        -----------
+        endpoint : str, optional
+            Overpass API base URL. Defaults to osmnx's configured overpass_url.
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        max_wait : float, default=60
+            Upper bound on a single wait for a free slot (in seconds)
+        """
+        self.endpoint = (endpoint or ox.settings.overpass_url).rstrip("/")
+        self.logger = logger or logging.getLogger("OverpassSlotMonitor")
+        self.max_wait = max_wait
+        self._slots = None
+        self._checked = False
+        self._lock = threading.Lock()
+
+    def get_status(self):
+        """
+        Query the status endpoint.
+
+        Returns:
+        --------
+        status : dict or None
+            Dictionary with 'rate_limit', 'available' and 'wait' (seconds until the
+            next free slot), or None if the status could not be read
+        """
+        try:
+            response = requests.get(
+                self.endpoint + "/status",
+                timeout=ox.settings.requests_timeout,
+                headers={"User-Agent": ox.settings.http_user_agent},
+                **ox.settings.requests_kwargs,
+            )
+            text = response.text
+        except Exception as e:
+            self.logger.warning(f"Could not read Overpass status: {str(e)}")
+            return None
+
+        rate_limit = re.search(r"Rate limit:\s*(\d+)", text)
+        available = re.search(r"(\d+)\s+slots? available now", text)
+        waits = [int(s) for s in re.findall(r"in\s+(-?\d+)\s+seconds", text)]
+
+        return {
+            'rate_limit': int(rate_limit.group(1)) if rate_limit else None,
+            'available': int(available.group(1)) if available else 0,
+            'wait': max(0, min(waits)) if waits else 0,
+        }
+
+    def slot_limit(self):
+        """
+        Number of concurrent queries the server allows this client.
+
+        Returns:
+        --------
+        limit : int or None
+            The slot count, or None if unknown or unlimited
+        """
+        status = self.get_status()
+        if status is None or not status['rate_limit']:
+            return None
+        return status['rate_limit']
+
+    def wait_for_slot(self):
+        """
+        Sleep until the server reports a free slot (bounded by max_wait).
+        """
+        self._wait(self.get_status())
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold one of the server's query slots while sending a request.
+        Concurrent requests beyond the slot limit wait for a running one to
+        finish. The first use reads the status once, to learn the limit and
+        to wait for a free slot if none is available.
+        """
+        with self._lock:
+            if not self._checked:
+                status = self.get_status()
+                self._checked = True
+                if status is not None and status['rate_limit']:
+                    self._slots = threading.BoundedSemaphore(status['rate_limit'])
+                self._wait(status)
+
+        if self._slots is None:
+            yield
+            return
+        with self._slots:
+            yield
+
+    def _wait(self, status):
+        if status is None or status['available'] > 0 or status['rate_limit'] == 0:
+            return
+        pause = min(self.max_wait, max(1, status['wait']))
+        self.logger.info(f"No Overpass slot available, waiting {pause} seconds")
+        time.sleep(pause)
+
+
+class TileExecutor:
+    """
+    Bounded thread pool for fetching tiles concurrently.
+
+    Throttling happens in the request layer only: OverpassClient takes a
+    token from the per-endpoint rate limiter and one of the server's slots
+    (see OverpassSlotMonitor.slot) for each request it actually sends, so
+    cached tiles cost neither, and osmnx paces its own requests. Results
+    are streamed back to the caller in completion order, and new work can
+    be submitted while streaming.
+    """
+
+    def __init__(self, max_workers=4, endpoint=None, requests_per_second=1.0, logger=None):
+        """
+        Initialize the tile executor.
+
+        Parameters:
+        -----------
+        max_workers : int, default=4
+            Maximum number of tiles fetched at the same time
+        endpoint : str, optional
+            Overpass API base URL. Defaults to osmnx's configured overpass_url.
+        requests_per_second : float, default=1.0
+            Sustained request rate allowed against the endpoint; sets up the
+            endpoint's shared limiter used by the request layer
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.logger = logger or logging.getLogger("TileExecutor")
+        self.endpoint = (endpoint or ox.settings.overpass_url).rstrip("/")
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = EndpointRateLimiter.for_endpoint(self.endpoint, requests_per_second)
+        self.concurrency = self.max_workers
+
+        self._pool = None
+        self._pending = {}
+        self._fn = None
+
+    def __enter__(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Drop anything that has not started yet if the caller bailed out early
+        for future in self._pending:
+            future.cancel()
+        self._pool.shutdown(wait=True)
+        self._pool = None
+        self._pending = {}
+
+    def submit(self, item):
+        """
+        Queue another item for the function passed to stream().
+
+        Parameters:
+        -----------
+        item : any
+            The work item (e.g. a tile geometry) to pass to the fetch function
+        """
+        future = self._pool.submit(self._fn, item)
+        self._pending[future] = item
+
+    def stream(self, fn, items):
+        """
+        Run fn over items concurrently and yield results as they finish.
+
+        Parameters:
+        -----------
+        fn : callable
+            Function called with each item; runs in a worker thread
+        items : iterable
+            Initial work items
+
+        Yields:
+        -------
+        (item, result, error) : tuple
+            The item, fn's return value (None on failure) and the raised
+            exception (None on success)
+        """
+        if self._pool is None:
+            raise RuntimeError("TileExecutor must be used as a context manager")
+
+        self._fn = fn
+        for item in items:
+            self.submit(item)
+
+        while self._pending:
+            done, _ = wait(list(self._pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                item = self._pending.pop(future)
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+
+    @property
+    def pending_count(self):
+        """Number of submitted items that have not been yielded yet."""
+        return len(self._pending)
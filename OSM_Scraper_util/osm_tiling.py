@@ -0,0 +1,466 @@
+import os
+import json
+import time
+import heapq
+import hashlib
+import logging
+import threading
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import box
+
+
+def query_signature(feature_type, tags):
+    """
+    Build a stable key for a feature type and tag list.
+
+    Parameters:
+    -----------
+    feature_type : str
+        The OSM feature type (e.g., 'amenity', 'shop', 'highway')
+    tags : list or bool
+        List of specific tags, or True for every value of the feature type
+
+    Returns:
+    --------
+    signature : str
+        Short hash identifying the query
+    """
+    if tags is True:
+        tag_part = "*"
+    else:
+        tag_part = ",".join(sorted(str(tag) for tag in tags))
+    return hashlib.sha1(f"{feature_type}={tag_part}".encode("utf-8")).hexdigest()[:16]
+
+
+class DensityIndex:
+    """
+    Persistent record of how many features past requests returned per area.
+    Used to pick tile sizes up front instead of learning them through failed
+    requests. Observations are stored per query signature in a small JSON
+    file, expire after a time to live and are capped in number (oldest
+    first); estimates look them up through a spatial index per signature.
+    """
+
+    def __init__(self, path=None, ttl=None, max_observations=20000, logger=None):
+        """
+        Initialize the density index.
+
+        Parameters:
+        -----------
+        path : str, optional
+            JSON file holding the observations. If None, the index is kept in memory only.
+        ttl : float, optional
+            Maximum age of an observation in seconds. None keeps observations
+            until they are dropped for the cap.
+        max_observations : int, default=20000
+            Maximum number of observations kept over all signatures
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_observations = max_observations
+        self.logger = logger or logging.getLogger("DensityIndex")
+        self._lock = threading.Lock()
+        # {signature: {bounds key: [count, time recorded]}}
+        self._observations = {}
+        self._count = 0
+        # Spatial index of each signature's observations, rebuilt after changes
+        self._trees = {}
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Could not read density index {path}: {str(e)}")
+                stored = {}
+            now = time.time()
+            for signature, observations in stored.items():
+                for key, value in observations.items():
+                    # Older files stored bare counts; their age is unknown
+                    count, recorded = value if isinstance(value, list) else (value, now)
+                    if not self._expired(recorded, now):
+                        self._observations.setdefault(signature, {})[key] = [int(count), recorded]
+                        self._count += 1
+            self._evict()
+
+    def record(self, signature, bounds, feature_count):
+        """
+        Record the number of features found in a rectangular area.
+
+        Parameters:
+        -----------
+        signature : str
+            Query signature from query_signature()
+        bounds : tuple
+            (minx, miny, maxx, maxy) of the fetched area
+        feature_count : int
+            Number of features the request returned
+        """
+        key = _bounds_key(bounds)
+        with self._lock:
+            observations = self._observations.setdefault(signature, {})
+            if key not in observations:
+                self._count += 1
+            observations[key] = [int(feature_count), time.time()]
+            self._trees.pop(signature, None)
+            self._evict()
+
+    def observed_count(self, signature, bounds):
+        """
+        Get the feature count recorded for exactly this area, if any.
+
+        Parameters:
+        -----------
+        signature : str
+            Query signature from query_signature()
+        bounds : tuple
+            (minx, miny, maxx, maxy) of the area
+
+        Returns:
+        --------
+        count : int or None
+            The recorded count, or None if this area was never recorded (or
+            the record expired)
+        """
+        with self._lock:
+            value = self._observations.get(signature, {}).get(_bounds_key(bounds))
+        if value is None or self._expired(value[1], time.time()):
+            return None
+        return value[0]
+
+    def estimate_count(self, signature, bounds, min_coverage=0.5):
+        """
+        Estimate how many features a request for an area would return.
+
+        Parameters:
+        -----------
+        signature : str
+            Query signature from query_signature()
+        bounds : tuple
+            (minx, miny, maxx, maxy) of the candidate area
+        min_coverage : float, default=0.5
+            Minimum fraction of the area that must be covered by past
+            observations for an estimate to be returned
+
+        Returns:
+        --------
+        estimate : float or None
+            Estimated feature count, or None if there is not enough history
+        """
+        cell = box(*bounds)
+        if cell.area == 0:
+            return None
+
+        tree, observed_bounds, densities, recorded = self._tree(signature)
+        if tree is None:
+            return None
+
+        hits = tree.query(cell, predicate="intersects")
+        if self.ttl is not None:
+            hits = hits[recorded[hits] >= time.time() - self.ttl]
+        minx, miny, maxx, maxy = bounds
+        hit_bounds = observed_bounds[hits]
+        width = np.minimum(hit_bounds[:, 2], maxx) - np.maximum(hit_bounds[:, 0], minx)
+        height = np.minimum(hit_bounds[:, 3], maxy) - np.maximum(hit_bounds[:, 1], miny)
+        overlap = np.clip(width, 0, None) * np.clip(height, 0, None)
+
+        covered_area = float(overlap.sum())
+        if covered_area == 0 or covered_area < min_coverage * cell.area:
+            return None
+
+        weighted_density = float((densities[hits] * overlap).sum())
+        return weighted_density / covered_area * cell.area
+
+    def save(self):
+        """
+        Write the observations to disk (no-op for in-memory indexes).
+        """
+        if not self.path:
+            return
+
+        now = time.time()
+        with self._lock:
+            payload = json.dumps({
+                signature: {key: value for key, value in observations.items() 
+                            if not self._expired(value[1], now)}
+                for signature, observations in self._observations.items()
+            })
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Could not save density index {self.path}: {str(e)}")
+
+    def _tree(self, signature):
+        # (STRtree, bounds, density, time recorded) of a signature's observations
+        with self._lock:
+            if signature not in self._trees:
+                rows = [[float(value) for value in key.split(",")] + [count, recorded]
+                        for key, (count, recorded) in self._observations.get(signature, {}).items()]
+                table = np.array(rows, dtype=float).reshape(-1, 6)
+                observed_bounds = table[:, :4]
+                area = ((observed_bounds[:, 2] - observed_bounds[:, 0]) * 
+                        (observed_bounds[:, 3] - observed_bounds[:, 1]))
+                keep = area > 0
+                observed_bounds = observed_bounds[keep]
+                if len(observed_bounds) == 0:
+                    self._trees[signature] = (None, None, None, None)
+                else:
+                    tree = STRtree(shapely.box(*observed_bounds.T))
+                    self._trees[signature] = (tree, observed_bounds, table[keep, 4] / area[keep],
+                                              table[keep, 5])
+            return self._trees[signature]
+
+    def _expired(self, recorded, now):
+        return self.ttl is not None and recorded < now - self.ttl
+
+    def _evict(self):
+        # Called with the lock held (or during construction). Drops the oldest
+        # observations down to 90% of the cap, so eviction is not repeated on
+        # every record once the index is full.
+        if self._count <= self.max_observations:
+            return
+        entries = [(value[1], signature, key) for signature, observations in self._observations.items()
+                   for key, value in observations.items()]
+        target = int(self.max_observations * 0.9)
+        for _, signature, key in heapq.nsmallest(len(entries) - target, entries):
+            del self._observations[signature][key]
+            if not self._observations[signature]:
+                del self._observations[signature]
+            self._trees.pop(signature, None)
+        self._count = target
+
+
+class QuadtreeTilePlanner:
+    """
+    Plans rectangular tiles for a boundary and splits them recursively.
+
+    Initial tiles are sized from the density index when past observations
+    cover the area, or from count queries made before fetching (plan()),
+    otherwise a fixed grid is used. Any tile whose request fails can be
+    split into four quadrants until it reaches the minimum size.
+    """
+
+    def __init__(self, density_index=None, target_features=5000,
+                 min_cell_size=0.002, max_depth=8, max_tiles=256, logger=None):
+        """
+        Initialize the planner.
+
+        Parameters:
+        -----------
+        density_index : DensityIndex, optional
+            Past feature densities used to size the initial tiles
+        target_features : int, default=5000
+            Desired maximum number of features per request
+        min_cell_size : float, default=0.002
+            Tiles whose width or height is below this size (in degrees) are not split further
+        max_depth : int, default=8
+            Maximum number of quadtree splits applied to a single tile
+        max_tiles : int, default=256
+            Maximum number of tiles planned up front from the density history
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.density_index = density_index
+        self.target_features = target_features
+        self.min_cell_size = min_cell_size
+        self.max_depth = max_depth
+        self.max_tiles = max_tiles
+        self.logger = logger or logging.getLogger("QuadtreeTilePlanner")
+
+    def initial_tiles(self, boundary, signature=None, grid_size=3):
+        """
+        Plan the first set of tiles for a boundary.
+
+        Parameters:
+        -----------
+        boundary : shapely.geometry
+            The area to cover
+        signature : str, optional
+            Query signature used to look up past densities
+        grid_size : int, default=3
+            Number of grid cells in each dimension when no history is available
+
+        Returns:
+        --------
+        tiles : list of (shapely.geometry.Polygon, int)
+            Tiles intersecting the boundary with their quadtree depth
+        """
+        root = box(*boundary.bounds)
+
+        if self.density_index is not None and signature is not None:
+            estimate = self.density_index.estimate_count(signature, root.bounds)
+            if estimate is not None:
+                return self._plan_from_density(root, boundary, signature)
+
+        minx, miny, maxx, maxy = root.bounds
+        cell_width = (maxx - minx) / grid_size
+        cell_height = (maxy - miny) / grid_size
+
+        tiles = []
+        for i in range(grid_size):
+            for j in range(grid_size):
+                cell = box(minx + i * cell_width, miny + j * cell_height,
+                           minx + (i + 1) * cell_width, miny + (j + 1) * cell_height)
+                if cell.intersects(boundary):
+                    tiles.append((cell, 0))
+        return tiles
+
+    def plan(self, boundary, signature=None, counter=None, grid_size=3, max_count_queries=16):
+        """
+        Plan tiles before fetching so that every request stays under
+        target_features.
+
+        Without density history for the area, the size of the boundary's
+        bounding box is measured with counter (e.g. an Overpass count
+        query). Tiles estimated over the budget are then split, the densest
+        first. Their quadrants are measured too while count queries remain,
+        and are estimated from the density index afterwards. Every count is
+        recorded in the density index, so later runs need no counts.
+
+        Parameters:
+        -----------
+        boundary : shapely.geometry
+            The area to cover
+        signature : str, optional
+            Query signature used to look up and record densities
+        counter : callable, optional
+            Function taking a rectangular tile and returning the number of
+            features a request for it would return, or None if unknown.
+            Without it, tiles are planned as in initial_tiles().
+        grid_size : int, default=3
+            Number of grid cells in each dimension if the size is unknown
+        max_count_queries : int, default=16
+            Maximum number of counter calls
+
+        Returns:
+        --------
+        tiles : list of (shapely.geometry.Polygon, int)
+            Tiles intersecting the boundary with their quadtree depth
+        """
+        if self.density_index is None or signature is None or counter is None:
+            return self.initial_tiles(boundary, signature, grid_size)
+
+        root = box(*boundary.bounds)
+        counts_left = max_count_queries
+        root_estimate = self.density_index.estimate_count(signature, root.bounds)
+        if root_estimate is None:
+            root_estimate = self._count(counter, signature, root)
+            counts_left -= 1
+            if root_estimate is None:
+                return self.initial_tiles(boundary, signature, grid_size)
+
+        heap = [(-root_estimate, 0, 0, root)]
+        tiles = []
+        order = 1
+        while heap:
+            negative_estimate, _, depth, cell = heapq.heappop(heap)
+            within_budget = len(heap) + len(tiles) + 4 <= self.max_tiles
+            if not (-negative_estimate > self.target_features and within_budget and
+                    self.can_split(cell, depth)):
+                tiles.append((cell, depth))
+                continue
+
+            children = [child for child in self.split(cell) if child.intersects(boundary)]
+            measure = counts_left >= len(children)
+            for child in children:
+                # Counts recorded for exactly this tile (by earlier counts or fetches) are reused
+                estimate = self.density_index.observed_count(signature, child.bounds)
+                if estimate is None and measure:
+                    estimate = self._count(counter, signature, child)
+                    counts_left -= 1
+                if estimate is None:
+                    estimate = self._estimate(signature, child)
+                heapq.heappush(heap, (-estimate, order, depth + 1, child))
+                order += 1
+
+        self.logger.info(f"Planned {len(tiles)} tiles using "
+                         f"{max_count_queries - counts_left} count queries")
+        return tiles
+
+    def _count(self, counter, signature, cell):
+        count = counter(cell)
+        if count is not None:
+            self.density_index.record(signature, cell.bounds, count)
+        return count
+
+    def _plan_from_density(self, root, boundary, signature):
+        # Split the tile with the highest estimate first so the tile budget goes
+        # where the data is densest
+        heap = [(-self._estimate(signature, root), 0, 0, root)]
+        tiles = []
+        order = 1
+        while heap:
+            negative_estimate, _, depth, cell = heapq.heappop(heap)
+            within_budget = len(heap) + len(tiles) + 4 <= self.max_tiles
+            if (-negative_estimate > self.target_features and within_budget and
+                    self.can_split(cell, depth)):
+                for child in self.split(cell):
+                    if child.intersects(boundary):
+                        heapq.heappush(heap, (-self._estimate(signature, child), order, depth + 1, child))
+                        order += 1
+            else:
+                tiles.append((cell, depth))
+        return tiles
+
+    def _estimate(self, signature, cell):
+        estimate = self.density_index.estimate_count(signature, cell.bounds)
+        return 0.0 if estimate is None else estimate
+
+    def can_split(self, cell, depth):
+        """
+        Check whether a tile may be split further.
+
+        Parameters:
+        -----------
+        cell : shapely.geometry.Polygon
+            The tile to check
+        depth : int
+            Current quadtree depth of the tile
+
+        Returns:
+        --------
+        can_split : bool
+            True if the tile is above the minimum size and maximum depth
+        """
+        minx, miny, maxx, maxy = cell.bounds
+        return (depth < self.max_depth and
+                (maxx - minx) / 2 >= self.min_cell_size and
+                (maxy - miny) / 2 >= self.min_cell_size)
+
+    def split(self, cell):
+        """
+        Split a tile into its four quadrants.
+
+        Parameters:
+        -----------
+        cell : shapely.geometry.Polygon
+            The (rectangular) tile to split
+
+        Returns:
+        --------
+        quadrants : list of shapely.geometry.Polygon
+            The four child tiles
+        """
+        minx, miny, maxx, maxy = cell.bounds
+        midx = (minx + maxx) / 2
+        midy = (miny + maxy) / 2
+        return [
+            box(minx, miny, midx, midy),
+            box(midx, miny, maxx, midy),
+            box(minx, midy, midx, maxy),
+            box(midx, midy, maxx, maxy),
+        ]
+
+
+def _bounds_key(bounds):
+    return ",".join(f"{value:.6f}" for value in bounds)
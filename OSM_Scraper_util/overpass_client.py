@@ -0,0 +1,347 @@
+import os
+import hashlib
+import logging
+import tempfile
+
+import osmnx as ox
+import requests
+from shapely.geometry import Polygon, MultiPolygon
+
+from osm_tile_executor import EndpointRateLimiter
+from osm_cache import ResponseCacheStore
+from osm_resilience import RetryPolicy
+
+
+# Overpass derives the id of the area of relation r as r + 3600000000
+AREA_ID_OFFSET = 3600000000
+
+
+class OverpassError(Exception):
+    """Raised when the Overpass API rejects a query or fails to run it."""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class OverpassClient:
+    """
+    Minimal Overpass API client for queries osmnx cannot express, such as
+    regex tag filters or "out center" output. Uses osmnx's endpoint, timeout
+    and HTTP settings, and keeps responses in a compressed, size-capped
+    ResponseCacheStore.
+    """
+
+    def __init__(self, endpoint=None, cache_folder=None, use_cache=None, logger=None,
+                 cache_store=None, retry_policy=None, slot_monitor=None):
+        """
+        Initialize the Overpass client.
+
+        Parameters:
+        -----------
+        endpoint : str, optional
+            Overpass API base URL. Defaults to osmnx's configured overpass_url.
+        cache_folder : str, optional
+            Folder whose "responses" subfolder holds the response store when no
+            cache_store is given. Defaults to osmnx's cache folder.
+        use_cache : bool, optional
+            Whether to read and write cached responses. Defaults to osmnx's use_cache setting.
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        cache_store : ResponseCacheStore, optional
+            Store for cached responses, e.g. one shared with other clients
+        retry_policy : RetryPolicy, optional
+            Retries and circuit breaker for requests. Defaults to a policy
+            without a breaker.
+        slot_monitor : OverpassSlotMonitor, optional
+            If given, concurrent requests are capped at the server's slot
+            limit, read when the first request is sent
+        """
+        self.endpoint = (endpoint or ox.settings.overpass_url).rstrip("/")
+        self.use_cache = ox.settings.use_cache if use_cache is None else use_cache
+        self.logger = logger or logging.getLogger("OverpassClient")
+        
+        if cache_store is None and self.use_cache:
+            cache_folder = cache_folder or ox.settings.cache_folder
+            cache_store = ResponseCacheStore(os.path.join(cache_folder, "responses"), logger=self.logger)
+        self.cache_store = cache_store
+        self.retry_policy = retry_policy or RetryPolicy(logger=self.logger)
+        self.slot_monitor = slot_monitor
+
+    def build_query(self, area_clauses, filters, out="center"):
+        """
+        Build an Overpass QL query.
+
+        Parameters:
+        -----------
+        area_clauses : list of str
+            Spatial filters, e.g. 'poly:"lat lon ..."', 'area:3600175905' or a
+            bbox 'south,west,north,east'
+        filters : list of str
+            Tag filters such as '["amenity"]' or '["shop"~"^(bakery|butcher)$"]'
+        out : str, default="center"
+            "center" for one point per element, "geom" for full geometries,
+            "count" for the number of matching elements only
+
+        Returns:
+        --------
+        query : str
+            The Overpass QL query text
+        """
+        maxsize = "" if ox.settings.overpass_memory is None else f"[maxsize:{ox.settings.overpass_memory}]"
+        settings = ox.settings.overpass_settings.format(timeout=ox.settings.requests_timeout, maxsize=maxsize)
+
+        statements = "".join(
+            f"nwr{tag_filter}({area});"
+            for area in area_clauses
+            for tag_filter in filters
+        )
+
+        if out == "center":
+            out_statement = "out tags center qt;"
+        elif out == "count":
+            out_statement = "out count;"
+        else:
+            out_statement = "out body qt;>;out skel qt;"
+
+        return f"{settings};({statements});{out_statement}"
+
+    def polygon_clauses(self, polygon):
+        """
+        Build poly: area clauses for a polygon or multipolygon.
+
+        Parameters:
+        -----------
+        polygon : shapely.geometry.Polygon or MultiPolygon
+            The query area in EPSG:4326
+
+        Returns:
+        --------
+        clauses : list of str
+            One poly: clause per polygon part
+        """
+        if isinstance(polygon, Polygon):
+            parts = [polygon]
+        elif isinstance(polygon, MultiPolygon):
+            parts = list(polygon.geoms)
+        else:
+            parts = [polygon.envelope]
+
+        clauses = []
+        for part in parts:
+            coords = " ".join(f"{_format_coordinate(lat)} {_format_coordinate(lon)}"
+                              for lon, lat in part.exterior.coords)
+            clauses.append(f'poly:"{coords}"')
+        return clauses
+
+    def bbox_clauses(self, geometry):
+        """
+        Build a bbox clause for the bounding box of a geometry. Overpass
+        evaluates bbox filters much faster than poly: filters.
+
+        Parameters:
+        -----------
+        geometry : shapely.geometry
+            The query area in EPSG:4326 (e.g. a rectangular tile)
+
+        Returns:
+        --------
+        clauses : list of str
+            A single 'south,west,north,east' clause
+        """
+        minx, miny, maxx, maxy = geometry.bounds
+        return [",".join(_format_coordinate(value) for value in (miny, minx, maxy, maxx))]
+
+    def area_clauses(self, relation_id):
+        """
+        Build an area: clause for the area of an OSM relation (e.g. the
+        boundary relation of a geocoded place). The server resolves the
+        boundary itself, so the query does not carry its coordinates.
+
+        Parameters:
+        -----------
+        relation_id : int
+            OSM id of the relation
+
+        Returns:
+        --------
+        clauses : list of str
+            A single area: clause
+        """
+        return [f"area:{AREA_ID_OFFSET + int(relation_id)}"]
+
+    def count(self, area_clauses, filters, breaker=None):
+        """
+        Count the elements a query would return, without downloading them.
+
+        Parameters:
+        -----------
+        area_clauses : list of str
+            Spatial filters, as for build_query
+        filters : list of str
+            Tag filters, as for build_query
+        breaker : CircuitBreaker, optional
+            Circuit breaker of the run the request belongs to
+
+        Returns:
+        --------
+        count : int
+            Number of matching nodes, ways and relations
+
+        Raises:
+        -------
+        OverpassError
+            If the server rejects the query or returns no count
+        """
+        response = self.query(self.build_query(area_clauses, filters, out="count"), breaker=breaker)
+        for element in response.get("elements", []):
+            if element.get("type") == "count":
+                return int(element.get("tags", {}).get("total", 0))
+        raise OverpassError("Overpass returned no count")
+
+    def query(self, query_text, breaker=None):
+        """
+        Run a query, using the response cache when possible.
+
+        Parameters:
+        -----------
+        query_text : str
+            The Overpass QL query
+        breaker : CircuitBreaker, optional
+            Circuit breaker of the run the request belongs to
+
+        Returns:
+        --------
+        response : dict
+            The parsed JSON response
+
+        Raises:
+        -------
+        OverpassError
+            If the server returns an error status or a runtime error remark
+        """
+        cache_key = self.cache_key(query_text)
+
+        if self.use_cache:
+            cached = self.cache_store.get(cache_key)
+            if cached is not None:
+                return cached
+
+        response = self._post(query_text, breaker=breaker)
+
+        try:
+            response_json = response.json()
+        except ValueError as e:
+            raise OverpassError(f"Overpass returned invalid JSON: {str(e)}")
+
+        # Runtime errors (timeouts, memory) come back as 200 with a remark
+        if "remark" in response_json and "error" in response_json["remark"].lower():
+            raise OverpassError(response_json["remark"])
+
+        if self.use_cache:
+            self.cache_store.put(cache_key, response_json, query=query_text)
+        return response_json
+
+    def query_stream(self, query_text, breaker=None):
+        """
+        Run a query and return its response as a file object, so it can be
+        parsed incrementally. The download is streamed into the response
+        cache (or a temporary file when caching is off) and never held in memory.
+
+        Parameters:
+        -----------
+        query_text : str
+            The Overpass QL query
+        breaker : CircuitBreaker, optional
+            Circuit breaker of the run the request belongs to
+
+        Returns:
+        --------
+        f : file object
+            File object over the JSON response; use it as a context manager.
+            When caching is off, runtime error remarks are only visible to the parser.
+
+        Raises:
+        -------
+        OverpassError
+            If the server returns an error status or a runtime error remark
+        """
+        cache_key = self.cache_key(query_text)
+
+        if self.use_cache:
+            cached = self.cache_store.open(cache_key)
+            if cached is not None:
+                return cached
+
+        response = self._post(query_text, stream=True, breaker=breaker)
+        chunks = response.iter_content(chunk_size=1024 ** 2)
+
+        if not self.use_cache:
+            f = tempfile.TemporaryFile()
+            for chunk in chunks:
+                f.write(chunk)
+            f.seek(0)
+            return f
+
+        header = self.cache_store.put_stream(cache_key, chunks, query=query_text)
+        remark = header.get("remark", "")
+        if "error" in remark.lower():
+            self.cache_store.discard(cache_key)
+            raise OverpassError(remark)
+        return self.cache_store.open(cache_key)
+
+    def cache_key(self, query_text):
+        """
+        Cache key of a query.
+
+        Parameters:
+        -----------
+        query_text : str
+            The Overpass QL query
+
+        Returns:
+        --------
+        key : str
+            sha1 of the equivalent GET URL
+        """
+        url = self.endpoint + "/interpreter"
+        prepared_url = requests.Request("GET", url, params={"data": query_text}).prepare().url
+        # Same key as osmnx uses for its cache files, so imported osmnx caches still hit
+        return hashlib.sha1(prepared_url.encode("utf-8")).hexdigest()
+
+    def _post(self, query_text, stream=False, breaker=None):
+        return self.retry_policy.call(self._post_once, query_text, stream=stream,
+                                      description="Overpass query", breaker=breaker)
+
+    def _post_once(self, query_text, stream=False):
+        if self.slot_monitor is None:
+            return self._send(query_text, stream)
+        with self.slot_monitor.slot():
+            return self._send(query_text, stream)
+
+    def _send(self, query_text, stream=False):
+        EndpointRateLimiter.for_endpoint(self.endpoint).acquire()
+        self.logger.info(f"Posting Overpass query ({len(query_text)} characters)")
+        response = requests.post(
+            self.endpoint + "/interpreter",
+            data={"data": query_text},
+            timeout=ox.settings.requests_timeout,
+            headers={"User-Agent": ox.settings.http_user_agent,
+                     "referer": ox.settings.http_referer,
+                     "Accept-Language": ox.settings.http_accept_language},
+            stream=stream,
+            **ox.settings.requests_kwargs,
+        )
+
+        if not response.ok:
+            retry_after = response.headers.get("Retry-After")
+            raise OverpassError(f"{response.status_code} {response.reason}: {response.text[:200]}",
+                                status_code=response.status_code,
+                                retry_after=int(retry_after) if retry_after and retry_after.isdigit() else None)
+        return response
+
+
+def _format_coordinate(value):
+    # Six decimals (~0.1 m) without trailing zeros, so grid-snapped polygons stay short
+    return f"{value:.6f}".rstrip("0").rstrip(".")
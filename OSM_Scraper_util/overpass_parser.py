@@ -0,0 +1,501 @@
+import io
+import gzip
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely.geometry import Polygon
+
+from osm_polygon_rules import POLYGON_FEATURES, build_relation_geometry
+
+
+def build_point_frame(elements, crs="EPSG:4326"):
+    """
+    Build a point GeoDataFrame from Overpass "out center" elements.
+
+    Nodes are placed at their own coordinates and ways/relations at the
+    center computed by the server. The frame uses the same (element, id)
+    index and one column per tag as osmnx feature frames.
+
+    Parameters:
+    -----------
+    elements : list of dict
+        The "elements" array of an Overpass JSON response
+    crs : str, default="EPSG:4326"
+        CRS of the returned frame
+
+    Returns:
+    --------
+    gdf : geopandas.GeoDataFrame
+        One point per tagged element
+    """
+    element_types = []
+    ids = []
+    lons = []
+    lats = []
+    tags = []
+
+    for element in elements:
+        element_tags = element.get("tags")
+        if not element_tags:
+            continue
+
+        if "lat" in element:
+            lon, lat = element["lon"], element["lat"]
+        elif "center" in element:
+            lon, lat = element["center"]["lon"], element["center"]["lat"]
+        else:
+            continue
+
+        element_types.append(element["type"])
+        ids.append(element["id"])
+        lons.append(lon)
+        lats.append(lat)
+        tags.append(element_tags)
+
+    geometry = gpd.points_from_xy(np.asarray(lons, dtype="float64"),
+                                  np.asarray(lats, dtype="float64"), crs=crs)
+    return feature_frame(element_types, ids, tags, geometry, crs).sort_index()
+
+
+def feature_frame(element_types, ids, tags, geometry, crs):
+    """
+    Build a feature frame with the osmnx (element, id) index and one column per tag.
+
+    Parameters:
+    -----------
+    element_types : list of str
+        'node', 'way' or 'relation' per feature
+    ids : list of int
+        OSM id per feature
+    tags : list of dict
+        Tags per feature
+    geometry : array-like of shapely geometries
+        Geometry per feature
+    crs : str
+        CRS of the returned frame
+
+    Returns:
+    --------
+    gdf : geopandas.GeoDataFrame
+        The features, in input order
+    """
+    index = pd.MultiIndex.from_arrays(
+        [element_types, np.asarray(ids, dtype="int64")], names=["element", "id"]
+    )
+    data = pd.DataFrame.from_records(tags, index=index) if tags else pd.DataFrame(index=index)
+    return gpd.GeoDataFrame(data, geometry=geometry, crs=crs)
+
+
+class OverpassJSONStream:
+    """
+    Incremental reader for Overpass JSON responses.
+
+    Elements are decoded one at a time from fixed-size chunks of the input,
+    so memory use is bounded by the chunk size and the largest single element
+    rather than by the size of the response. All other top-level members
+    (version, osm3s, remark, ...) are collected in `header`, which is complete
+    once the elements have been exhausted.
+    """
+
+    def __init__(self, fp, chunk_size=1024 ** 2):
+        """
+        Initialize the stream.
+
+        Parameters:
+        -----------
+        fp : file object
+            Text or binary file object positioned at the start of the response
+        chunk_size : int, default=1 MB
+            Number of characters read at a time
+        """
+        if isinstance(fp.read(0), bytes):
+            fp = io.TextIOWrapper(fp, encoding="utf-8")
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.header = {}
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        # Drop consumed text before reading more so the buffer stays small
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def _next_char(self):
+        """Skip whitespace and return the next character without consuming it."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, characters):
+        char = self._next_char()
+        if char is None or char not in characters:
+            raise ValueError(f"Malformed Overpass JSON: expected one of {characters!r}, got {char!r}")
+        self._pos += 1
+        return char
+
+    def _decode(self):
+        """Decode the next JSON value, reading more input until it is complete."""
+        self._next_char()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number cut by the end of the buffer may continue in the next chunk
+                complete = end < len(self._buffer) and (self._buffer[end] in ",:]}" or
+                                                        self._buffer[end].isspace())
+                if complete or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            if not self._fill():
+                continue
+
+    def elements(self):
+        """
+        Iterate over the response's elements.
+
+        Yields:
+        -------
+        element : dict
+            One Overpass element
+        """
+        self._expect("{")
+        if self._next_char() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self._decode()
+            self._expect(":")
+            if key == "elements":
+                self._expect("[")
+                if self._next_char() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._decode()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self.header[key] = self._decode()
+
+            if self._expect(",}") == "}":
+                return
+
+
+class OverpassStreamParser:
+    """
+    Builds GeoDataFrame batches from an Overpass JSON response without
+    loading the whole response.
+
+    Tagged nodes and elements that carry their own position ("out center")
+    are emitted as they are read. Node coordinates are kept in compact numpy
+    arrays, and way refs in a flat integer array, so full geometries of ways
+    and multipolygon relations can be built in batches once all nodes have
+    been seen (Overpass may list ways before their nodes). Batches use the
+    same (element, id) index, tag columns and geometry rules as osmnx.
+    """
+
+    def __init__(self, batch_size=10000, crs="EPSG:4326", chunk_size=1024 ** 2, logger=None):
+        """
+        Initialize the parser.
+
+        Parameters:
+        -----------
+        batch_size : int, default=10000
+            Maximum number of features per emitted GeoDataFrame
+        crs : str, default="EPSG:4326"
+            CRS of the emitted frames
+        chunk_size : int, default=1 MB
+            Number of characters read from the input at a time
+        logger : logging.Logger, optional
+            Logger for outputting status messages
+        """
+        self.batch_size = batch_size
+        self.crs = crs
+        self.chunk_size = chunk_size
+        self.logger = logger or logging.getLogger("OverpassStreamParser")
+        self.header = {}
+        self.element_count = 0
+
+    def batches(self, fp):
+        """
+        Parse a response incrementally.
+
+        Parameters:
+        -----------
+        fp : file object
+            Text or binary file object holding the Overpass JSON response
+
+        Yields:
+        -------
+        gdf : geopandas.GeoDataFrame
+            Up to batch_size features
+        """
+        stream = OverpassJSONStream(fp, chunk_size=self.chunk_size)
+        self.header = stream.header
+        self.element_count = 0
+
+        points = _PointBatch()
+        node_ids = _Int64Buffer()
+        node_lons = _Float64Buffer()
+        node_lats = _Float64Buffer()
+        ways = _WayBuffer()
+        relations = []
+
+        for element in stream.elements():
+            self.element_count += 1
+            element_type = element.get("type")
+            element_tags = element.get("tags")
+
+            if element_type == "node":
+                node_ids.append(element["id"])
+                node_lons.append(element["lon"])
+                node_lats.append(element["lat"])
+                if element_tags:
+                    points.append("node", element["id"], element_tags, element["lon"], element["lat"])
+            elif "center" in element:
+                if element_tags:
+                    center = element["center"]
+                    points.append(element_type, element["id"], element_tags, center["lon"], center["lat"])
+            elif element_type == "way":
+                ways.append(element["id"], element_tags, element.get("nodes", []))
+            elif element_type == "relation" and element_tags:
+                relations.append(element)
+
+            if len(points) >= self.batch_size:
+                yield points.to_frame(self.crs)
+                points = _PointBatch()
+
+        if len(points):
+            yield points.to_frame(self.crs)
+
+        if len(ways) == 0:
+            if relations:
+                self.logger.warning(f"Skipped {len(relations)} relations without member ways")
+            return
+
+        # Node lookup table sorted by id for vectorized ref resolution
+        ids = node_ids.to_array()
+        order = np.argsort(ids, kind="stable")
+        lookup = _NodeLookup(ids[order], node_lons.to_array()[order], node_lats.to_array()[order])
+        del ids, order, node_ids, node_lons, node_lats
+
+        member_ways = {member["ref"] for relation in relations
+                       for member in relation.get("members", []) if member.get("type") == "way"}
+        member_geometries = {}
+
+        for start in range(0, len(ways), self.batch_size):
+            batch = ways.slice(start, start + self.batch_size)
+            geometries = batch.geometries(lookup)
+
+            for way_id, geometry in zip(batch.ids, geometries):
+                if way_id in member_ways:
+                    member_geometries[way_id] = geometry
+
+            tagged = [i for i, tags in enumerate(batch.tags) if tags]
+            if tagged:
+                yield feature_frame(["way"] * len(tagged), batch.ids[tagged],
+                                     [batch.tags[i] for i in tagged],
+                                     gpd.GeoSeries(geometries[tagged], crs=self.crs).values,
+                                     self.crs)
+
+        for start in range(0, len(relations), self.batch_size):
+            batch = relations[start:start + self.batch_size]
+            geometries = [build_relation_geometry(relation.get("members", []), member_geometries)
+                          for relation in batch]
+            yield feature_frame(["relation"] * len(batch), [relation["id"] for relation in batch],
+                                 [relation["tags"] for relation in batch],
+                                 gpd.GeoSeries(geometries, crs=self.crs).values, self.crs)
+
+
+def iter_response_batches(path, batch_size=10000, crs="EPSG:4326", logger=None):
+    """
+    Parse a stored Overpass response (plain or gzip-compressed JSON) in batches.
+
+    Parameters:
+    -----------
+    path : str
+        Path of a .json or .json.gz response, e.g. an osmnx or ResponseCacheStore cache file
+    batch_size : int, default=10000
+        Maximum number of features per batch
+    crs : str, default="EPSG:4326"
+        CRS of the emitted frames
+    logger : logging.Logger, optional
+        Logger for outputting status messages
+
+    Yields:
+    -------
+    gdf : geopandas.GeoDataFrame
+        Up to batch_size features
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    parser = OverpassStreamParser(batch_size=batch_size, crs=crs, logger=logger)
+    with opener(path, "rt", encoding="utf-8") as f:
+        yield from parser.batches(f)
+
+
+class _PointBatch:
+    """Columns of point features collected before they become a frame."""
+
+    def __init__(self):
+        self.element_types = []
+        self.ids = []
+        self.tags = []
+        self.lons = []
+        self.lats = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, element_type, element_id, tags, lon, lat):
+        self.element_types.append(element_type)
+        self.ids.append(element_id)
+        self.tags.append(tags)
+        self.lons.append(lon)
+        self.lats.append(lat)
+
+    def to_frame(self, crs):
+        geometry = gpd.points_from_xy(np.asarray(self.lons, dtype="float64"),
+                                      np.asarray(self.lats, dtype="float64"), crs=crs)
+        return feature_frame(self.element_types, self.ids, self.tags, geometry, crs)
+
+
+class _Float64Buffer:
+    """Append-only numeric buffer that stores full blocks as numpy arrays."""
+
+    dtype = "float64"
+    block_size = 65536
+
+    def __init__(self):
+        self._blocks = []
+        self._current = []
+
+    def __len__(self):
+        return sum(len(block) for block in self._blocks) + len(self._current)
+
+    def append(self, value):
+        self._current.append(value)
+        if len(self._current) >= self.block_size:
+            self._blocks.append(np.asarray(self._current, dtype=self.dtype))
+            self._current = []
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def to_array(self):
+        blocks = self._blocks + [np.asarray(self._current, dtype=self.dtype)]
+        return np.concatenate(blocks)
+
+
+class _Int64Buffer(_Float64Buffer):
+    dtype = "int64"
+
+
+class _WayBuffer:
+    """Way ids, tags and node refs, with refs stored flat in numpy blocks."""
+
+    def __init__(self, ids=None, tags=None, refs=None, offsets=None):
+        self.ids = ids if ids is not None else _Int64Buffer()
+        self.tags = tags if tags is not None else []
+        self.refs = refs if refs is not None else _Int64Buffer()
+        self.offsets = offsets if offsets is not None else [0]
+
+    def __len__(self):
+        return len(self.tags)
+
+    def append(self, way_id, tags, refs):
+        self.ids.append(way_id)
+        self.tags.append(tags)
+        self.refs.extend(refs)
+        self.offsets.append(self.offsets[-1] + len(refs))
+
+    def slice(self, start, stop):
+        if not isinstance(self.refs, np.ndarray):
+            self.ids = self.ids.to_array()
+            self.refs = self.refs.to_array()
+            self.offsets = np.asarray(self.offsets, dtype="int64")
+        stop = min(stop, len(self))
+        offsets = self.offsets[start:stop + 1]
+        return _WayBuffer(self.ids[start:stop], self.tags[start:stop],
+                          self.refs[offsets[0]:offsets[-1]], offsets - offsets[0])
+
+    def geometries(self, lookup):
+        """Build LineString/Polygon geometries following osmnx's polygon rules."""
+        lons, lats, found = lookup.resolve(self.refs)
+        geometries = np.empty(len(self), dtype=object)
+        for i in range(len(self)):
+            start, stop = self.offsets[i], self.offsets[i + 1]
+            refs = self.refs[start:stop]
+            if stop - start < 2 or not found[start:stop].all():
+                geometries[i] = None
+                continue
+            coords = np.column_stack([lons[start:stop], lats[start:stop]])
+            if refs[0] == refs[-1] and stop - start >= 4 and is_area_feature(self.tags[i] or {}):
+                geometries[i] = Polygon(coords)
+            else:
+                geometries[i] = shapely.linestrings(coords)
+        return geometries
+
+
+class _NodeLookup:
+    """Sorted node ids with their coordinates."""
+
+    def __init__(self, ids, lons, lats):
+        self.ids = ids
+        self.lons = lons
+        self.lats = lats
+
+    def resolve(self, refs):
+        positions = np.searchsorted(self.ids, refs)
+        positions = np.minimum(positions, max(len(self.ids) - 1, 0))
+        if len(self.ids) == 0:
+            return np.zeros(len(refs)), np.zeros(len(refs)), np.zeros(len(refs), dtype=bool)
+        found = self.ids[positions] == refs
+        return self.lons[positions], self.lats[positions], found
+
+
+def is_area_feature(tags):
+    """
+    Check whether a closed way is an area, using osmnx's polygon feature rules.
+
+    Parameters:
+    -----------
+    tags : dict
+        Tags of the closed way
+
+    Returns:
+    --------
+    is_area : bool
+        True if the way should become a Polygon rather than a LineString
+    """
+    if tags.get("area") == "no":
+        return False
+    for tag in tags.keys() & POLYGON_FEATURES.keys():
+        rule = POLYGON_FEATURES[tag]["polygon"]
+        values = POLYGON_FEATURES[tag].get("values", set())
+        if (rule == "all" or
+                (rule == "passlist" and tags[tag] in values) or
+                (rule == "blocklist" and tags[tag] not in values)):
+            return True
+    return False